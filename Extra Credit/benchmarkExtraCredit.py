@@ -0,0 +1,759 @@
+#!/usr/bin/env python
+#
+# benchmarkExtraCredit.py -- benchmarks for the multi-tournament Swiss system
+#
+# Type python benchmarkExtraCredit.py registration to compare registering
+# players in a tournament one by one and all at once,
+# python benchmarkExtraCredit.py validation to compare checking ids with
+# bleach.clean and with validateId(), python benchmarkExtraCredit.py caching
+# to compare pairing rounds with and without the pairing cache,
+# python3 benchmarkExtraCredit.py memory to compare the memory the pairing
+# state takes in dictionaries and in typed arrays,
+# python benchmarkExtraCredit.py viewers to compare polling the standings
+# with and without the standings cache, or python3 benchmarkExtraCredit.py
+# concurrency to compare closing the rounds of many tournaments at once with
+# threads and with asyncio.  python benchmarkExtraCredit.py stress submits
+# every result of many tournaments several times at once and checks that
+# each was recorded once.  python benchmarkExtraCredit.py ratings compares
+# rating a history of a million matches one at a time and with NumPy.
+# python benchmarkExtraCredit.py suite times
+# registering, reporting, standings and pairing on synthetic tournaments of 8
+# to 100,000 players and writes the results as JSON, so they can be compared
+# across commits.  The registration, caching, viewers, concurrency, stress,
+# ratings and suite benchmarks empty the tournament database.
+#
+
+import argparse
+import gc
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import time
+import timeit
+
+import cacheExtraCredit as cache
+import ratingExtraCredit as rating
+import storageExtraCredit as storage
+import tournamentExtraCredit as tournament
+
+
+def benchRegistration(players):
+    """Prints the time taken to register players and participants one by one
+    and all at once
+
+    The players are registered in the tournament database, which is emptied
+    before each run.
+    """
+    names = ['Player %d' % n for n in range(players)]
+
+    def oneByOne():
+        t = tournament.registerTournament()
+        ids = [tournament.registerPlayer(name) for name in names]
+        for player in ids:
+            tournament.registerTournamentPlayer(player, t)
+
+    def allAtOnce():
+        t = tournament.registerTournament()
+        tournament.registerTournamentPlayers(tournament.registerPlayers(names), t)
+
+    print("%-12s %8s %10s %12s" % ('registered', 'players', 'seconds', 'players/sec'))
+    for name, run in [('one by one', oneByOne), ('all at once', allAtOnce)]:
+        tournament.deleteMatches()
+        tournament.deletePlayers()
+        start = time.time()
+        run()
+        seconds = time.time() - start
+        print("%-12s %8d %10.3f %12.0f" % (name, players, seconds, players / seconds))
+    tournament.deletePlayers()
+
+
+def benchValidation(calls):
+    """Prints the time per call of checking an id with bleach.clean, as the
+    functions did before, and with validateId()"""
+    import bleach
+    runs = [
+        ('bleach.clean', lambda: bleach.clean(u'%d' % 12345)),
+        ('validateId', lambda: tournament.validateId(12345, 'player')),
+    ]
+    print("%-14s %10s %14s" % ('check', 'calls', 'usec/call'))
+    for name, run in runs:
+        seconds = min(timeit.repeat(run, number=calls, repeat=3))
+        print("%-14s %10d %14.2f" % (name, calls, seconds / calls * 1e6))
+
+
+def playRound(pairings, rng):
+    """Returns random (id1, id2, result) results of the pairings of a round,
+    one in five of them a tie"""
+    results = []
+    for (id1, name1, id2, name2) in pairings:
+        draw = rng.random()
+        results.append((id1, id2, 'tie' if draw < 0.2 else id1 if draw < 0.6 else id2))
+    return results
+
+
+def benchCaching(players, rounds, method, seed):
+    """Prints the time taken to get the state swissPairings() pairs each round
+    of a tournament from: read from the store, as it is with the pairing
+    cache turned off, and from the pairing cache
+
+    The tournament is played in a database emptied before it, and every
+    round is paired from the cache.
+    """
+    tournament.configurePairingCache()
+    tournament.deleteMatches()
+    tournament.deletePlayers()
+    store = tournament.getStore()
+    pairingCache = tournament.getPairingCache()
+    t = tournament.registerTournament()
+    names = ['Player %d' % n for n in range(players)]
+    tournament.registerTournamentPlayers(tournament.registerPlayers(names), t)
+    rng = random.Random(seed)
+    print("%-6s %8s %9s %12s %12s" % ('round', 'players', 'matches', 'store msec', 'cache msec'))
+    for r in range(rounds):
+        start = time.time()
+        store.pairingState(t)
+        middle = time.time()
+        pairingCache.get(t, lambda: store.results(t))
+        end = time.time()
+        print("%-6d %8d %9d %12.1f %12.1f" % (
+            r + 1, players, r * players // 2, (middle - start) * 1000, (end - middle) * 1000))
+        pairings = tournament.swissPairings(t, method)
+        tournament.reportMatches([(id1, id2, result, t) for id1, id2, result in playRound(pairings, rng)])
+    tournament.deleteMatches()
+    tournament.deletePlayers()
+
+
+def syntheticTournament(players, rounds, seed):
+    """Returns the (id, name) of the players of a made-up tournament and the
+    (id1, id2, winner) of its matches, each round pairing the players at
+    random"""
+    rng = random.Random(seed)
+    ids = list(range(1, players + 1))
+    matches = []
+    for r in range(rounds):
+        rng.shuffle(ids)
+        for id1, id2 in zip(ids[::2], ids[1::2]):
+            draw = rng.random()
+            matches.append((id1, id2, None if draw < 0.2 else id1 if draw < 0.6 else id2))
+    return [(x, 'Player %d' % x) for x in sorted(ids)], matches
+
+
+def dictOpponents(matches):
+    """Returns the opponents and colours of the players in dictionaries of
+    lists and of ints, as storageExtraCredit.countOpponents() did before it
+    returned a swiss.OpponentHistory"""
+    playedOpponents = {}
+    colours = {}
+    for id1, id2 in matches:
+        playedOpponents.setdefault(id1, []).append(id2)
+        playedOpponents.setdefault(id2, []).append(id1)
+        colours[id1] = colours.get(id1, 0) + 1
+        colours[id2] = colours.get(id2, 0) - 1
+    return playedOpponents, colours
+
+
+def dictState(players, matches):
+    """Returns the pairing state of a tournament as the pairing cache held it
+    before it kept it in typed arrays: dictionaries of the names, ranks,
+    scores and colours of the players, a dictionary of lists of their
+    opponents and a dictionary of sets of the players in each score group"""
+    names = dict(players)
+    rank = dict((row[0], n) for n, row in enumerate(players))
+    scores = dict((x, (0, 0)) for x in names)
+    playedOpponents = dict((x, []) for x in names)
+    colours = dict((x, 0) for x in names)
+    for id1, id2, winner in matches:
+        playedOpponents[id1].append(id2)
+        playedOpponents[id2].append(id1)
+        colours[id1] += 1
+        colours[id2] -= 1
+        for player in (id1, id2):
+            points, wins = scores[player]
+            if winner is None:
+                scores[player] = (points + 1, wins)
+            elif winner == player:
+                scores[player] = (points + 3, wins + 1)
+    groups = {}
+    for x, score in scores.items():
+        groups.setdefault(score, set()).add(x)
+    return names, rank, scores, playedOpponents, colours, groups
+
+
+def measureMemory(build):
+    """Returns the bytes still allocated by a function once it returns, as
+    counted by tracemalloc, and the seconds it takes without tracemalloc"""
+    import tracemalloc
+    start = time.time()
+    build()
+    seconds = time.time() - start
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        value = build()
+        size = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+    del value
+    return size, seconds
+
+
+def benchMemory(players, rounds, seed):
+    """Prints the memory held by the opponents the players of a tournament
+    have played, and by the whole pairing state the pairing cache keeps for
+    it, in the dictionaries used before and in typed arrays, and the time
+    taken to build each
+
+    The tournament is made up in memory; the names are allocated beforehand,
+    so neither side counts them.
+    """
+    players, matches = syntheticTournament(players, rounds, seed)
+    pairs = [match[:2] for match in matches]
+    ids = [row[0] for row in players]
+
+    def loadCache():
+        pairingCache = cache.PairingStateCache(1)
+        pairingCache.get(0, lambda: (players, matches))
+        return pairingCache
+
+    runs = [
+        ('opponents', 'dictionaries', lambda: dictOpponents(pairs)),
+        ('opponents', 'arrays', lambda: storage.countOpponents(pairs, ids)),
+        ('pairing state', 'dictionaries', lambda: dictState(players, matches)),
+        ('pairing state', 'arrays', loadCache),
+    ]
+    print("%d players, %d rounds, %d matches" % (len(players), rounds, len(matches)))
+    print("%-14s %-13s %10s %14s %10s" % ('structure', 'kept in', 'MB', 'bytes/player', 'msec'))
+    for name, kind, build in runs:
+        size, seconds = measureMemory(build)
+        print("%-14s %-13s %10.2f %14.1f %10.1f" % (
+            name, kind, size / 1e6, float(size) / len(players), seconds * 1000))
+
+
+def benchViewers(viewers, players, seconds, interval, seed):
+    """Prints how many times a pool of viewer threads polls the standings of
+    a tournament while its matches are reported one by one, and how many of
+    the polls read the store, with and without the standings cache
+
+    Each viewer waits interval seconds between polls.
+
+    Each run plays the same tournament in a database emptied before it.
+    """
+    import threading
+    names = ['Player %d' % n for n in range(players)]
+    print("%-6s %8s %8s %8s %10s %10s %12s" % (
+        'cache', 'viewers', 'players', 'reports', 'polls', 'reads', 'polls/sec'))
+    for name, size in [('off', 0), ('on', tournament.STANDINGS_CACHE_SIZE)]:
+        tournament.configureStandingsCache(size)
+        tournament.deleteMatches()
+        tournament.deletePlayers()
+        t = tournament.registerTournament()
+        tournament.registerTournamentPlayers(tournament.registerPlayers(names), t)
+        rng = random.Random(seed)
+        stop = threading.Event()
+        polls = [0] * viewers
+        reports = 0
+
+        def view(n):
+            while not stop.wait(interval):
+                tournament.playerStandings(t)
+                polls[n] += 1
+
+        threads = [threading.Thread(target=view, args=(n,)) for n in range(viewers)]
+        start = time.time()
+        for thread in threads:
+            thread.start()
+        while time.time() - start < seconds:
+            pairings = tournament.swissPairings(t, 'matching')
+            for id1, id2, result in playRound(pairings, rng):
+                if time.time() - start >= seconds:
+                    break
+                tournament.reportMatch(id1, id2, result, t)
+                reports += 1
+        stop.set()
+        for thread in threads:
+            thread.join()
+        elapsed = time.time() - start
+        reads = sum(polls) if not size else tournament.getStandingsCache().misses
+        print("%-6s %8d %8d %8d %10d %10d %12.0f" % (
+            name, viewers, players, reports, sum(polls), reads, sum(polls) / elapsed))
+    tournament.configureStandingsCache()
+    tournament.deleteMatches()
+    tournament.deletePlayers()
+
+
+def benchConcurrency(tournaments, players, rounds, connections, method, seed):
+    """Prints the time taken to close the rounds of many tournaments at once,
+    from a pool of threads on the synchronous functions and from one event
+    loop on the coroutines of tournamentExtraCreditAsync
+
+    Closing a round records its results and pairs the next one with the given
+    pairing method.  Both runs
+    get the same number of connections, and each plays the same tournaments
+    in a database emptied before it.
+    """
+    import asyncio
+    import concurrent.futures
+    import tournamentExtraCreditAsync
+
+    def setUp():
+        tournament.deleteMatches()
+        tournament.deletePlayers()
+        ids = []
+        for t in range(tournaments):
+            ids.append(tournament.registerTournament())
+            names = ['Player %d-%d' % (t, n) for n in range(players)]
+            tournament.registerTournamentPlayers(tournament.registerPlayers(names), ids[-1])
+        return ids
+
+    def closeRoundSync(t, results):
+        tournament.reportMatches([(id1, id2, result, t) for id1, id2, result in results])
+        return tournament.swissPairings(t, method)
+
+    def threads(ids):
+        with concurrent.futures.ThreadPoolExecutor(connections) as executor:
+            def closeRounds(results):
+                return list(executor.map(closeRoundSync, ids, results))
+            return play(ids, closeRounds)
+
+    def eventLoop(ids):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            def closeRounds(results):
+                closures = [tournamentExtraCreditAsync.closeRound(t, r, method) for t, r in zip(ids, results)]
+                return loop.run_until_complete(asyncio.gather(*closures))
+            seconds = play(ids, closeRounds)
+            loop.run_until_complete(tournamentExtraCreditAsync.closePool())
+            return seconds
+        finally:
+            asyncio.set_event_loop(None)
+            loop.close()
+
+    def play(ids, closeRounds):
+        """Plays every round of the tournaments and returns the seconds spent
+        closing them"""
+        rng = random.Random(seed)
+        pairings = [tournament.swissPairings(t, method) for t in ids]
+        seconds = 0.0
+        for r in range(rounds):
+            results = [playRound(p, rng) for p in pairings]
+            start = time.time()
+            pairings = closeRounds(results)
+            seconds += time.time() - start
+        return seconds
+
+    tournament.configurePool(connections, tournament.DSN)
+    tournamentExtraCreditAsync.configurePool(connections, tournament.DSN)
+    print("%-10s %11s %8s %7s %10s %14s" % (
+        'path', 'tournaments', 'players', 'rounds', 'seconds', 'closures/sec'))
+    for name, run in [('threads', threads), ('asyncio', eventLoop)]:
+        seconds = run(setUp())
+        print("%-10s %11d %8d %7d %10.3f %14.1f" % (
+            name, tournaments, players, rounds, seconds, tournaments * rounds / seconds))
+    tournament.deleteMatches()
+    tournament.deletePlayers()
+
+
+def benchStress(tournaments, players, rounds, scorekeepers, copies, store, seed):
+    """Prints how fast a pool of scorekeeper threads submits the results of
+    many tournaments while the tournaments are being paired, and checks that
+    every result was recorded once
+
+    Each round is started twice at once in every tournament, and only one of
+    the two may start it.  Then every result is submitted copies times in a
+    shuffled order, through reportTable() and reportMatch() in turn, while a
+    thread keeps pairing the tournaments with swissPairings(), and a
+    different result is submitted for every table, which reportTable() has to
+    reject.  In the end each table has to have one match or bye recorded,
+    with the result submitted, and the standings and the pairing cache have
+    to agree with them.  The tournaments are played in the database, which is
+    emptied, through a pool of tournamentExtraCredit.POOL_SIZE connections,
+    fewer than the scorekeepers by default, so that the rounds have to be
+    started while the scorekeepers outnumber the connections, or in a
+    storageExtraCredit.MemoryStore.
+    """
+    import threading
+    from multiprocessing.pool import ThreadPool
+    if store == 'memory':
+        tournament.setStore(storage.MemoryStore())
+    else:
+        tournament.setStore(storage.PostgresStore(tournament.DSN, tournament.POOL_SIZE))
+    tournament.deleteMatches()
+    tournament.deletePlayers()
+    ids = []
+    for t in range(tournaments):
+        ids.append(tournament.registerTournament())
+        names = ['Player %d-%d' % (t, n) for n in range(players)]
+        tournament.registerTournamentPlayers(tournament.registerPlayers(names), ids[-1])
+    rng = random.Random(seed)
+    failures = []
+    #the (id1, id2, winner) recorded at each table of each tournament
+    expected = dict((t, []) for t in ids)
+    counts = {'submissions': 0, 'conflicts': 0, 'pairings': 0}
+    stop = threading.Event()
+
+    def pairAll():
+        while not stop.is_set():
+            for t in ids:
+                try:
+                    tournament.swissPairings(t)
+                except (IndexError, ValueError):
+                    pass
+                counts['pairings'] += 1
+
+    def begin(t):
+        try:
+            return t, tournament.startRound(t)
+        except (IndexError, ValueError):
+            return t, None
+
+    def submit(job):
+        t, number, table, id1, id2, result, viaTable = job
+        if viaTable:
+            tournament.reportTable(t, table, result, number)
+        else:
+            tournament.reportMatch(id1, id2, result, t)
+
+    def conflict(job):
+        t, number, table, result = job
+        try:
+            tournament.reportTable(t, table, result, number)
+        except storage.IntegrityError:
+            return True
+        return False
+
+    pool = ThreadPool(scorekeepers)
+    pairer = threading.Thread(target=pairAll)
+    pairer.start()
+    playing = list(ids)
+    start = time.time()
+    try:
+        for r in range(1, rounds + 1):
+            started = {}
+            for t, begun in pool.map(begin, playing + playing):
+                if begun is not None:
+                    if t in started:
+                        failures.append("Round %d of tournament %d was started twice." % (r, t))
+                    started[t] = begun
+            playing = sorted(started)
+            jobs, conflicts = [], []
+            for t in playing:
+                number, pairings = started[t]
+                for table, id1, name1, id2, name2 in pairings:
+                    if id2 == storage.BYE:
+                        result, winner = id1, storage.byeWinner(id1, tournament.getByeResult())
+                    else:
+                        draw = rng.random()
+                        result = 'tie' if draw < 0.2 else id1 if draw < 0.6 else id2
+                        winner = None if result == 'tie' else result
+                        conflicts.append((t, number, table, id1 if result == 'tie' else 'tie'))
+                    expected[t].append((min(id1, id2), max(id1, id2), winner))
+                    jobs.extend((t, number, table, id1, id2, result, n % 2 == 0) for n in range(copies))
+            rng.shuffle(jobs)
+            pool.map(submit, jobs)
+            rejected = pool.map(conflict, conflicts)
+            counts['submissions'] += len(jobs) + len(conflicts)
+            counts['conflicts'] += sum(rejected)
+            if not all(rejected):
+                failures.append("%d different results were recorded in round %d."
+                                % (rejected.count(False), r))
+    finally:
+        stop.set()
+        pairer.join()
+        pool.close()
+        pool.join()
+    seconds = time.time() - start
+
+    store = tournament.getStore()
+    tables = 0
+    for t in ids:
+        recorded = sorted((min(id1, id2), max(id1, id2), winner) for id1, id2, winner in store.results(t)[1])
+        tables += len(expected[t])
+        if recorded != sorted(expected[t]):
+            failures.append("Tournament %d has %d results recorded for %d tables."
+                            % (t, len(recorded), len(expected[t])))
+        scores = {}
+        for id1, id2, winner in expected[t]:
+            for player in (id1, id2):
+                score = scores.setdefault(player, [0, 0])
+                score[0] += winner == player
+                score[1] += 1
+        scores.pop(storage.BYE, None)
+        standings = dict((row[0], list(row[2:])) for row in tournament.playerStandings(t))
+        if any(standings[player] != score for player, score in scores.items()):
+            failures.append("The standings of tournament %d don't match its results." % t)
+        cached = tournament.getPairingCache().get(t, lambda: store.results(t))[0]
+        if any(row[2] != standings[row[0]][0] for row in cached):
+            failures.append("The pairing cache of tournament %d doesn't match its results." % t)
+    print("%-8s %11s %12s %11s %8s %9s %9s %10s %14s" % (
+        'store', 'tournaments', 'scorekeepers', 'submissions', 'tables', 'ignored', 'rejected',
+        'seconds', 'submissions/sec'))
+    print("%-8s %11d %12d %11d %8d %9d %9d %10.3f %14.0f" % (
+        store.__class__.__name__.replace('Store', '').lower(), tournaments, scorekeepers,
+        counts['submissions'], tables, counts['submissions'] - counts['conflicts'] - tables,
+        counts['conflicts'], seconds, counts['submissions'] / seconds))
+    print("%d pairings made meanwhile" % counts['pairings'])
+    for failure in failures:
+        print("FAILED: %s" % failure)
+    if not failures:
+        print("every table has one result recorded")
+    tournament.deleteMatches()
+    tournament.deletePlayers()
+    return not failures
+
+
+def benchRatings(players, matches, store, seed):
+    """Prints the time taken to rate a made-up history of matches one at a
+    time, as the matches are rated when they are reported, and all at once
+    with ratingExtraCredit.computeRatings(), and how far apart the two sets of
+    ratings are
+
+    With store 'postgres' the history is also copied into the database,
+    which is emptied, and rated again there by recomputeRatings(); the copy
+    isn't timed.
+    """
+    rounds = max(1, 2 * matches // players)
+    history = syntheticTournament(players, rounds, seed)[1]
+    print("%d players, %d matches" % (players, len(history)))
+    print("%-22s %10s %14s" % ('rated', 'seconds', 'matches/sec'))
+    start = time.time()
+    sequential = rating.rateMatches({}, history)
+    seconds = time.time() - start
+    print("%-22s %10.3f %14.0f" % ('one at a time', seconds, len(history) / seconds))
+    start = time.time()
+    computed = rating.computeRatings(history)
+    seconds = time.time() - start
+    print("%-22s %10.3f %14.0f" % ('all at once', seconds, len(history) / seconds))
+    difference = max(abs(value - sequential[row[0]][n]) for row in rating.ratingRows(computed)
+                     for n, value in enumerate(row[1:]))
+    if store == 'postgres':
+        tournament.deleteMatches()
+        tournament.deletePlayers()
+        ids = tournament.registerPlayers(['Player %d' % n for n in range(players)])
+        t = tournament.registerTournament()
+        rows = [(ids[id1 - 1], ids[id2 - 1], None if winner is None else ids[winner - 1], t)
+                for id1, id2, winner in history]
+        with tournament.getCursor() as c:
+            storage._copyRows(c, 'matches', ('id1', 'id2', 'winner', 'tournament_id'), rows)
+        start = time.time()
+        tournament.recomputeRatings()
+        seconds = time.time() - start
+        print("%-22s %10.3f %14.0f" % ('recomputeRatings()', seconds, len(history) / seconds))
+        tournament.deleteMatches()
+        tournament.deletePlayers()
+    print("largest difference between the ratings: %.2g" % difference)
+
+
+#the numbers of players in the tournaments of the suite
+SUITE_SIZES = (8, 64, 512, 4096, 32768, 100000)
+
+
+def summarize(seconds):
+    """Returns the number, total, mean, median, 95th percentile and most of a
+    list of the seconds taken by calls"""
+    ordered = sorted(seconds)
+    return {
+        'calls': len(ordered),
+        'seconds': sum(ordered),
+        'mean': sum(ordered) / len(ordered),
+        'p50': ordered[len(ordered) // 2],
+        'p95': ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+        'max': ordered[-1],
+    }
+
+
+def environment():
+    """Returns where a benchmark ran: the Python version, the platform, the
+    time and the git commit checked out, if any"""
+    directory = os.path.dirname(os.path.abspath(__file__))
+    try:
+        with open(os.devnull, 'w') as devnull:
+            commit = subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=directory,
+                                             stderr=devnull).decode('ascii').strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {'python': platform.python_version(), 'platform': platform.platform(),
+            'time': time.time(), 'commit': commit}
+
+
+def runSuite(sizes, rounds, store, method, sample, seed):
+    """Plays a synthetic tournament of each size and returns the timings of
+    the public functions of tournamentExtraCredit.py as a list of dictionaries
+
+    The first sample players are registered with registerPlayer() and
+    registerTournamentPlayer() and the rest at once with registerPlayers()
+    and registerTournamentPlayers(); likewise the first sample matches of each
+    round are reported with reportMatch() and the rest with reportMatches().
+    Each round is paired with swissPairings(), and the standings read with
+    playerStandings() once the round is reported.  A tournament stops early
+    if a round cannot be paired.
+
+    Args:
+      sizes: the numbers of players
+      rounds: the number of rounds, or None for enough rounds to find a
+        winner, the base 2 logarithm of the players rounded up
+      store: 'postgres' to keep the tournaments in the database, which is
+        emptied, or 'memory' to keep them in a storageExtraCredit.MemoryStore
+      method: the pairing method, as taken by swissPairings()
+      sample: the number of calls of registerPlayer(), of
+        registerTournamentPlayer() and of reportMatch() in each round
+      seed: the seed of the results
+    """
+    import storageExtraCredit as storage
+    results = []
+    for players in sizes:
+        if store == 'memory':
+            tournament.setStore(storage.MemoryStore())
+        else:
+            tournament.setStore(storage.PostgresStore(tournament.DSN, tournament.POOL_SIZE))
+        tournament.deleteMatches()
+        tournament.deletePlayers()
+        rng = random.Random(seed)
+        timings = {}
+
+        def timed(operation, function, *args):
+            start = time.time()
+            result = function(*args)
+            timings.setdefault(operation, []).append(time.time() - start)
+            return result
+
+        t = timed('registerTournament', tournament.registerTournament)
+        names = ['Player %d' % n for n in range(players)]
+        ids = [timed('registerPlayer', tournament.registerPlayer, name) for name in names[:sample]]
+        for player in ids:
+            timed('registerTournamentPlayer', tournament.registerTournamentPlayer, player, t)
+        if players > sample:
+            others = timed('registerPlayers', tournament.registerPlayers, names[sample:])
+            timed('registerTournamentPlayers', tournament.registerTournamentPlayers, others, t)
+        played = 0
+        for r in range(rounds or int(math.ceil(math.log(players, 2)))):
+            try:
+                pairings = timed('swissPairings', tournament.swissPairings, t, method)
+            except (IndexError, ValueError):
+                break
+            matches = [(id1, id2, result, t) for id1, id2, result in playRound(pairings, rng)]
+            for match in matches[:sample]:
+                timed('reportMatch', tournament.reportMatch, *match)
+            if matches[sample:]:
+                timed('reportMatches', tournament.reportMatches, matches[sample:])
+            timed('playerStandings', tournament.playerStandings, t)
+            played += 1
+        for operation in sorted(timings):
+            result = {'module': 'tournamentExtraCredit', 'store': store, 'method': method,
+                      'players': players, 'rounds': played, 'operation': operation}
+            result.update(summarize(timings[operation]))
+            results.append(result)
+        tournament.deleteMatches()
+        tournament.deletePlayers()
+    return results
+
+
+def benchSuite(sizes, rounds, store, method, sample, seed, output):
+    """Runs the suite and writes its results, with where it ran, as a JSON
+    object to a file or to the standard output"""
+    report = environment()
+    report.update({'seed': seed, 'results': runSuite(sizes, rounds, store, method, sample, seed)})
+    text = json.dumps(report, indent=2, separators=(',', ': '), sort_keys=True)
+    if output is None:
+        print(text)
+    else:
+        with open(output, 'w') as f:
+            f.write(text + '\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    commands = parser.add_subparsers(dest='command')
+    registration = commands.add_parser('registration',
+                                       help='compare registering players one by one and at once')
+    registration.add_argument('--players', type=int, default=10000)
+    validation = commands.add_parser('validation',
+                                     help='compare checking ids with bleach and validateId')
+    validation.add_argument('--calls', type=int, default=10000)
+    caching = commands.add_parser('caching',
+                                  help='compare pairing with and without the pairing cache')
+    caching.add_argument('--players', type=int, default=10000)
+    caching.add_argument('--rounds', type=int, default=9)
+    caching.add_argument('--method', choices=['greedy', 'matching'], default='matching')
+    caching.add_argument('--seed', type=int, default=0)
+    memory = commands.add_parser('memory',
+                                 help='compare the memory of the pairing state in dictionaries and arrays')
+    memory.add_argument('--players', type=int, default=100000)
+    memory.add_argument('--rounds', type=int, default=9)
+    memory.add_argument('--seed', type=int, default=0)
+    viewers = commands.add_parser('viewers',
+                                  help='compare polling the standings with and without the standings cache')
+    viewers.add_argument('--viewers', type=int, default=8)
+    viewers.add_argument('--players', type=int, default=64)
+    viewers.add_argument('--seconds', type=float, default=5)
+    viewers.add_argument('--interval', type=float, default=0.01,
+                         help='seconds each viewer waits between polls')
+    viewers.add_argument('--seed', type=int, default=0)
+    concurrency = commands.add_parser('concurrency',
+                                      help='compare closing rounds with threads and asyncio')
+    concurrency.add_argument('--tournaments', type=int, default=200)
+    concurrency.add_argument('--players', type=int, default=16)
+    concurrency.add_argument('--rounds', type=int, default=4)
+    concurrency.add_argument('--connections', type=int, default=10)
+    concurrency.add_argument('--method', choices=['greedy', 'matching'], default='matching')
+    concurrency.add_argument('--seed', type=int, default=0)
+    stress = commands.add_parser('stress',
+                                 help='submit every result many times at once and check it is recorded once')
+    stress.add_argument('--tournaments', type=int, default=20)
+    stress.add_argument('--players', type=int, default=32)
+    stress.add_argument('--rounds', type=int, default=5)
+    stress.add_argument('--scorekeepers', type=int, default=16, help='threads submitting results')
+    stress.add_argument('--copies', type=int, default=3, help='times each result is submitted')
+    stress.add_argument('--store', choices=['postgres', 'memory'], default='postgres')
+    stress.add_argument('--seed', type=int, default=0)
+    ratings = commands.add_parser('ratings',
+                                  help='compare rating matches one at a time and with NumPy')
+    ratings.add_argument('--players', type=int, default=100000)
+    ratings.add_argument('--matches', type=int, default=1000000)
+    ratings.add_argument('--store', choices=['postgres', 'memory'], default='postgres',
+                         help='memory to leave the database out')
+    ratings.add_argument('--seed', type=int, default=0)
+    suite = commands.add_parser('suite', help='time the public functions and write JSON')
+    suite.add_argument('--sizes', type=lambda text: [int(n) for n in text.split(',')],
+                       default=list(SUITE_SIZES), help='comma-separated numbers of players')
+    suite.add_argument('--rounds', type=int, default=None,
+                       help='rounds per tournament, log2 of the players by default')
+    suite.add_argument('--store', choices=['postgres', 'memory'], default='postgres')
+    suite.add_argument('--method', choices=['greedy', 'matching'], default='matching')
+    suite.add_argument('--sample', type=int, default=100,
+                       help='calls of registerPlayer and of reportMatch each round')
+    suite.add_argument('--seed', type=int, default=0)
+    suite.add_argument('--output', default=None, help='file to write, the standard output by default')
+    args = parser.parse_args()
+    if args.command == 'registration':
+        benchRegistration(args.players)
+    elif args.command == 'validation':
+        benchValidation(args.calls)
+    elif args.command == 'caching':
+        benchCaching(args.players, args.rounds, args.method, args.seed)
+    elif args.command == 'memory':
+        benchMemory(args.players, args.rounds, args.seed)
+    elif args.command == 'viewers':
+        benchViewers(args.viewers, args.players, args.seconds, args.interval, args.seed)
+    elif args.command == 'concurrency':
+        benchConcurrency(args.tournaments, args.players, args.rounds,
+                         args.connections, args.method, args.seed)
+    elif args.command == 'stress':
+        if not benchStress(args.tournaments, args.players, args.rounds, args.scorekeepers,
+                           args.copies, args.store, args.seed):
+            raise SystemExit(1)
+    elif args.command == 'ratings':
+        benchRatings(args.players, args.matches, args.store, args.seed)
+    elif args.command == 'suite':
+        benchSuite(args.sizes, args.rounds, args.store, args.method, args.sample,
+                   args.seed, args.output)
+    else:
+        parser.print_help()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,363 @@
+#!/usr/bin/env python
+#
+# cacheExtraCredit.py -- caches of the state of the tournaments being held
+#
+# tournamentExtraCredit.py keeps what it needs to pair the next round of each
+# tournament in a PairingStateCache, so that between rounds only the matches
+# reported since the last round are added to it instead of the whole history
+# being read again, and the standings of each tournament in a StandingsCache,
+# so that many viewers polling them cost one query per change.  The caches
+# assume this process is the only one writing to the tournaments they hold; a
+# tournament changed from elsewhere has to be invalidated, or left to expire
+# from the StandingsCache.
+#
+
+import array
+import collections
+import contextlib
+import threading
+import time
+
+import swiss
+from storageExtraCredit import BYE
+
+
+class _PairingState(object):
+    """What is needed to pair the next round of a tournament, in typed arrays.
+
+    Players are numbered in the order they were loaded in, which ranks the
+    players level on points and wins.  Their names are kept in a list, their
+    points and wins in arrays, and their opponents and colours in a
+    swiss.OpponentHistory numbered the same way, so a large field costs a few
+    bytes a player and a match instead of a dictionary entry and a list each.
+    """
+
+    __slots__ = ('names', 'points', 'wins', 'history')
+
+    def __init__(self, players, matches):
+        """
+        Args:
+          players: a list of the (id, name) of the players taking part
+          matches: a list of the (id1, id2, winner) of the matches played, with
+            None as the winner of a tie and each bye as a match against BYE
+        """
+        #every player is numbered up front, so that reporting a match never
+        #resizes the index while a round is being paired from it
+        self.history = swiss.OpponentHistory(row[0] for row in players)
+        self.names = [row[1] for row in players]
+        self.points = array.array('i', [0]) * len(self.names)
+        self.wins = array.array('i', [0]) * len(self.names)
+        self.addMatches(matches)
+
+    def addMatches(self, matches):
+        """Adds a list of (id1, id2, winner) matches to the state, or returns
+        False without changing anything if one of their players doesn't take
+        part; a bye is counted as storageExtraCredit.countOpponents() does"""
+        index = self.history.index
+        for id1, id2, winner in matches:
+            if id1 not in index or (id2 not in index and id2 != BYE):
+                return False
+        self.history.addMatches([match[:2] for match in matches], BYE)
+        points, wins = self.points, self.wins
+        for id1, id2, winner in matches:
+            if winner is None:
+                points[index[id1]] += 1
+                if id2 != BYE:
+                    points[index[id2]] += 1
+            elif winner != BYE:
+                n = index[winner]
+                points[n] += 3
+                wins[n] += 1
+        return True
+
+    def standings(self):
+        """Returns a list of (id, name, wins) tuples, sorted by points and wins"""
+        points, wins = self.points, self.wins
+        #no player has more wins than scale, so one number orders them on
+        #points and then wins, and the stable sort keeps the players level
+        #on both in the order they were loaded in
+        scale = max(wins) + 1 if wins else 1
+        keys = [-(p * scale + w) for p, w in zip(points, wins)]
+        ids, names = self.history.ids, self.names
+        return [(ids[n], names[n], wins[n]) for n in sorted(range(len(keys)), key=keys.__getitem__)]
+
+
+class _TournamentCache(object):
+    """Holds a value for each of the tournaments used most recently.
+
+    When more than size tournaments are held, the one used longest ago is
+    dropped.  A value loaded while its tournament was changed is returned
+    but not kept, so that a value read before a change isn't kept after it.
+    """
+
+    def __init__(self, size):
+        """
+        Args:
+          size: the number of tournaments held, or 0 to hold none
+        """
+        if size < 0:
+            raise ValueError("The cache size can't be negative.")
+        self.size = size
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._values = collections.OrderedDict()
+        #how many changes have been made, and the last change made to each
+        #tournament while a value was being loaded
+        self._changes = 0
+        self._changed = {}
+        self._loading = 0
+
+    def __len__(self):
+        with self._lock:
+            return len(self._values)
+
+    def _touch(self, tournament):
+        """Counts a change to a tournament, or to every tournament if it is
+        None; the lock has to be held"""
+        self._changes += 1
+        if self._loading:
+            self._changed[tournament] = self._changes
+
+    def _startLoad(self):
+        """Returns the number of changes made before a load starts; the lock
+        has to be held"""
+        self._loading += 1
+        return self._changes
+
+    def _unchanged(self, tournament, start):
+        """Returns whether a tournament is unchanged since a load started;
+        the lock has to be held"""
+        return max(self._changed.get(tournament, 0), self._changed.get(None, 0)) <= start
+
+    def _endLoad(self, tournament, start):
+        """Returns whether the value of a tournament loaded since start can be
+        kept; the lock has to be held"""
+        unchanged = self._unchanged(tournament, start)
+        self._loading -= 1
+        if not self._loading:
+            self._changed.clear()
+        return unchanged
+
+    def _put(self, tournament, value):
+        """Keeps the value of a tournament, dropping the tournaments used
+        longest ago if there are too many; the lock has to be held"""
+        if not self.size:
+            return
+        self._values[tournament] = value
+        while len(self._values) > self.size:
+            self._values.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, tournament):
+        """Drops the value of a tournament, to be loaded again when it is next
+        used"""
+        with self._lock:
+            self._touch(tournament)
+            self._values.pop(tournament, None)
+
+    def clear(self):
+        """Drops the value of every tournament"""
+        with self._lock:
+            self._touch(None)
+            self._values.clear()
+
+
+class PairingStateCache(_TournamentCache):
+    """Keeps the pairing state of the most recently paired tournaments.
+
+    The state of a tournament is loaded in full the first time it is paired,
+    and then kept up to date by addMatches() as its results are reported, so
+    pairing the next round costs time in proportion to the players and the
+    new results rather than to every match played.  While results are being
+    written to a tournament inside writing(), its state is read from the
+    store instead, so a round paired between a result being recorded and
+    being added to the cache doesn't miss it.
+    """
+
+    def __init__(self, size):
+        _TournamentCache.__init__(self, size)
+        #the number of writes in progress to each tournament
+        self._writing = collections.Counter()
+
+    @contextlib.contextmanager
+    def writing(self, tournaments):
+        """Yields a list to add the (id1, id2, winner, tournament) of the
+        matches recorded to, while the results of tournaments are being
+        written, and adds them to the cache once the block exits; if it
+        raises, the matches are dropped along with the tournaments they
+        belong to"""
+        tournaments = set(tournaments)
+        played = []
+        with self._lock:
+            for tournament in tournaments:
+                self._touch(tournament)
+                self._writing[tournament] += 1
+        try:
+            yield played
+        except BaseException:
+            with self._lock:
+                for tournament in tournaments:
+                    self._values.pop(tournament, None)
+            raise
+        else:
+            self.addMatches(played)
+        finally:
+            with self._lock:
+                for tournament in tournaments:
+                    self._touch(tournament)
+                    self._writing[tournament] -= 1
+                    if not self._writing[tournament]:
+                        del self._writing[tournament]
+
+    def get(self, tournament, load):
+        """Returns the (id, name, wins) standings, the played opponents and the
+        colours of a tournament, as storageExtraCredit.PostgresStore.pairingState()
+        does.
+
+        The played opponents and colours are held by the cache and must not
+        be changed.  A tournament being written to is loaded and neither
+        taken from the cache nor kept in it.
+
+        Args:
+          tournament: the id number of the tournament
+          load: a function returning the (id, name) of the players taking part
+            in the tournament and the (id1, id2, winner) of its matches, called
+            if the tournament isn't held
+        """
+        with self._lock:
+            writing = tournament in self._writing
+            state = None if writing else self._values.pop(tournament, None)
+            if state is not None:
+                self._values[tournament] = state
+                return state.standings(), state.history, state.history.colours
+            start = self._startLoad()
+        try:
+            players, matches = load()
+            state = _PairingState(players, matches)
+        except BaseException:
+            with self._lock:
+                self._endLoad(tournament, start)
+            raise
+        with self._lock:
+            if self._endLoad(tournament, start) and not writing:
+                self._put(tournament, state)
+            return state.standings(), state.history, state.history.colours
+
+    def addMatches(self, matches):
+        """Adds matches that have been recorded to the tournaments they belong
+        to, dropping a tournament if one of the players doesn't take part in it
+
+        Args:
+          matches: a list of (id1, id2, winner, tournament) tuples, with None as
+            the winner of a tie
+        """
+        byTournament = {}
+        for id1, id2, winner, tournament in matches:
+            byTournament.setdefault(tournament, []).append((id1, id2, winner))
+        with self._lock:
+            for tournament, played in byTournament.items():
+                self._touch(tournament)
+                state = self._values.get(tournament)
+                if state is not None and not state.addMatches(played):
+                    del self._values[tournament]
+
+
+class _Load(object):
+    """A load of the standings of a tournament that other callers wait for"""
+
+    def __init__(self, start):
+        self.start = start
+        self.done = threading.Event()
+        self.standings = None
+
+
+class StandingsCache(_TournamentCache):
+    """Keeps the standings of the tournaments viewed most recently.
+
+    The standings of a tournament are read from the store on the first call
+    after they change, and every other call is answered from the cache:
+    callers asking while they are being read wait for that read instead of
+    starting their own.  Standings older than ttl seconds are read again, so
+    that changes made by other processes show up in time.
+
+    The counters hits, misses, expirations and evictions count the calls
+    answered from the cache or by waiting for another caller's read, the
+    calls that read the store, the standings read again for being too old
+    and the standings dropped to make room.
+    """
+
+    def __init__(self, size, ttl=None, clock=time.time):
+        """
+        Args:
+          size: the number of tournaments held, or 0 to hold none
+          ttl: how many seconds standings are kept for, or None to keep them
+            until they change
+          clock: the function returning the time in seconds
+        """
+        _TournamentCache.__init__(self, size)
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self._loads = {}
+
+    def stats(self):
+        """Returns a dictionary of the counters and the number of tournaments
+        held"""
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'expirations': self.expirations,
+                    'evictions': self.evictions, 'size': len(self._values)}
+
+    def get(self, tournament, load):
+        """Returns the standings of a tournament, a new list of (id, name,
+        wins, matches) tuples each call
+
+        Args:
+          tournament: the id number of the tournament
+          load: a function reading the standings from the store, called if
+            the tournament isn't held or its standings are too old
+        """
+        with self._lock:
+            entry = self._values.pop(tournament, None)
+            if entry is not None:
+                standings, expires = entry
+                if expires is None or self.clock() < expires:
+                    self._values[tournament] = entry
+                    self.hits += 1
+                    return list(standings)
+                self.expirations += 1
+            #a read started before the last change would return standings
+            #older than the caller may already have seen
+            pending = self._loads.get(tournament)
+            if pending is None or not self._unchanged(tournament, pending.start):
+                self.misses += 1
+                start = self._startLoad()
+                pending = self._loads[tournament] = _Load(start)
+            else:
+                self.hits += 1
+                start = None
+        if start is None:
+            pending.done.wait()
+            if pending.standings is None:
+                #the load failed, so this caller tries again
+                return self.get(tournament, load)
+            return list(pending.standings)
+        try:
+            standings = tuple(load())
+        except BaseException:
+            with self._lock:
+                self._endLoad(tournament, start)
+                if self._loads.get(tournament) is pending:
+                    del self._loads[tournament]
+            pending.done.set()
+            raise
+        with self._lock:
+            if self._endLoad(tournament, start):
+                expires = None if self.ttl is None else self.clock() + self.ttl
+                self._put(tournament, (standings, expires))
+            if self._loads.get(tournament) is pending:
+                del self._loads[tournament]
+            pending.standings = standings
+        pending.done.set()
+        return list(standings)
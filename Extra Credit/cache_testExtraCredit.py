@@ -0,0 +1,220 @@
+#!/usr/bin/env python
+#
+# Test cases for cacheExtraCredit.py
+
+import threading
+import time
+
+from cacheExtraCredit import *
+
+
+PLAYERS = [(1, 'Ann'), (2, 'Bob'), (3, 'Cy'), (4, 'Dee')]
+
+
+class Load(object):
+    """A load of a tournament that counts its calls, and that blocks until it
+    is released once blocked"""
+
+    def __init__(self, value):
+        self.value = value
+        self.calls = 0
+        self.error = None
+        self.started = threading.Event()
+        self.released = threading.Event()
+        self.released.set()
+
+    def block(self):
+        self.started.clear()
+        self.released.clear()
+
+    def release(self, error=None):
+        self.error = error
+        self.released.set()
+
+    def __call__(self):
+        self.calls += 1
+        self.started.set()
+        self.released.wait()
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+
+class Clock(object):
+    """A clock that only moves when told to"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def waitFor(condition, timeout=5):
+    """Waits until a condition holds, and returns whether it does"""
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.001)
+    return condition()
+
+
+def inThread(function, *args):
+    """Starts calling a function in a thread, and returns the thread and a
+    dictionary its 'result' or 'error' is put in"""
+    outcome = {}
+
+    def run():
+        try:
+            outcome['result'] = function(*args)
+        except Exception as e:
+            outcome['error'] = e
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread, outcome
+
+
+def testPairingEvictions():
+    cache = PairingStateCache(2)
+    loads = dict((t, Load((PLAYERS, []))) for t in (1, 2, 3))
+    for t in (1, 2, 1, 3, 1, 2):
+        cache.get(t, loads[t])
+    if [loads[t].calls for t in (1, 2, 3)] != [1, 2, 1]:
+        raise ValueError("The tournament paired longest ago should be dropped first.")
+    if cache.evictions != 2 or len(cache) != 2:
+        raise ValueError("Each tournament dropped should count as an eviction.")
+    print "1. The pairing state of the tournament paired longest ago is dropped."
+
+
+def testPairingInvalidatedWhileLoading():
+    cache = PairingStateCache(2)
+    load = Load((PLAYERS, [(1, 2, 1)]))
+    load.block()
+    thread, outcome = inThread(cache.get, 1, load)
+    load.started.wait()
+    cache.invalidate(1)
+    load.release()
+    thread.join()
+    if outcome['result'][0][0] != (1, 'Ann', 1):
+        raise ValueError("A state loaded while its tournament changed should still be returned.")
+    cache.get(1, load)
+    if load.calls != 2:
+        raise ValueError("A state loaded while its tournament changed should not be kept.")
+    print "2. A pairing state loaded while its tournament changes isn't kept."
+
+
+def testPairingWhileWriting():
+    cache = PairingStateCache(2)
+    before = Load((PLAYERS, []))
+    cache.get(1, before)
+    during = Load((PLAYERS, [(1, 2, 1)]))
+    with cache.writing([1]) as played:
+        played.append((1, 2, 1, 1))
+        if cache.get(1, during)[0][0] != (1, 'Ann', 1) or during.calls != 1:
+            raise ValueError("A tournament being written to should be paired from the store.")
+    standings, history, colours = cache.get(1, during)
+    if during.calls != 1 or standings[0] != (1, 'Ann', 1) or 2 not in history[1]:
+        raise ValueError("The matches written should be added to the state held once written.")
+    try:
+        with cache.writing([1]) as played:
+            raise RuntimeError
+    except RuntimeError:
+        pass
+    cache.get(1, during)
+    if during.calls != 2:
+        raise ValueError("A tournament should be dropped if writing to it fails.")
+    print "3. A pairing state is read from the store while results are written."
+
+
+def testStandingsEvictions():
+    cache = StandingsCache(2, clock=Clock())
+    loads = dict((t, Load([(t, 'Ann', 0, 0)])) for t in (1, 2, 3))
+    for t in (1, 2, 1, 3):
+        cache.get(t, loads[t])
+    if cache.stats() != {'hits': 1, 'misses': 3, 'expirations': 0, 'evictions': 1, 'size': 2}:
+        raise ValueError("Adding a third tournament to a cache of two should evict one.")
+    cache.get(1, loads[1])
+    cache.get(2, loads[2])
+    if [loads[t].calls for t in (1, 2, 3)] != [1, 2, 1]:
+        raise ValueError("The standings viewed longest ago should be dropped first.")
+    print "4. The standings viewed longest ago are dropped."
+
+
+def testStandingsExpire():
+    clock = Clock()
+    cache = StandingsCache(2, ttl=10, clock=clock)
+    load = Load([(1, 'Ann', 0, 0)])
+    cache.get(1, load)
+    clock.now = 9.5
+    cache.get(1, load)
+    if load.calls != 1:
+        raise ValueError("Standings younger than ttl should come from the cache.")
+    clock.now = 10
+    if cache.get(1, load) != [(1, 'Ann', 0, 0)] or load.calls != 2:
+        raise ValueError("Standings as old as ttl should be read again.")
+    clock.now = 19.5
+    cache.get(1, load)
+    if cache.stats()['expirations'] != 1 or load.calls != 2:
+        raise ValueError("Standings read again should be kept for another ttl.")
+    print "5. Standings older than ttl are read again."
+
+
+def testStandingsInvalidatedWhileLoading():
+    cache = StandingsCache(2, clock=Clock())
+    old, new = Load([(1, 'Ann', 0, 0)]), Load([(1, 'Ann', 1, 1)])
+    old.block()
+    thread, outcome = inThread(cache.get, 1, old)
+    old.started.wait()
+    cache.invalidate(1)
+    #a caller after the change doesn't wait for the read started before it
+    if cache.get(1, new) != [(1, 'Ann', 1, 1)]:
+        raise ValueError("Standings asked for after a change should be read after it.")
+    old.release()
+    thread.join()
+    if outcome['result'] != [(1, 'Ann', 0, 0)]:
+        raise ValueError("A read started before a change should still return what it read.")
+    cache.get(1, new)
+    if old.calls != 1 or new.calls != 1:
+        raise ValueError("Standings read before a change should not replace those read after it.")
+    cache.invalidate(1)
+    old.block()
+    thread, outcome = inThread(cache.get, 1, old)
+    old.started.wait()
+    cache.invalidate(1)
+    old.release()
+    thread.join()
+    cache.get(1, new)
+    if old.calls != 2 or new.calls != 2:
+        raise ValueError("Standings read while their tournament changed should not be kept.")
+    print "6. Standings read while their tournament changes aren't kept."
+
+
+def testStandingsFailedLoad():
+    cache = StandingsCache(2, clock=Clock())
+    failing, working = Load([(1, 'Ann', 0, 0)]), Load([(1, 'Ann', 0, 0)])
+    failing.block()
+    first, failed = inThread(cache.get, 1, failing)
+    failing.started.wait()
+    second, retried = inThread(cache.get, 1, working)
+    if not waitFor(lambda: cache.stats()['hits'] == 1):
+        raise ValueError("A caller should wait for a read of the same standings in progress.")
+    failing.release(RuntimeError("The store is down."))
+    first.join()
+    second.join()
+    if not isinstance(failed.get('error'), RuntimeError):
+        raise ValueError("The caller whose read failed should get its error.")
+    if retried.get('result') != [(1, 'Ann', 0, 0)] or working.calls != 1:
+        raise ValueError("A caller waiting for a read that failed should read the standings itself.")
+    if cache.stats()['misses'] != 2 or len(cache) != 1:
+        raise ValueError("The read retried should be kept.")
+    print "7. A caller waiting for a read that fails reads the standings itself."
+
+
+if __name__ == '__main__':
+    testPairingEvictions()
+    testPairingInvalidatedWhileLoading()
+    testPairingWhileWriting()
+    testStandingsEvictions()
+    testStandingsExpire()
+    testStandingsInvalidatedWhileLoading()
+    testStandingsFailedLoad()
+    print "Success!  All tests pass!"
@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+#
+# exportExtraCredit.py -- streams the standings and pairings of a tournament
+# out as CSV or newline-delimited JSON
+#
+# The writers in this module take any iterable of rows, such as the
+# iterators returned by tournamentExtraCredit.iterStandings() and
+# iterPairings(), and write them to a file object a row at a time, so an
+# export holds a row in memory however large the event is.  A socket is
+# written through the file object returned by its makefile('w').  Type, for
+# example,
+#
+#   python exportExtraCredit.py standings 1 --format ndjson > standings.ndjson
+#
+# to export the standings of tournament 1.
+#
+
+import argparse
+import collections
+import csv
+import json
+import sys
+
+import tournamentExtraCredit as tournament
+
+
+#the names of the columns of the rows of iterStandings() and iterPairings()
+STANDINGS_COLUMNS = ('id', 'name', 'wins', 'matches')
+PAIRINGS_COLUMNS = ('id1', 'name1', 'id2', 'name2')
+
+FORMATS = ('csv', 'ndjson')
+
+#the rows written between flushes of the file, so that whoever reads it gets
+#them as they come instead of when the buffer fills up
+FLUSH_ROWS = 1000
+
+
+def _flush(out):
+    if hasattr(out, 'flush'):
+        out.flush()
+
+
+def _csvValue(value):
+    """Returns a value as the csv module of this Python version writes it:
+    Python 2 writes bytes, so text is encoded as UTF-8"""
+    if str is bytes and isinstance(value, type(u'')):
+        return value.encode('utf-8')
+    return value
+
+
+def writeCsv(rows, out, columns, header=True, flushRows=FLUSH_ROWS):
+    """Writes rows to a file as CSV and returns the number of rows written.
+
+    Args:
+      rows: an iterable of tuples of values
+      out: the file to write to, opened as text on Python 3 and as bytes on
+        Python 2, as the csv module takes it
+      columns: the names of the values in each row
+      header: True to write the names of the columns first
+      flushRows: the rows written between flushes of the file
+    """
+    writer = csv.writer(out, lineterminator='\n')
+    if header:
+        writer.writerow(columns)
+    count = 0
+    for row in rows:
+        writer.writerow([_csvValue(value) for value in row])
+        count += 1
+        if count % flushRows == 0:
+            _flush(out)
+    _flush(out)
+    return count
+
+
+def writeNdjson(rows, out, columns, flushRows=FLUSH_ROWS):
+    """Writes rows to a file as JSON objects of the names of the columns and
+    their values, one a line, and returns the number of rows written.
+
+    Args:
+      rows: an iterable of tuples of values
+      out: the file to write to
+      columns: the names of the values in each row, in the order they are
+        written in each object
+      flushRows: the rows written between flushes of the file
+    """
+    count = 0
+    for row in rows:
+        out.write(json.dumps(collections.OrderedDict(zip(columns, row))) + '\n')
+        count += 1
+        if count % flushRows == 0:
+            _flush(out)
+    _flush(out)
+    return count
+
+
+def _write(rows, out, columns, format):
+    if format == 'csv':
+        return writeCsv(rows, out, columns)
+    if format == 'ndjson':
+        return writeNdjson(rows, out, columns)
+    raise ValueError("Unknown format %r." % (format,))
+
+
+def exportStandings(tournamentId, out, format='csv', itersize=tournament.STREAM_ITERSIZE):
+    """Streams the standings of a tournament to a file and returns the number
+    of rows written.
+
+    Args:
+      tournamentId: the id number of the tournament
+      out: the file to write to
+      format: 'csv' or 'ndjson'
+      itersize: the rows fetched from the database at a time
+    """
+    if format not in FORMATS:
+        raise ValueError("Unknown format %r." % (format,))
+    return _write(tournament.iterStandings(tournamentId, itersize), out, STANDINGS_COLUMNS, format)
+
+
+def exportPairings(tournamentId, out, format='csv', method='greedy', tiebreaks=False):
+    """Streams the pairings of the next round of a tournament to a file and
+    returns the number of pairs written.
+
+    Args:
+      tournamentId: the id number of the tournament
+      out: the file to write to
+      format: 'csv' or 'ndjson'
+      method: the pairing method, as taken by tournamentExtraCredit.swissPairings()
+      tiebreaks: True to pair players in the order of the tiebreaks
+    """
+    if format not in FORMATS:
+        raise ValueError("Unknown format %r." % (format,))
+    return _write(tournament.iterPairings(tournamentId, method, tiebreaks), out,
+                  PAIRINGS_COLUMNS, format)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Stream the standings or the next '
+                                     'pairings of a tournament to the standard output.')
+    parser.add_argument('what', choices=['standings', 'pairings'])
+    parser.add_argument('tournament', type=int)
+    parser.add_argument('--format', choices=FORMATS, default='csv')
+    parser.add_argument('--itersize', type=int, default=tournament.STREAM_ITERSIZE,
+                        help='rows of the standings fetched at a time')
+    parser.add_argument('--method', choices=['greedy', 'matching'], default='greedy')
+    args = parser.parse_args()
+    if args.what == 'standings':
+        exportStandings(args.tournament, sys.stdout, args.format, args.itersize)
+    else:
+        exportPairings(args.tournament, sys.stdout, args.format, args.method)
+
+
+if __name__ == '__main__':
+    main()
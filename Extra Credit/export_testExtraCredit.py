@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Test cases for exportExtraCredit.py, which need no database
+
+import io
+import json
+
+import storageExtraCredit as storage
+import tournamentExtraCredit as tournament
+from exportExtraCredit import *
+
+
+ROWS = [(1, u'Zoë', 2, 2), (2, u'Łukasz', 1, 2), (3, u'Ana, "Ani"', 0, 2)]
+
+
+class Out(object):
+    """A file that counts its flushes, opened as the csv module of this
+    Python version takes it"""
+
+    def __init__(self):
+        self.file = io.BytesIO() if str is bytes else io.StringIO()
+        self.flushes = 0
+
+    def write(self, text):
+        return self.file.write(text)
+
+    def flush(self):
+        self.flushes += 1
+
+    def text(self):
+        value = self.file.getvalue()
+        return value.decode('utf-8') if isinstance(value, bytes) else value
+
+
+def testCsv():
+    out = Out()
+    if writeCsv(iter(ROWS), out, STANDINGS_COLUMNS, flushRows=2) != 3:
+        raise ValueError("writeCsv() should return the number of rows written.")
+    lines = out.text().split(u'\n')
+    if lines != [u'id,name,wins,matches', u'1,Zoë,2,2', u'2,Łukasz,1,2', u'3,"Ana, ""Ani""",0,2', u'']:
+        raise ValueError("writeCsv() should write the header, then the rows, names as UTF-8.")
+    if out.flushes != 2:
+        raise ValueError("writeCsv() should flush every flushRows rows and at the end.")
+    out = Out()
+    if writeCsv([], out, STANDINGS_COLUMNS, header=False) != 0 or out.text() != u'':
+        raise ValueError("writeCsv() of no rows without a header should write nothing.")
+    print "1. writeCsv() writes a header and the rows, whatever the names are."
+
+
+def testNdjson():
+    out = Out()
+    if writeNdjson(iter(ROWS), out, STANDINGS_COLUMNS, flushRows=2) != 3:
+        raise ValueError("writeNdjson() should return the number of rows written.")
+    lines = out.text().split(u'\n')
+    if lines[-1] != u'' or [json.loads(line) for line in lines[:-1]] != [
+            dict(zip(STANDINGS_COLUMNS, row)) for row in ROWS]:
+        raise ValueError("writeNdjson() should write an object of each row a line.")
+    if not lines[0].startswith(u'{"id": 1, "name": '):
+        raise ValueError("writeNdjson() should write the columns in order.")
+    if out.flushes != 2:
+        raise ValueError("writeNdjson() should flush every flushRows rows and at the end.")
+    print "2. writeNdjson() writes an object a line, whatever the names are."
+
+
+def testExportStandings():
+    tournament.setStore(storage.MemoryStore())
+    t = tournament.registerTournament()
+    a, b = tournament.registerPlayers([u'Zoë', u'Łukasz'])
+    tournament.registerTournamentPlayers([a, b], t)
+    tournament.reportMatch(a, b, b, t)
+    out = Out()
+    if exportStandings(t, out) != 2:
+        raise ValueError("exportStandings() should return the number of players written.")
+    if out.text() != u'id,name,wins,matches\n%d,Łukasz,1,1\n%d,Zoë,0,1\n' % (b, a):
+        raise ValueError("exportStandings() should write the standings in order.")
+    try:
+        exportStandings(t, Out(), 'xml')
+    except ValueError:
+        pass
+    else:
+        raise ValueError("exportStandings() should reject unknown formats.")
+    print "3. exportStandings() writes the standings of a tournament."
+
+
+if __name__ == '__main__':
+    testCsv()
+    testNdjson()
+    testExportStandings()
+    print "Success!  All tests pass!"
@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+#
+# Test cases for tournamentExtraCredit.py on a MemoryStore, which need no
+# database
+
+import ratingExtraCredit as rating
+import storageExtraCredit as storage
+import tournamentExtraCredit as tournament
+
+
+def newTournament(players):
+    """Starts a new MemoryStore holding a tournament of players, and returns
+    the tournament and the ids of the players"""
+    tournament.setStore(storage.MemoryStore())
+    tournament.configureByes()
+    t = tournament.registerTournament()
+    ids = tournament.registerPlayers(['Player %d' % n for n in range(players)])
+    tournament.registerTournamentPlayers(ids, t)
+    return t, ids
+
+
+def testResultsRecordedOnce():
+    t, ids = newTournament(4)
+    number, pairings = tournament.startRound(t)
+    (table1, a, name1, b, name2), (table2, c, name3, d, name4) = pairings
+    first = tournament.reportTable(t, table1, a, number)
+    if tournament.reportTable(t, table1, a, number) != first:
+        raise ValueError("Reporting the result of a table again should return the match recorded.")
+    try:
+        tournament.reportTable(t, table1, b, number)
+    except storage.IntegrityError:
+        pass
+    else:
+        raise ValueError("A different result for a table with a result should be rejected.")
+    tournament.reportMatches([(c, d, 'tie', t)])
+    tournament.reportMatches([(c, d, 'tie', t)])
+    tournament.reportMatch(d, c, 'tie', t)
+    matches = tournament.getStore().results(t)[1]
+    if sorted(matches) != sorted([(a, b, a), (c, d, None)]):
+        raise ValueError("Each table should have exactly one match recorded.")
+    standings = dict((row[0], row[2:]) for row in tournament.playerStandings(t))
+    if standings != {a: (1, 1), b: (0, 1), c: (0, 1), d: (0, 1)}:
+        raise ValueError("The standings should count each match once.")
+    ratings = dict((row[0], row[2:]) for row in tournament.playerRatings(t))
+    expected = rating.rateMatches({}, [(a, b, a), (c, d, None)])
+    if ratings != expected:
+        raise ValueError("The ratings should count each match once.")
+    print "1. A result submitted again is recorded, scored and rated once."
+
+
+def testRoundsAndTables():
+    t, ids = newTournament(5)
+    if tournament.lastRound(t) != 0 or tournament.roundPairings(t) != []:
+        raise ValueError("A tournament should start without rounds.")
+    number, pairings = tournament.startRound(t)
+    if number != 1 or [row[0] for row in pairings] != [1, 2, 3]:
+        raise ValueError("The first round should be numbered 1, its tables from 1.")
+    seated = [row[1] for row in pairings] + [row[3] for row in pairings]
+    if sorted(seated) != [storage.BYE] + ids or pairings[-1][3] != storage.BYE:
+        raise ValueError("Every player should be seated once, and the bye at the last table.")
+    if tournament.roundPairings(t) != [row + (False,) for row in pairings]:
+        raise ValueError("roundPairings() should return the tables of the round started.")
+    tournament.reportTable(t, 1, pairings[0][1])
+    if [row[5] for row in tournament.roundPairings(t, 1)] != [True, False, False]:
+        raise ValueError("Only the table reported should have a result.")
+    try:
+        tournament.startRound(t)
+    except storage.IntegrityError:
+        pass
+    else:
+        raise ValueError("A round shouldn't start while tables of the last one have no result.")
+    tournament.reportMatch(pairings[1][3], pairings[1][1], pairings[1][3], t)
+    tournament.reportTable(t, 3, pairings[2][1])
+    if not all(row[5] for row in tournament.roundPairings(t)):
+        raise ValueError("Every table should have a result once each is reported.")
+    number, second = tournament.startRound(t)
+    if number != 2 or tournament.lastRound(t) != 2 or tournament.roundPairings(t) != [
+            row + (False,) for row in second]:
+        raise ValueError("Once every table has a result the next round should start.")
+    table, id1, name1, id2, name2 = pairings[0]
+    if tournament.reportTable(t, table, id1, round=1) != (id1, id2, id1):
+        raise ValueError("A table of an earlier round should keep its result.")
+    try:
+        tournament.reportTable(t, 4, ids[0])
+    except storage.IntegrityError:
+        pass
+    else:
+        raise ValueError("Reporting a table the round doesn't have should be rejected.")
+    print "2. Rounds are numbered, seated at tables and closed by their results."
+
+
+def testByePoints():
+    #a bye scores the points of the result configured when it is reported
+    for result, wins, points in (('win', 1, 3), ('tie', 0, 1), ('loss', 0, 0)):
+        t, ids = newTournament(3)
+        number, pairings = tournament.startRound(t)
+        table, player, name, bye, byeName = pairings[-1]
+        tournament.configureByes(result)
+        if tournament.getByeResult() != result:
+            raise ValueError("getByeResult() should return the result configured.")
+        winner = {'win': player, 'tie': None, 'loss': bye}[result]
+        if tournament.reportTable(t, table, player) != (player, bye, winner):
+            raise ValueError("A bye should be recorded as its result, lost to the bye if a loss.")
+        tournament.reportTable(t, pairings[0][0], pairings[0][1])
+        standings = dict((row[0], row) for row in tournament.playerStandings(t))
+        if standings[player][2:] != (wins, 1) or bye in standings:
+            raise ValueError("A bye scored as a %s should count as a match with %d wins." % (result, wins))
+        ranked = dict((row[0], row) for row in tournament.tiebreakStandings(t))
+        if ranked[player][4:6] != (1 if result == 'tie' else 0, points):
+            raise ValueError("A bye scored as a %s should be worth %d points." % (result, points))
+        if ranked[player][7] != 0:
+            raise ValueError("A bye shouldn't count towards the tiebreaks.")
+        if dict((row[0], row[6]) for row in tournament.playerRatings(t))[player] != 0:
+            raise ValueError("A bye shouldn't be rated.")
+    try:
+        tournament.configureByes('forfeit')
+    except ValueError:
+        pass
+    else:
+        raise ValueError("configureByes() should reject results other than a win, a tie or a loss.")
+    tournament.configureByes()
+    print "3. A bye is scored as a win, a tie or a loss as configureByes() sets."
+
+
+if __name__ == '__main__':
+    testResultsRecordedOnce()
+    testRoundsAndTables()
+    testByePoints()
+    print "Success!  All tests pass!"
@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+#
+# Test cases for tournamentExtraCredit.py that need the database: results
+# written while rounds are paired, and the calls instrument records
+
+import threading
+import time
+
+import instrument
+import tournamentExtraCredit as tournament
+
+
+def newTournament(players):
+    """Starts a tournament of players on a pool of two connections, and
+    returns the tournament and the ids of the players; a lock waited for
+    longer than 10 seconds raises, so that a deadlock fails the tests
+    instead of hanging them"""
+    tournament.configurePool(2, tournament.DSN + " options='-c lock_timeout=10s'")
+    tournament.deleteMatches()
+    tournament.deletePlayers()
+    t = tournament.registerTournament()
+    ids = tournament.registerPlayers(['Player %d' % n for n in range(players)])
+    tournament.registerTournamentPlayers(ids, t)
+    return t, ids
+
+
+def testWritersOutnumberConnections():
+    t, ids = newTournament(8)
+    number, pairings = tournament.startRound(t)
+    for table, id1, name1, id2, name2 in pairings:
+        tournament.reportTable(t, table, id1)
+    store = tournament.getStore()
+    locked = threading.Event()
+    stop = threading.Event()
+    started = []
+    errors = []
+
+    def pair():
+        #what startRound() does while it holds the lock of the tournament
+        with store.lockTournaments([t], wait=True):
+            locked.set()
+            time.sleep(0.5)
+            store.results(t)
+            store.pairingState(t)
+            started.append(store.addRound(t, [(id1, id2) for table, id1, name1, id2, name2 in pairings]))
+
+    def write():
+        #a scorekeeper submitting the results of the first round again
+        try:
+            while not stop.is_set():
+                for table, id1, name1, id2, name2 in pairings:
+                    tournament.reportTable(t, table, id1, number)
+        except Exception as e:
+            errors.append(e)
+    holder = threading.Thread(target=pair)
+    holder.daemon = True
+    holder.start()
+    locked.wait()
+    writers = [threading.Thread(target=write) for n in range(6)]
+    for writer in writers:
+        writer.daemon = True
+        writer.start()
+    holder.join(30)
+    stop.set()
+    if holder.is_alive() or started != [2]:
+        raise ValueError("A round should start while more scorekeepers than connections submit results.")
+    for writer in writers:
+        writer.join()
+    if errors:
+        raise errors[0]
+    if any(row[3] != 1 for row in tournament.playerStandings(t)):
+        raise ValueError("Each result submitted again should be recorded once.")
+    tournament.deleteTournament(t)
+    print "1. A round starts while more scorekeepers than connections submit results."
+
+
+def testRoundStartedWithoutCheckout():
+    t, ids = newTournament(5)
+    store = tournament.getStore()
+    taken = threading.Semaphore(0)
+    release = threading.Event()
+    outcome = []
+
+    def hold():
+        with store.cursor():
+            taken.release()
+            release.wait()
+    holders = [threading.Thread(target=hold) for n in range(2)]
+    for holder in holders:
+        holder.start()
+    for holder in holders:
+        taken.acquire()
+    starter = threading.Thread(target=lambda: outcome.append(tournament.startRound(t)))
+    starter.daemon = True
+    starter.start()
+    starter.join(30)
+    release.set()
+    for holder in holders:
+        holder.join()
+    if starter.is_alive() or not outcome:
+        raise ValueError("startRound() should pair and record a round on the connection holding its lock.")
+    if outcome[0][0] != 1 or tournament.roundPairings(t) != [row + (False,) for row in outcome[0][1]]:
+        raise ValueError("startRound() should record the round it paired.")
+    tournament.deleteTournament(t)
+    print "2. A round starts while every connection of the pool is checked out."
+
+
+def testStreamRecorded():
+    t, ids = newTournament(25)
+    instrument.reset()
+    instrument.enable(trace=True)
+    try:
+        rows = list(tournament.iterStandings(t, 10))
+        streamed = tournament.iterStandings(t, 10)
+        next(streamed)
+        streamed.close()
+    finally:
+        instrument.disable()
+    calls = [(call['function'], call['rows'], call['checkouts']) for call in instrument.trace()]
+    instrument.reset()
+    if len(rows) != 25:
+        raise ValueError("iterStandings() should yield every player.")
+    if calls != [('tournamentExtraCredit.iterStandings', 25, 1), ('tournamentExtraCredit.iterStandings', 1, 1)]:
+        raise ValueError("iterStandings() should be recorded once read, with the rows it streamed.")
+    tournament.deleteTournament(t)
+    print "3. iterStandings() is recorded with the rows it streams."
+
+
+if __name__ == '__main__':
+    testWritersOutnumberConnections()
+    testRoundStartedWithoutCheckout()
+    testStreamRecorded()
+    print "Success!  All tests pass!"
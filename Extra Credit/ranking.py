@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+#
+# ranking.py -- standings and tiebreaks of a Swiss-system tournament
+#
+# The functions in this module rank the players from the whole match table,
+# read once into NumPy arrays, instead of sorting on points alone as the
+# standings views do.  NumPy is imported by the functions that use it.
+#
+
+#the tiebreaks that order players on equal points, by default in this order:
+#  headToHead: the points scored in the matches against players on equal points
+#  buchholz: the sum of the points of the opponents played
+#  sonnebornBerger: the sum of the points of the opponents beaten, and half the
+#    points of the opponents tied with
+#  omw: the mean match-win percentage of the opponents played, each counted as
+#    at least MIN_MATCH_WIN
+TIEBREAKS = ('headToHead', 'buchholz', 'sonnebornBerger', 'omw')
+
+#the columns of the standings returned by computeStandings()
+COLUMNS = ('id', 'matches', 'wins', 'ties', 'points') + TIEBREAKS
+
+MIN_MATCH_WIN = 1.0 / 3
+
+
+def matchArrays(matches):
+    """Returns the id1, id2 and winner columns of a list of matches as NumPy
+    arrays, with -1 as the winner of a tie
+
+    Args:
+      matches: a list of (id1, id2, winner) tuples, with None as the winner of
+        a tie, or an array of three columns
+    """
+    import itertools
+    import numpy
+    if isinstance(matches, numpy.ndarray) and matches.dtype != object:
+        table = numpy.asarray(matches, dtype=numpy.int64).reshape(-1, 3)
+    else:
+        #the values are read straight out of the flattened rows, which is
+        #quicker than building an array of the rows
+        matches = list(matches)
+        count = 3 * len(matches)
+        try:
+            flat = numpy.fromiter(itertools.chain.from_iterable(matches), numpy.int64, count)
+        except TypeError:
+            #some of the matches are ties
+            flat = numpy.fromiter((-1 if value is None else value
+                                   for value in itertools.chain.from_iterable(matches)),
+                                  numpy.int64, count)
+        table = flat.reshape(-1, 3)
+    #each column is copied out of the rows, so the arithmetic on it runs over
+    #contiguous memory
+    return tuple(numpy.ascontiguousarray(table[:, n]) for n in range(3))
+
+
+def _indexer(ids):
+    """Returns a function mapping an array of ids to their places in ids, and
+    whether each of them is in ids at all"""
+    import numpy
+    if len(ids) == 0:
+        return lambda x: (numpy.zeros(len(x), numpy.int64), numpy.zeros(len(x), bool))
+    first, last = ids.min(), ids.max()
+    if last - first < 8 * len(ids):
+        #ids handed out by a serial column have few gaps, so they are looked
+        #up in a table covering their range, with -1 for the gaps
+        places = numpy.full(last - first + 1, -1, numpy.int64)
+        places[ids - first] = numpy.arange(len(ids))
+
+        def index(x):
+            inRange = (x >= first) & (x <= last)
+            if inRange.all():
+                place = places[x - first]
+            else:
+                place = numpy.where(inRange, places[numpy.where(inRange, x - first, 0)], -1)
+            found = place >= 0
+            return numpy.maximum(place, 0), found
+        return index
+    order = numpy.argsort(ids, kind='mergesort')
+    sortedIds = ids[order]
+
+    def index(x):
+        place = numpy.minimum(numpy.searchsorted(sortedIds, x), len(ids) - 1)
+        return order[place], sortedIds[place] == x
+    return index
+
+
+def computeStandings(ids, matches, win=1, tie=0.5, bye=None, tiebreaks=TIEBREAKS):
+    """Returns the standings of players, ranked by points and then tiebreaks.
+
+    Each player is given the points of their wins and ties in the matches.
+    The matches of the bye count towards the points of the player given the
+    bye, but not towards the tiebreaks of anybody else, and matches against
+    players that aren't ranked count towards nobody's tiebreaks.  Players
+    still level after every tiebreak are ranked by id.
+
+    Args:
+      ids: the id numbers of the players to rank
+      matches: a list of (id1, id2, winner) tuples, as taken by matchArrays()
+      win: the points for a win
+      tie: the points for a tie
+      bye: the id number of the player standing in for the bye, if any
+      tiebreaks: the names of the columns that order players on equal points,
+        from TIEBREAKS or 'wins'
+
+    Returns:
+      A dictionary of the names in COLUMNS and NumPy arrays of their values,
+      in the order of the standings
+    """
+    import numpy
+    for name in tiebreaks:
+        if name not in TIEBREAKS + ('wins',):
+            raise ValueError("Unknown tiebreak %r." % (name,))
+    ids = numpy.asarray(ids, dtype=numpy.int64).reshape(-1)
+    n = len(ids)
+    id1, id2, winner = matchArrays(matches)
+    #each match is counted once from the side of each of its players: the
+    #places of the player and the opponent in ids, and the result for the
+    #player, 0 for a loss, 1 for a tie and 2 for a win
+    index = _indexer(ids)
+    i1, ranked1 = index(id1)
+    i2, ranked2 = index(id2)
+    result1 = (winner == id1).astype(numpy.int8) - (winner == id2) + 1
+    player = numpy.concatenate([i1, i2])
+    opponent = numpy.concatenate([i2, i1])
+    result = numpy.concatenate([result1, 2 - result1])
+    ranked = numpy.concatenate([ranked1, ranked2])
+    counted = numpy.concatenate([ranked2, ranked1])
+    if bye is not None:
+        notBye = numpy.concatenate([id2 != bye, id1 != bye])
+        counted &= notBye
+    if not ranked.all():
+        player, opponent, result, counted = (
+            player[ranked], opponent[ranked], result[ranked], counted[ranked])
+
+    #the losses, ties and wins of each player
+    results = numpy.bincount(player * 3 + result, minlength=3 * n).reshape(n, 3)
+    played = results.sum(axis=1)
+    points = (win * results[:, 2] + tie * results[:, 1]).astype(float)
+    columns = {'matches': played, 'wins': results[:, 2], 'ties': results[:, 1], 'points': points}
+
+    #the matches between ranked players that count towards the tiebreaks
+    if not counted.all():
+        player, opponent, result = player[counted], opponent[counted], result[counted]
+    opponentPoints = points[opponent]
+    if 'headToHead' in tiebreaks:
+        level = numpy.flatnonzero(points[player] == opponentPoints)
+        pointsFor = numpy.array([0, tie, win], dtype=float)[result[level]]
+        columns['headToHead'] = numpy.bincount(player[level], weights=pointsFor, minlength=n)
+    if 'buchholz' in tiebreaks:
+        columns['buchholz'] = numpy.bincount(player, weights=opponentPoints, minlength=n)
+    if 'sonnebornBerger' in tiebreaks:
+        score = numpy.array([0, 0.5, 1])[result]
+        columns['sonnebornBerger'] = numpy.bincount(player, weights=opponentPoints * score, minlength=n)
+    if 'omw' in tiebreaks:
+        available = win * played
+        matchWin = numpy.maximum(
+            numpy.where(available > 0, points / numpy.maximum(available, 1), 0), MIN_MATCH_WIN)
+        faced = numpy.bincount(player, minlength=n)
+        columns['omw'] = numpy.where(
+            faced > 0, numpy.bincount(player, weights=matchWin[opponent], minlength=n)
+            / numpy.maximum(faced, 1), 0)
+    for name in TIEBREAKS:
+        columns.setdefault(name, numpy.zeros(n))
+
+    #numpy.lexsort sorts on the last key first, and keeps players level on
+    #every key in the order they were given, so sorted ids need no key
+    keys = [-columns[name] for name in reversed(tiebreaks)] + [-points]
+    if n > 1 and not (ids[1:] > ids[:-1]).all():
+        keys.insert(0, ids)
+    order = numpy.lexsort(keys)
+    standings = dict((name, columns[name][order]) for name in columns)
+    standings['id'] = ids[order]
+    return standings
+
+
+def standingsRows(standings, columns=COLUMNS):
+    """Returns standings computed by computeStandings() as a list of tuples of
+    plain Python values
+
+    Args:
+      standings: the dictionary returned by computeStandings()
+      columns: the names of the columns in each tuple
+    """
+    return list(zip(*[standings[name].tolist() for name in columns]))
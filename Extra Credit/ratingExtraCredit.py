@@ -0,0 +1,267 @@
+#!/usr/bin/env python
+#
+# ratingExtraCredit.py -- Elo and Glicko-2 ratings of the players
+#
+# Every player has an Elo rating and a Glicko-2 rating, deviation and
+# volatility, carried from one tournament to the next.  The stores rate each
+# match with rateMatches() as it is recorded, and computeRatings() works the
+# ratings of every player out again from the whole history of matches at
+# once, with NumPy, for a backfill.  Each match is a rating period of its own
+# for Glicko-2, so the ratings don't depend on how the matches are grouped
+# into rounds, and a tie scores half a win.  Byes aren't rated.  NumPy is
+# imported by the functions that use it.
+#
+
+import math
+
+import ranking
+
+
+ELO_START = 1500.0
+#how far a single match moves an Elo rating
+ELO_K = 32.0
+
+GLICKO_START = 1500.0
+GLICKO_DEVIATION = 350.0
+GLICKO_VOLATILITY = 0.06
+#the system constant tau, which limits how fast the volatility changes
+GLICKO_TAU = 0.5
+#converts ratings and deviations between the Glicko and the Glicko-2 scales
+GLICKO_SCALE = 173.7178
+#the tolerance of the iteration finding the new volatility
+GLICKO_EPSILON = 1e-6
+
+#the names of the ratings of a player, and the ratings of a player who hasn't
+#played a rated match
+COLUMNS = ('elo', 'glicko', 'deviation', 'volatility', 'games')
+START = (ELO_START, GLICKO_START, GLICKO_DEVIATION, GLICKO_VOLATILITY, 0)
+
+
+def _score(id1, id2, winner):
+    """Returns the score of the first player of a match: 1 for a win, 0 for a
+    loss and 0.5 for a tie"""
+    return 1.0 if winner == id1 else 0.0 if winner == id2 else 0.5
+
+
+def _volatility(phi, sigma, delta, v):
+    """Returns the new volatility of a player, found by the Illinois
+    algorithm as step 5 of Glickman's description of Glicko-2 finds it"""
+    a = math.log(sigma ** 2)
+    base, square = phi ** 2 + v, delta ** 2
+
+    def f(x):
+        ex = math.exp(x)
+        return ex * (square - base - ex) / (2 * (base + ex) ** 2) - (x - a) / GLICKO_TAU ** 2
+    A = a
+    if square > base:
+        B = math.log(square - base)
+    else:
+        B = a - GLICKO_TAU
+        while f(B) < 0:
+            B -= GLICKO_TAU
+    fA, fB = f(A), f(B)
+    while abs(B - A) > GLICKO_EPSILON:
+        C = A + (A - B) * fA / (fB - fA)
+        fC = f(C)
+        if fC * fB < 0:
+            A, fA = B, fB
+        else:
+            fA /= 2
+        B, fB = C, fC
+    return math.exp(A / 2)
+
+
+def ratePeriod(glicko, deviation, volatility, games):
+    """Returns the Glicko-2 rating of a player after a rating period, as
+    Glickman's description of Glicko-2 works it out.
+
+    Args:
+      glicko: the rating of the player before the period, on the Glicko scale
+      deviation: the rating deviation of the player, on the Glicko scale
+      volatility: the volatility of the player
+      games: a list of the (glicko, deviation, score) of the opponents the
+        player played in the period, with their ratings before it and the
+        score of the player, 1 for a win, 0.5 for a tie and 0 for a loss
+
+    Returns:
+      A tuple of the new rating, deviation and volatility
+    """
+    mu, phi = (glicko - GLICKO_START) / GLICKO_SCALE, deviation / GLICKO_SCALE
+    if not games:
+        return glicko, GLICKO_SCALE * math.sqrt(phi ** 2 + volatility ** 2), volatility
+    information = improvement = 0.0
+    for opponentGlicko, opponentDeviation, score in games:
+        opponentMu = (opponentGlicko - GLICKO_START) / GLICKO_SCALE
+        g = 1 / math.sqrt(1 + 3 * (opponentDeviation / GLICKO_SCALE) ** 2 / math.pi ** 2)
+        expected = 1 / (1 + math.exp(-g * (mu - opponentMu)))
+        information += g ** 2 * expected * (1 - expected)
+        improvement += g * (score - expected)
+    v = 1 / information
+    volatility = _volatility(phi, volatility, v * improvement, v)
+    phi = 1 / math.sqrt(1 / (phi ** 2 + volatility ** 2) + 1 / v)
+    return GLICKO_START + GLICKO_SCALE * (mu + phi ** 2 * improvement), GLICKO_SCALE * phi, volatility
+
+
+def rateMatch(ratings1, ratings2, score):
+    """Returns the ratings of the two players of a match after it.
+
+    Args:
+      ratings1: the (elo, glicko, deviation, volatility, games) of the first
+        player before the match
+      ratings2: the ratings of the second player before the match
+      score: 1 if the first player won, 0.5 for a tie and 0 if they lost
+
+    Returns:
+      A tuple of the new ratings of the first player and of the second one
+    """
+    elo1, glicko1, deviation1, volatility1, games1 = ratings1
+    elo2, glicko2, deviation2, volatility2, games2 = ratings2
+    change = ELO_K * (score - 1 / (1 + 10 ** ((elo2 - elo1) / 400)))
+    new1 = ratePeriod(glicko1, deviation1, volatility1, [(glicko2, deviation2, score)])
+    new2 = ratePeriod(glicko2, deviation2, volatility2, [(glicko1, deviation1, 1 - score)])
+    return (elo1 + change,) + new1 + (games1 + 1,), (elo2 - change,) + new2 + (games2 + 1,)
+
+
+def rateMatches(ratings, matches, bye=None):
+    """Rates a list of matches one after the other.
+
+    Args:
+      ratings: a dictionary of the ids of the players and their (elo, glicko,
+        deviation, volatility, games), updated in place; a player missing
+        from it starts from START
+      matches: a list of (id1, id2, winner) tuples, with None as the winner of
+        a tie
+      bye: the id number of the player standing in for the bye, if any; the
+        matches against it aren't rated
+
+    Returns:
+      The ratings
+    """
+    for id1, id2, winner in matches:
+        if bye is not None and bye in (id1, id2):
+            continue
+        ratings[id1], ratings[id2] = rateMatch(ratings.get(id1, START), ratings.get(id2, START),
+                                               _score(id1, id2, winner))
+    return ratings
+
+
+def _waves(i1, i2, n):
+    """Returns the wave of each match of the players at places i1 and i2 out
+    of n, numbered from 1: each match comes in the wave after the last match
+    of either of its players, so no player plays twice in a wave"""
+    import numpy
+    last = [0] * n
+    waves = []
+    append = waves.append
+    for a, b in zip(i1.tolist(), i2.tolist()):
+        wave = max(last[a], last[b]) + 1
+        last[a] = last[b] = wave
+        append(wave)
+    return numpy.array(waves, dtype=numpy.int64)
+
+
+def _volatilities(phi, sigma, delta, v):
+    """Returns the new volatilities of players, as _volatility() finds each,
+    iterating only on those that haven't converged yet"""
+    import numpy
+    a = numpy.log(sigma ** 2)
+    base, square = phi ** 2 + v, delta ** 2
+
+    def f(x, n):
+        ex = numpy.exp(x)
+        return (ex * (square[n] - base[n] - ex) / (2 * (base[n] + ex) ** 2)
+                - (x - a[n]) / GLICKO_TAU ** 2)
+    A = a.copy()
+    above = square > base
+    B = numpy.where(above, numpy.log(numpy.where(above, square - base, 1)), a - GLICKO_TAU)
+    low = numpy.flatnonzero(~above)
+    while len(low):
+        low = low[f(B[low], low) < 0]
+        B[low] -= GLICKO_TAU
+    everyone = numpy.arange(len(a))
+    fA, fB = f(A, everyone), f(B, everyone)
+    n = numpy.flatnonzero(numpy.abs(B - A) > GLICKO_EPSILON)
+    while len(n):
+        An, Bn, fAn, fBn = A[n], B[n], fA[n], fB[n]
+        C = An + (An - Bn) * fAn / (fBn - fAn)
+        fC = f(C, n)
+        swap = fC * fBn < 0
+        A[n] = numpy.where(swap, Bn, An)
+        fA[n] = numpy.where(swap, fBn, fAn / 2)
+        B[n], fB[n] = C, fC
+        n = n[numpy.abs(C - A[n]) > GLICKO_EPSILON]
+    return numpy.exp(A / 2)
+
+
+def _glickos(mu, phi, sigma, opponentMu, opponentPhi, score):
+    """Returns the (mu, phi, sigma) of players on the Glicko-2 scale after a
+    game each, as ratePeriod() works out each of them"""
+    import numpy
+    g = 1 / numpy.sqrt(1 + 3 * opponentPhi ** 2 / math.pi ** 2)
+    expected = 1 / (1 + numpy.exp(-g * (mu - opponentMu)))
+    v = 1 / (g ** 2 * expected * (1 - expected))
+    sigma = _volatilities(phi, sigma, v * g * (score - expected), v)
+    phi = 1 / numpy.sqrt(1 / (phi ** 2 + sigma ** 2) + 1 / v)
+    return mu + phi ** 2 * g * (score - expected), phi, sigma
+
+
+def computeRatings(matches, bye=None):
+    """Returns the ratings of every player of a list of matches, rated from
+    START in order, as rateMatches() rates them, with NumPy.
+
+    A player's ratings only change in their own matches, so the matches are
+    split into waves in which nobody plays twice, each wave coming after the
+    last match of each of its players, and every match of a wave is rated at
+    once.  The ratings come out as rating the matches one at a time gives
+    them, and a history of millions of matches takes as many steps as the
+    most matches any player has played.
+
+    Args:
+      matches: a list of (id1, id2, winner) tuples, as taken by
+        ranking.matchArrays(), in the order they were played
+      bye: the id number of the player standing in for the bye, if any; the
+        matches against it aren't rated
+
+    Returns:
+      A dictionary of 'id' and the names in COLUMNS and NumPy arrays of their
+      values, one for each player in order of id
+    """
+    import numpy
+    id1, id2, winner = ranking.matchArrays(matches)
+    if bye is not None:
+        rated = (id1 != bye) & (id2 != bye)
+        if not rated.all():
+            id1, id2, winner = id1[rated], id2[rated], winner[rated]
+    ids, places = numpy.unique(numpy.concatenate([id1, id2]), return_inverse=True)
+    places = places.reshape(-1)
+    i1, i2 = places[:len(id1)], places[len(id1):]
+    score = numpy.where(winner == id1, 1.0, numpy.where(winner == id2, 0.0, 0.5))
+    n = len(ids)
+    elo = numpy.full(n, ELO_START)
+    mu = numpy.zeros(n)
+    phi = numpy.full(n, GLICKO_DEVIATION / GLICKO_SCALE)
+    sigma = numpy.full(n, GLICKO_VOLATILITY)
+
+    if len(id1):
+        waves = _waves(i1, i2, n)
+        order = numpy.argsort(waves, kind='mergesort')
+        bounds = numpy.searchsorted(waves[order], numpy.arange(1, waves.max() + 2))
+        for start, end in zip(bounds[:-1].tolist(), bounds[1:].tolist()):
+            wave = order[start:end]
+            a, b, s = i1[wave], i2[wave], score[wave]
+            change = ELO_K * (s - 1 / (1 + 10 ** ((elo[b] - elo[a]) / 400)))
+            elo[a] += change
+            elo[b] -= change
+            new1 = _glickos(mu[a], phi[a], sigma[a], mu[b], phi[b], s)
+            new2 = _glickos(mu[b], phi[b], sigma[b], mu[a], phi[a], 1 - s)
+            mu[a], phi[a], sigma[a] = new1
+            mu[b], phi[b], sigma[b] = new2
+    return {'id': ids, 'elo': elo, 'glicko': GLICKO_START + GLICKO_SCALE * mu,
+            'deviation': GLICKO_SCALE * phi, 'volatility': sigma,
+            'games': numpy.bincount(places, minlength=n)}
+
+
+def ratingRows(ratings):
+    """Returns ratings computed by computeRatings() as a list of (id, elo,
+    glicko, deviation, volatility, games) tuples of plain Python values"""
+    return ranking.standingsRows(ratings, ('id',) + COLUMNS)
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+#
+# Test cases for ratingExtraCredit.py
+
+import random
+
+from ratingExtraCredit import *
+import storageExtraCredit as storage
+import tournamentExtraCredit as tournament
+
+
+def close(a, b, tolerance=1e-6):
+    return all(abs(x - y) <= tolerance for x, y in zip(a, b)) and len(a) == len(b)
+
+
+def testWorkedExample():
+    #the example of Glickman's description of Glicko-2: a win against 1400 and
+    #losses to 1550 and 1700 in one rating period
+    games = [(1400, 30, 1), (1550, 100, 0), (1700, 300, 0)]
+    if not close(ratePeriod(1500, 200, 0.06, games), (1464.06, 151.52, 0.05999), 0.01):
+        raise ValueError("ratePeriod() should work out Glickman's example.")
+    glicko, deviation, volatility = ratePeriod(1500, 200, 0.06, games)
+    if abs(volatility - 0.05999) > 1e-5:
+        raise ValueError("The volatility of Glickman's example should come out as 0.05999.")
+    #an upset takes the other branch of the volatility iteration, and raises it
+    if not ratePeriod(2200, 30, 0.06, [(1000, 30, 0)])[2] > 0.06:
+        raise ValueError("A loss against a much weaker player should raise the volatility.")
+    if not ratePeriod(1500, 200, 0.06, [(1500, 200, 0.5)])[2] < 0.06:
+        raise ValueError("A result as expected should lower the volatility.")
+    if not close(ratePeriod(1500, 200, 0.06, []), (1500, math.sqrt(200 ** 2 + (0.06 * GLICKO_SCALE) ** 2), 0.06)):
+        raise ValueError("A period without games should only widen the deviation.")
+    print "1. ratePeriod() works out Glickman's example, volatility included."
+
+
+def testWinsAndTies():
+    winner, loser = rateMatch(START, START, 1.0)
+    if winner[0] != ELO_START + ELO_K / 2 or loser[0] != ELO_START - ELO_K / 2:
+        raise ValueError("A win between new players should move their Elo by half of K.")
+    if not close(winner[1:4], (1662.3108939062977, 290.31896371798047, 0.05999967537233814)):
+        raise ValueError("A win between new players should give the Glicko-2 rating of a period of one game.")
+    if winner[4] != 1 or loser[4] != 1:
+        raise ValueError("A match should count as a game of each player.")
+    first, second = rateMatch(START, START, 0.5)
+    if first != second or first[:2] != START[:2] or not first[2] < START[2]:
+        raise ValueError("A tie between new players should only narrow their deviations.")
+    ratings = rateMatches({}, [(1, 2, None)])
+    if ratings != {1: first, 2: second}:
+        raise ValueError("rateMatches() should score a match without a winner as a tie.")
+    print "2. Wins and ties are rated."
+
+
+def testByesAndEmptyHistory():
+    if rateMatches({}, []) != {}:
+        raise ValueError("No matches should rate nobody.")
+    ratings = computeRatings([])
+    if set(ratings) != set(('id',) + COLUMNS) or any(len(ratings[x]) for x in ratings):
+        raise ValueError("computeRatings() of no matches should be empty.")
+    if ratingRows(ratings) != []:
+        raise ValueError("The rows of no ratings should be empty.")
+    #0 stands in for the bye
+    matches = [(1, 0, 1), (0, 2, None), (1, 2, 2)]
+    expected = rateMatches({}, [(1, 2, 2)])
+    if rateMatches({}, matches, bye=0) != expected:
+        raise ValueError("rateMatches() should skip the matches against the bye.")
+    rows = ratingRows(computeRatings(matches, bye=0))
+    if [row[0] for row in rows] != [1, 2] or not all(close(row[1:], expected[row[0]]) for row in rows):
+        raise ValueError("computeRatings() should skip the matches against the bye.")
+    print "3. Byes and an empty history aren't rated."
+
+
+def testComputeRatings():
+    rng = random.Random(25)
+    players = list(range(1, 31))
+    matches = []
+    for n in range(600):
+        id1, id2 = rng.sample(players, 2)
+        matches.append((id1, id2, rng.choice([id1, id2, id2, None])))
+    expected = rateMatches({}, matches)
+    rows = ratingRows(computeRatings(matches))
+    if sorted(expected) != [row[0] for row in rows]:
+        raise ValueError("computeRatings() should rate every player who played.")
+    for row in rows:
+        if not close(row[1:], expected[row[0]]):
+            raise ValueError("computeRatings() should rate as rateMatches() does, one match after the other.")
+    print "4. computeRatings() rates a history as rateMatches() does."
+
+
+def testRecomputeRatings():
+    tournament.setStore(storage.MemoryStore())
+    a, b, c, d = tournament.registerPlayers(['Ann', 'Bob', 'Cy', 'Dee'])
+    first, second = tournament.registerTournament(), tournament.registerTournament()
+    tournament.registerTournamentPlayers([a, b, c, d], first)
+    tournament.registerTournamentPlayers([a, b, c, d], second)
+    tournament.reportMatches([(a, b, a, first), (c, d, 'tie', first)])
+    tournament.reportMatches([(a, c, c, second), (b, d, b, second)])
+    tournament.reportMatch(a, d, a, first)
+    played = [(a, b, a), (c, d, None), (a, c, c), (b, d, b), (a, d, a)]
+
+    def ratings():
+        return dict((row[0], row[2:]) for row in tournament.playerRatings(first))
+    before = ratings()
+    if tournament.recomputeRatings() != len(played):
+        raise ValueError("recomputeRatings() should return the number of matches rated.")
+    after = ratings()
+    expected = rateMatches({}, played)
+    if sorted(after) != sorted(expected) or not all(close(after[x], expected[x]) for x in after):
+        raise ValueError("recomputeRatings() should rate every match again in order.")
+    if not all(close(after[x], before[x]) for x in after):
+        raise ValueError("recomputeRatings() should keep the ratings the matches were rated with.")
+    tournament.deleteTournament(second)
+    if tournament.recomputeRatings() != 3:
+        raise ValueError("recomputeRatings() should only rate the matches left.")
+    after = ratings()
+    expected = rateMatches({}, [(a, b, a), (c, d, None), (a, d, a)])
+    if not all(close(after[x], expected[x]) for x in after):
+        raise ValueError("recomputeRatings() should forget the matches of a deleted tournament.")
+    print "5. recomputeRatings() rates the matches recorded in a MemoryStore again."
+
+
+if __name__ == '__main__':
+    testWorkedExample()
+    testWinsAndTies()
+    testByesAndEmptyHistory()
+    testComputeRatings()
+    testRecomputeRatings()
+    print "Success!  All tests pass!"
@@ -0,0 +1,196 @@
+#!/usr/bin/env python
+#
+# schedulerExtraCredit.py -- closes the rounds of many tournaments at once
+#
+# closeRounds() starts the next round of a batch of tournaments, as
+# startRound() does for one: it takes the advisory lock of each tournament,
+# so that no other scheduler pairs it at the same time, reads what the
+# tournaments need to be paired in one transaction, pairs them across a pool
+# of processes, and records their rounds and pairings in one transaction.
+# Type, for example,
+#
+#   python schedulerExtraCredit.py 1 2 3 --processes 4
+#
+# to start the next round of tournaments 1, 2 and 3, or python
+# schedulerExtraCredit.py --help for the other options.
+#
+
+from __future__ import division
+
+import argparse
+import multiprocessing
+import time
+
+import instrument
+import storageExtraCredit as storage
+import tournamentExtraCredit as tournament
+
+
+def _pairTask(task):
+    """Pairs the next round of a tournament in a worker process
+
+    Args:
+      task: a tuple of the id number of the tournament, its (id, name, wins)
+        standings and (id1, id2) matches, as PostgresStore.pairingRows()
+        returns them, and the pairing method
+
+    Returns:
+      A tuple of the id number of the tournament, its pairings as
+      swissPairings() returns them or None if it couldn't be paired, the
+      message of the error if it couldn't, and the seconds spent pairing it
+    """
+    tournamentId, standings, matches, method = task
+    start = time.time()
+    try:
+        playedOpponents, colours = storage.countOpponents(matches, [row[0] for row in standings])
+        pairings = tournament.pairRound(standings, playedOpponents, colours, method)
+        error = None
+    except (IndexError, ValueError) as e:
+        pairings, error = None, str(e)
+    return tournamentId, pairings, error, time.time() - start
+
+
+def _mapTasks(tasks, processes):
+    """Yields the results of _pairTask() on each task as they come, from a
+    pool of processes unless processes is 1 or there is a single task"""
+    if processes == 1 or len(tasks) < 2:
+        for task in tasks:
+            yield _pairTask(task)
+        return
+    pool = multiprocessing.Pool(min(processes or multiprocessing.cpu_count(), len(tasks)))
+    try:
+        for result in pool.imap_unordered(_pairTask, tasks):
+            yield result
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+@instrument.instrumented
+def closeRounds(tournaments, method='greedy', processes=None):
+    """Starts the next round of each of a batch of tournaments.
+
+    A tournament is left out if another session holds its lock, if a pairing
+    of its last round has no result yet, or if it isn't registered or can't
+    be paired; the others have their rounds recorded together, as
+    startRound() records one, the first round seeded as swissPairings()
+    seeds it (see tournamentExtraCredit.configureSeeding).  The largest
+    tournaments are handed to the workers first, so that a long pairing
+    doesn't start last.
+
+    Args:
+      tournaments: a list of the id numbers of the tournaments
+      method: the pairing method, as taken by swissPairings()
+      processes: the number of worker processes, or None for one per CPU
+
+    Returns:
+      A dictionary of
+        rounds: a dictionary of the tournaments started and a tuple of the
+          number of their round and its (table, id1, name1, id2, name2)
+          pairings, as startRound() returns them
+        busy: a list of the tournaments locked by another session
+        unfinished: a dictionary of the tournaments with pairings of the last
+          round without a result, and the number of those pairings
+        failed: a dictionary of the tournaments that aren't registered or
+          couldn't be paired, and the message of the error
+        pairSeconds: a dictionary of the tournaments paired and the seconds
+          spent pairing each in its worker
+        latency: a dictionary of the tournaments paired and the seconds from
+          the start of the batch until each was paired
+        seconds: a dictionary of the seconds spent taking the locks ('lock'),
+          reading the tournaments ('load'), pairing them ('pair'), recording
+          their rounds ('record') and on the whole batch ('total')
+        throughput: the rounds started a second
+    """
+    if method not in ('greedy', 'matching'):
+        raise ValueError("Unknown pairing method %r." % (method,))
+    ids = []
+    for tournamentId in tournaments:
+        tournamentId = tournament.validateId(tournamentId, 'tournament')
+        if tournamentId not in ids:
+            ids.append(tournamentId)
+    store = tournament.getStore()
+    report = {'rounds': {}, 'busy': [], 'unfinished': {}, 'failed': {},
+              'pairSeconds': {}, 'latency': {}, 'seconds': {}}
+    seconds = report['seconds']
+    start = time.time()
+    with store.lockTournaments(ids) as locked:
+        report['busy'] = [tournamentId for tournamentId in ids if tournamentId not in locked]
+        seconds['lock'] = time.time() - start
+
+        mark = time.time()
+        report['unfinished'] = store.openPairings(locked)
+        ready = [tournamentId for tournamentId in locked if tournamentId not in report['unfinished']]
+        rows = store.pairingRows(ready)
+        for tournamentId in ready:
+            if tournamentId not in rows:
+                report['failed'][tournamentId] = "Tournament %s is not registered." % tournamentId
+        seeding = tournament.getSeeding()
+        if seeding is not None:
+            #the ratings of every tournament starting its first round at once
+            first = [tournamentId for tournamentId in ready
+                     if tournamentId in rows and not rows[tournamentId][1]]
+            for tournamentId, ratings in store.tournamentRatings(first).items():
+                standings = tournament.seedStandings(rows[tournamentId][0], ratings, seeding)
+                rows[tournamentId] = (standings, rows[tournamentId][1])
+        tasks = [(tournamentId,) + tuple(rows[tournamentId]) + (method,)
+                 for tournamentId in ready if tournamentId in rows]
+        tasks.sort(key=lambda task: -len(task[1]))
+        seconds['load'] = time.time() - mark
+
+        mark = time.time()
+        paired = []
+        for tournamentId, pairings, error, pairSeconds in _mapTasks(tasks, processes):
+            report['latency'][tournamentId] = time.time() - start
+            if error is not None:
+                report['failed'][tournamentId] = error
+                continue
+            report['pairSeconds'][tournamentId] = pairSeconds
+            paired.append((tournamentId, pairings))
+        seconds['pair'] = time.time() - mark
+
+        mark = time.time()
+        numbers = store.addRounds([(tournamentId, [(row[0], row[2]) for row in pairings])
+                                   for tournamentId, pairings in paired])
+        for tournamentId, pairings in paired:
+            report['rounds'][tournamentId] = (numbers[tournamentId], [
+                (table,) + tuple(row) for table, row in enumerate(pairings, 1)])
+        seconds['record'] = time.time() - mark
+    seconds['total'] = time.time() - start
+    report['throughput'] = len(report['rounds']) / max(seconds['total'], 1e-9)
+    return report
+
+
+def printReport(report):
+    """Prints the report of closeRounds()"""
+    seconds = report['seconds']
+    print("%d rounds started in %.3f seconds, %.1f rounds/sec" % (
+        len(report['rounds']), seconds['total'], report['throughput']))
+    for phase in ('lock', 'load', 'pair', 'record'):
+        print("%-22s %10.3f" % (phase + ' seconds', seconds.get(phase, 0)))
+    for name in ('busy', 'unfinished', 'failed'):
+        print("%-22s %10d" % (name, len(report[name])))
+    latency = sorted(report['latency'].values())
+    if latency:
+        print("%-22s %10.3f" % ('p50 latency seconds', latency[(len(latency) - 1) // 2]))
+        print("%-22s %10.3f" % ('max latency seconds', latency[-1]))
+    for tournamentId in sorted(report['rounds']):
+        number, pairings = report['rounds'][tournamentId]
+        print("tournament %-8d round %-4d %6d tables %10.3f seconds" % (
+            tournamentId, number, len(pairings), report['pairSeconds'][tournamentId]))
+    for tournamentId in sorted(report['failed']):
+        print("tournament %-8d failed: %s" % (tournamentId, report['failed'][tournamentId]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Start the next round of a batch of tournaments')
+    parser.add_argument('tournaments', type=int, nargs='+')
+    parser.add_argument('--method', choices=['greedy', 'matching'], default='greedy')
+    parser.add_argument('--processes', type=int, default=None,
+                        help='worker processes, one per CPU by default')
+    args = parser.parse_args()
+    printReport(closeRounds(args.tournaments, args.method, args.processes))
+
+
+if __name__ == '__main__':
+    main()
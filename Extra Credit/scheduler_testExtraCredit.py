@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+#
+# Test cases for schedulerExtraCredit.py on a MemoryStore, which need no
+# database
+
+import storageExtraCredit as storage
+import tournamentExtraCredit as tournament
+from schedulerExtraCredit import *
+
+
+def newTournaments():
+    """Starts a new MemoryStore holding tournaments of 9, 16, 7 and 4 of the
+    same players, who have played a tournament before so that their ratings
+    seed the first rounds, and returns the tournaments"""
+    tournament.setStore(storage.MemoryStore())
+    tournament.configureByes()
+    tournament.configureSeeding('glicko')
+    ids = tournament.registerPlayers(['Player %d' % n for n in range(16)])
+    played = tournament.registerTournament()
+    tournament.registerTournamentPlayers(ids, played)
+    tournament.reportMatches([(ids[n], ids[15 - n], ids[n if n % 3 else 15 - n], played)
+                              for n in range(8)])
+    tournaments = []
+    for size in (9, 16, 7, 4):
+        t = tournament.registerTournament()
+        tournament.registerTournamentPlayers(ids[16 - size:], t)
+        tournaments.append(t)
+    return tournaments
+
+
+def testCloseRounds():
+    for processes in (1, 2):
+        tournaments = newTournaments()
+        for number in (1, 2, 3):
+            expected = dict((t, [tuple(row) for row in tournament.swissPairings(t)])
+                            for t in tournaments)
+            report = closeRounds(tournaments, processes=processes)
+            if report['busy'] or report['unfinished'] or report['failed']:
+                raise ValueError("Every tournament should have its round started.")
+            for t in tournaments:
+                roundNumber, pairings = report['rounds'][t]
+                if roundNumber != number or [row[1:] for row in pairings] != expected[t]:
+                    raise ValueError("closeRounds() with %d processes should pair round %d as "
+                                     "swissPairings() does." % (processes, number))
+                if tournament.roundPairings(t) != [row + (False,) for row in pairings]:
+                    raise ValueError("closeRounds() should record the pairings of each round.")
+                for row in pairings:
+                    tournament.reportTable(t, row[0], row[1 if (row[0] + number) % 3 else 3])
+    print "1. closeRounds() pairs each tournament as swissPairings() does, in one process or two."
+
+
+def testLeftOut():
+    tournaments = newTournaments()
+    tournament.startRound(tournaments[0])
+    with tournament.getStore().lockTournaments([tournaments[1]]):
+        report = closeRounds(tournaments + [99], processes=1)
+    if report['busy'] != [tournaments[1]] or report['unfinished'] != {tournaments[0]: 5}:
+        raise ValueError("Tournaments locked or with tables without a result should be left out.")
+    if list(report['failed']) != [99] or sorted(report['rounds']) != sorted(tournaments[2:]):
+        raise ValueError("Tournaments that aren't registered should be left out.")
+    print "2. closeRounds() leaves out the tournaments it can't start a round of."
+
+
+if __name__ == '__main__':
+    testCloseRounds()
+    testLeftOut()
+    print "Success!  All tests pass!"
@@ -0,0 +1,303 @@
+#!/usr/bin/env python
+#
+# simulateExtraCredit.py -- Monte Carlo simulator of Swiss-system events
+#
+# Plays out whole events through registerTournamentPlayers(), swissPairings()
+# and reportMatches() on a MemoryStore, across a pool of processes, and
+# reports how well they were paired.  Type, for example,
+# python simulateExtraCredit.py --players 65 --rounds 6 --events 100000
+# to simulate a hundred thousand events of 65 players and 6 rounds, or
+# python simulateExtraCredit.py --help for the strength models and the other
+# options.
+#
+
+from __future__ import division
+
+import argparse
+import math
+import multiprocessing
+import random
+import time
+
+import storageExtraCredit as storage
+import tournamentExtraCredit as tournament
+
+
+def normalStrengths(players, spread, rng):
+    """Returns strengths drawn from a normal distribution with a standard
+    deviation of spread"""
+    return [rng.gauss(1500, spread) for n in range(players)]
+
+
+def uniformStrengths(players, spread, rng):
+    """Returns strengths drawn evenly from a range spread wide"""
+    return [1500 + spread * (rng.random() - 0.5) for n in range(players)]
+
+
+def equalStrengths(players, spread, rng):
+    """Returns the same strength for everybody, so every result is a coin toss"""
+    return [1500] * players
+
+
+STRENGTH_MODELS = {
+    'normal': normalStrengths,
+    'uniform': uniformStrengths,
+    'equal': equalStrengths,
+}
+
+#the points of a bye scored as each of storageExtraCredit.BYE_RESULTS, as the
+#stores count them
+BYE_POINTS = {'win': 3, 'tie': 1, 'loss': 0}
+
+
+def playMatch(id1, id2, strength, draw, rng):
+    """Returns the result of a simulated match, as taken by reportMatch()
+
+    The expected score of each player follows the Elo formula on their
+    strengths.  Players of equal strength tie with a chance of draw, and the
+    chance shrinks as the gap between them grows, without changing the
+    expected scores.  Anybody playing the bye is reported as winning it, and
+    the bye is scored as configureByes() sets.
+
+    Args:
+      id1: the id number of the 1st player
+      id2: the id number of the 2nd player
+      strength: a dictionary of the ids and their strength
+      draw: the chance of a tie between players of equal strength
+      rng: the random.Random used to draw the result
+    """
+    if id1 == storage.BYE or id2 == storage.BYE:
+        return id2 if id1 == storage.BYE else id1
+    expected = 1.0 / (1 + 10 ** ((strength[id2] - strength[id1]) / 400.0))
+    tie = draw * (1 - abs(2 * expected - 1))
+    x = rng.random()
+    if x < expected - tie / 2:
+        return id1
+    if x < expected + tie / 2:
+        return 'tie'
+    return id2
+
+
+def newStats(rounds):
+    """Returns empty statistics for events of a number of rounds"""
+    return {
+        'events': 0,
+        'failed': 0,
+        'pairs': 0,
+        'rematches': 0,
+        'scoreGap': 0,
+        'maxScoreGap': 0,
+        #how many players had each number of byes
+        'byes': {},
+        #the count, total seconds and most seconds of pairing each round
+        'latency': [[0, 0.0, 0.0] for r in range(rounds)],
+        #how many rounds took each power of two of microseconds to pair
+        'latencyHistogram': {},
+    }
+
+
+def mergeStats(total, stats):
+    """Adds the statistics of some events to the total"""
+    for key in ('events', 'failed', 'pairs', 'rematches', 'scoreGap'):
+        total[key] += stats[key]
+    total['maxScoreGap'] = max(total['maxScoreGap'], stats['maxScoreGap'])
+    for key in ('byes', 'latencyHistogram'):
+        for value, count in stats[key].items():
+            total[key][value] = total[key].get(value, 0) + count
+    for mine, theirs in zip(total['latency'], stats['latency']):
+        mine[0] += theirs[0]
+        mine[1] += theirs[1]
+        mine[2] = max(mine[2], theirs[2])
+
+
+def simulateEvent(players, rounds, model, spread, draw, method, rng, stats,
+                  bye=tournament.BYE_RESULT):
+    """Plays out an event in a new MemoryStore and adds it to the statistics
+
+    The event stops early if a round cannot be paired.
+
+    Args:
+      players: the number of players
+      rounds: the number of rounds
+      model: the name of the strength model, a key of STRENGTH_MODELS
+      spread: how far apart the strengths are, as taken by the model
+      draw: the chance of a tie between players of equal strength
+      method: the pairing method, as taken by swissPairings()
+      rng: the random.Random used to draw the strengths and results
+      stats: the statistics to add the event to
+      bye: how the byes are scored, as taken by configureByes()
+    """
+    store = storage.MemoryStore()
+    tournament.setStore(store)
+    tournament.configureByes(bye)
+    t = tournament.registerTournament()
+    #the names are made up here, so they are registered without bleach.clean
+    ids = store.addPlayers(['Player %d' % n for n in range(players)])
+    tournament.registerTournamentPlayers(ids, t)
+    strength = dict(zip(ids, STRENGTH_MODELS[model](players, spread, rng)))
+    points = dict((x, 0) for x in ids)
+    points[storage.BYE] = 0
+    played = set()
+    byes = dict((x, 0) for x in ids)
+    stats['events'] += 1
+    for r in range(rounds):
+        start = time.time()
+        try:
+            pairings = tournament.swissPairings(t, method)
+        except (IndexError, ValueError):
+            stats['failed'] += 1
+            break
+        seconds = time.time() - start
+        latency = stats['latency'][r]
+        latency[0] += 1
+        latency[1] += seconds
+        latency[2] = max(latency[2], seconds)
+        bucket = int(math.log(max(seconds * 1e6, 1), 2))
+        stats['latencyHistogram'][bucket] = stats['latencyHistogram'].get(bucket, 0) + 1
+        results = []
+        for (id1, name1, id2, name2) in pairings:
+            pair = frozenset([id1, id2])
+            if storage.BYE in pair:
+                byes[id1 if id2 == storage.BYE else id2] += 1
+            else:
+                if pair in played:
+                    stats['rematches'] += 1
+                played.add(pair)
+                gap = abs(points[id1] - points[id2])
+                stats['pairs'] += 1
+                stats['scoreGap'] += gap
+                stats['maxScoreGap'] = max(stats['maxScoreGap'], gap)
+            result = playMatch(id1, id2, strength, draw, rng)
+            if result == 'tie':
+                points[id1] += 1
+                points[id2] += 1
+            elif storage.BYE in pair:
+                points[result] += BYE_POINTS[bye]
+            else:
+                points[result] += 3
+            results.append((id1, id2, result, t))
+        tournament.reportMatches(results)
+    for count in byes.values():
+        stats['byes'][count] = stats['byes'].get(count, 0) + 1
+
+
+def runEvents(task):
+    """Simulates a batch of events in a worker process and returns their
+    statistics
+
+    Args:
+      task: a tuple of the (first, count) of the events to simulate and the
+        keyword arguments of simulateEvent(), except rng and stats, with the
+        seed of the simulation
+    """
+    first, count, options = task
+    options = dict(options)
+    seed = options.pop('seed')
+    stats = newStats(options['rounds'])
+    for n in range(first, first + count):
+        rng = random.Random(seed * 1000003 + n)
+        simulateEvent(rng=rng, stats=stats, **options)
+    return stats
+
+
+def simulate(events, players, rounds, model='normal', spread=200, draw=0.2,
+             method='greedy', seed=0, processes=None, batch=1000, bye=tournament.BYE_RESULT):
+    """Simulates events across a pool of processes and returns their statistics
+
+    Each event draws its strengths and results from its own seed, so the
+    statistics don't depend on the number of processes.
+
+    Args:
+      events: the number of events to simulate
+      players: the number of players in each event
+      rounds: the number of rounds of each event
+      model: the name of the strength model, a key of STRENGTH_MODELS
+      spread: how far apart the strengths are, as taken by the model
+      draw: the chance of a tie between players of equal strength
+      method: the pairing method, as taken by swissPairings()
+      seed: the seed of the simulation
+      processes: the number of worker processes, or None for one per CPU
+      batch: the number of events each worker simulates at a time
+      bye: how the byes are scored, as taken by configureByes()
+    """
+    if model not in STRENGTH_MODELS:
+        raise ValueError("Unknown strength model %r." % (model,))
+    if bye not in storage.BYE_RESULTS:
+        raise ValueError("A bye is scored as one of %s, not %r." % (storage.BYE_RESULTS, bye))
+    options = {'players': players, 'rounds': rounds, 'model': model, 'spread': spread,
+               'draw': draw, 'method': method, 'seed': seed, 'bye': bye}
+    tasks = [(first, min(batch, events - first), options) for first in range(0, events, batch)]
+    total = newStats(rounds)
+    if processes == 1:
+        for task in tasks:
+            mergeStats(total, runEvents(task))
+        return total
+    pool = multiprocessing.Pool(processes)
+    try:
+        for stats in pool.imap_unordered(runEvents, tasks):
+            mergeStats(total, stats)
+    finally:
+        pool.terminate()
+        pool.join()
+    return total
+
+
+def percentile(histogram, fraction):
+    """Returns the upper bound in microseconds of the power of two bucket of
+    the latency histogram that holds the given fraction of the rounds"""
+    count = sum(histogram.values())
+    seen = 0
+    for bucket in sorted(histogram):
+        seen += histogram[bucket]
+        if seen >= fraction * count:
+            return 2 ** (bucket + 1)
+    return 0
+
+
+def printStats(stats, seconds):
+    """Prints the statistics of a simulation that took a number of seconds"""
+    events = max(stats['events'], 1)
+    pairs = max(stats['pairs'], 1)
+    print("%d events in %.1f seconds, %.0f events/sec" % (
+        stats['events'], seconds, stats['events'] / max(seconds, 1e-9)))
+    print("%-22s %10.2f%%" % ('events not completed', 100.0 * stats['failed'] / events))
+    print("%-22s %10.3f%%" % ('rematches', 100.0 * stats['rematches'] / pairs))
+    print("%-22s %10.3f" % ('mean score gap', stats['scoreGap'] / pairs))
+    print("%-22s %10d" % ('max score gap', stats['maxScoreGap']))
+    players = max(sum(stats['byes'].values()), 1)
+    for count in sorted(stats['byes']):
+        print("%-22s %10.3f%%" % ('players with %d byes' % count,
+                                  100.0 * stats['byes'][count] / players))
+    print("%-8s %8s %12s %12s" % ('round', 'paired', 'mean usec', 'max usec'))
+    for r, (count, total, most) in enumerate(stats['latency']):
+        print("%-8d %8d %12.1f %12.1f" % (r + 1, count, 1e6 * total / max(count, 1), 1e6 * most))
+    print("%-22s %10d" % ('p50 usec <=', percentile(stats['latencyHistogram'], 0.5)))
+    print("%-22s %10d" % ('p99 usec <=', percentile(stats['latencyHistogram'], 0.99)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Monte Carlo simulator of Swiss-system events')
+    parser.add_argument('--events', type=int, default=10000)
+    parser.add_argument('--players', type=int, default=64)
+    parser.add_argument('--rounds', type=int, default=6)
+    parser.add_argument('--model', choices=sorted(STRENGTH_MODELS), default='normal')
+    parser.add_argument('--spread', type=float, default=200,
+                        help='standard deviation or width of the strengths')
+    parser.add_argument('--draw', type=float, default=0.2,
+                        help='chance of a tie between players of equal strength')
+    parser.add_argument('--method', choices=['greedy', 'matching'], default='greedy')
+    parser.add_argument('--bye', choices=storage.BYE_RESULTS, default=tournament.BYE_RESULT,
+                        help='how a bye is scored')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--processes', type=int, default=None,
+                        help='worker processes, one per CPU by default')
+    parser.add_argument('--batch', type=int, default=1000)
+    args = parser.parse_args()
+    start = time.time()
+    stats = simulate(args.events, args.players, args.rounds, args.model, args.spread,
+                     args.draw, args.method, args.seed, args.processes, args.batch, args.bye)
+    printStats(stats, time.time() - start)
+
+
+if __name__ == '__main__':
+    main()
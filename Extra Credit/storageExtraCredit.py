@@ -0,0 +1,1188 @@
+#!/usr/bin/env python
+#
+# storageExtraCredit.py -- where the multi-tournament Swiss system keeps its
+# players, tournaments, participants, matches and ratings
+#
+# tournamentExtraCredit.py reads and writes the tournaments through one of the
+# stores in this module: PostgresStore keeps them in the database created by
+# tournamentExtraCredit.sql, and MemoryStore keeps them in Python objects, so
+# simulations and tests can run without a database server.  Both take id
+# numbers and results that have already been checked and behave the same way,
+# down to raising IntegrityError where the database would reject a row.
+#
+
+import contextlib
+import io
+import threading
+import time
+
+import instrument
+import ratingExtraCredit as rating
+import swiss
+
+# psycopg2 is imported by the PostgresStore methods that use it, so that the
+# memory store works without a database driver installed.
+
+
+#id number that stands in for the opponent of the player given the bye in
+#pairings and in the matches of results(); it is never a registered player
+BYE = 0
+
+#how a bye can be scored
+BYE_RESULTS = ('win', 'tie', 'loss')
+
+#the first key of the advisory lock of a tournament, whose id is the second;
+#nothing else using the database should take locks under it
+TOURNAMENT_LOCK = 20150
+
+#the seconds a writer first waits before trying again to take the shared locks
+#of the tournaments it writes to while lockTournaments() holds one of them,
+#doubling each time up to the second value
+LOCK_RETRY = 0.005
+LOCK_RETRY_MAX = 0.2
+
+
+class IntegrityError(ValueError):
+    """Raised when a change would break the tournaments' constraints, such as
+    a match between players that aren't registered"""
+
+
+def _copyValue(value):
+    """Returns a value written in the text format of COPY"""
+    if value is None:
+        return u'\\N'
+    text = u'%s' % (value,)
+    return (text.replace(u'\\', u'\\\\').replace(u'\t', u'\\t')
+            .replace(u'\n', u'\\n').replace(u'\r', u'\\r'))
+
+
+def _copyRows(c, table, columns, rows):
+    """Writes rows to a table with a single COPY FROM STDIN.
+
+    Args:
+      c: the cursor to copy with
+      table: the name of the table
+      columns: the names of the columns, in the order of the values in each row
+      rows: a list of tuples of values
+    """
+    data = u''.join(u'\t'.join(_copyValue(v) for v in row) + u'\n' for row in rows)
+    query = 'COPY %s (%s) FROM STDIN;' % (table, ', '.join(columns))
+    c.copy_expert(query, io.BytesIO(data.encode('utf-8')))
+
+
+def _nextIds(c, sequence, count):
+    """Returns the next count values of a sequence, in order"""
+    c.execute('SELECT nextval(%s) FROM generate_series(1, %s);', (sequence, count))
+    return [row[0] for row in c.fetchall()]
+
+
+def _lastRounds(c, tournaments):
+    """Returns a dictionary of the tournaments of a list that have started a
+    round, and a tuple of the number of their last round and how many of its
+    pairings have no result yet"""
+    c.execute("""SELECT tournament, last.number,
+                        (SELECT COUNT(*) FROM pairings WHERE pairings.round_id = last.id
+                         AND pairings.match_id IS NULL AND pairings.bye_id IS NULL)
+                 FROM unnest(%s::integer[]) AS tournament,
+                 LATERAL (SELECT id, number FROM rounds WHERE rounds.tournament_id = tournament
+                          ORDER BY number DESC LIMIT 1) AS last;""", (tournaments,))
+    return dict((row[0], row[1:]) for row in c.fetchall())
+
+
+def _rateMatches(c, matches):
+    """Rates a list of (id1, id2, winner) matches recorded in the transaction
+    of a cursor, in order, holding the rows of the ratings of their players
+    until it ends; the rows are locked in order of player so that
+    transactions rating the same players can't deadlock"""
+    import psycopg2.extras
+    players = sorted(set(player for match in matches for player in match[:2]))
+    if not players:
+        return
+    c.execute("""INSERT INTO ratings (player_id, elo, glicko, deviation, volatility, games)
+                 SELECT player, %s, %s, %s, %s, %s FROM unnest(%s::integer[]) AS player
+                 ON CONFLICT (player_id) DO NOTHING;""", rating.START + (players,))
+    c.execute("""SELECT player_id, elo, glicko, deviation, volatility, games FROM ratings
+                 WHERE player_id = ANY(%s) ORDER BY player_id FOR UPDATE;""", (players,))
+    ratings = rating.rateMatches(dict((row[0], tuple(row[1:])) for row in c.fetchall()), matches)
+    psycopg2.extras.execute_values(
+        c, """UPDATE ratings SET elo = new.elo, glicko = new.glicko, deviation = new.deviation,
+                                 volatility = new.volatility, games = new.games
+              FROM (VALUES %s) AS new (player_id, elo, glicko, deviation, volatility, games)
+              WHERE ratings.player_id = new.player_id;""",
+        [(player,) + tuple(ratings[player]) for player in players], page_size=len(players))
+
+
+@contextlib.contextmanager
+def _transaction(db, name=None, itersize=None):
+    """Yields a cursor on a connection, committing its transaction when the
+    block exits normally and rolling it back if it raises; see
+    PostgresStore.cursor() for the arguments"""
+    try:
+        with db.cursor(name) as c:
+            if itersize is not None:
+                c.itersize = itersize
+            if instrument.isEnabled():
+                c = instrument.CountingCursor(c)
+            yield c
+        db.commit()
+    except BaseException:
+        if not db.closed:
+            db.rollback()
+        raise
+
+
+def byeWinner(player, result):
+    """Returns the winner of the bye of a player as a match against BYE: the
+    player for a win, None for a tie and BYE for a loss"""
+    return {'win': player, 'tie': None, 'loss': BYE}[result]
+
+
+def countOpponents(matches, ids=()):
+    """Returns the opponents the players have played, and how many more games
+    they have played as the first player than as the second one, as a
+    swiss.OpponentHistory and its colours
+
+    Args:
+      matches: a list of the (id1, id2) of the matches played, with BYE as
+        the second player of each bye; a bye is listed among the opponents
+        of its player but doesn't count towards their colours
+      ids: the ids of players to add up front, in the order to number them
+    """
+    history = swiss.OpponentHistory(ids)
+    history.addMatches(matches, BYE)
+    return history, history.colours
+
+
+class PostgresStore(object):
+    """Keeps the tournaments in PostgreSQL, checking connections out of a pool.
+
+    The pool is opened on the first checkout and can be closed and opened
+    again any number of times; the locks of lockTournaments() are held on a
+    second pool of the same size, opened the first time one is taken, and
+    the thread holding them reads and writes through the connection holding
+    them.
+    """
+
+    def __init__(self, dsn, size):
+        """
+        Args:
+          dsn: the libpq connection string
+          size: the number of connections kept open to the database
+        """
+        if size < 1:
+            raise ValueError("The connection pool needs at least one connection.")
+        self.dsn = dsn
+        self.size = size
+        #the pool of the queries and the pool of the connections holding the
+        #locks of lockTournaments(), each with its checkout semaphore
+        self._pools = {}
+        self._lock = threading.Lock()
+        #the connections of lockTournaments() held by each thread, the last
+        #one taken last, and left out while a cursor is open on them
+        self._local = threading.local()
+
+    def close(self):
+        """Closes every connection held by the connection pools."""
+        with self._lock:
+            for pool, slots in self._pools.values():
+                if not pool.closed:
+                    pool.closeall()
+            self._pools = {}
+
+    def _getPool(self, locks=False):
+        """Returns the connection pool and its checkout semaphore, opening the
+        pool on first use.
+
+        Args:
+          locks: True for the pool of the connections holding the locks of
+            lockTournaments(), of the same size
+        """
+        import psycopg2.pool
+        with self._lock:
+            if locks not in self._pools:
+                self._pools[locks] = (psycopg2.pool.ThreadedConnectionPool(self.size, self.size, self.dsn),
+                                      threading.BoundedSemaphore(self.size))
+            return self._pools[locks]
+
+    @contextlib.contextmanager
+    def cursor(self, name=None, itersize=None):
+        """Checks a connection out of the pool and yields a cursor on it.
+
+        The transaction is committed when the block exits normally and rolled
+        back if it raises.  Either way the connection goes back to the pool, and
+        a connection that was lost is discarded instead of being reused.  When
+        every connection is checked out the caller waits for one to be returned.
+        A thread holding locks of lockTournaments() doesn't check a connection
+        out for a client-side cursor but opens it on the connection holding
+        them, so that it never waits for the pool while holding the locks.
+        A row the database rejects for breaking a constraint raises
+        IntegrityError.  While instrument is recording, the checkout and the
+        queries and rows of the cursor are counted.
+
+        Args:
+          name: the name of a server-side cursor to open, which fetches the
+            rows of its query itersize at a time as they are iterated over,
+            or None for a client-side cursor that fetches them all at once
+          itersize: the rows a server-side cursor fetches at a time
+        """
+        import psycopg2
+        held = getattr(self._local, 'held', None)
+        try:
+            if name is None and held:
+                db = held.pop()
+                try:
+                    with _transaction(db) as c:
+                        yield c
+                finally:
+                    held.append(db)
+            else:
+                pool, slots = self._getPool()
+                slots.acquire()
+                try:
+                    db = pool.getconn()
+                    try:
+                        if instrument.isEnabled():
+                            instrument.count(checkouts=1)
+                        with _transaction(db, name, itersize) as c:
+                            yield c
+                    finally:
+                        pool.putconn(db, close=bool(db.closed))
+                finally:
+                    slots.release()
+        except psycopg2.IntegrityError as e:
+            raise IntegrityError(str(e).strip())
+
+    @contextlib.contextmanager
+    def _sharedCursor(self, tournaments):
+        """Yields a cursor, as cursor() does, whose transaction holds the
+        advisory locks of tournaments shared until it ends.
+
+        The locks are only tried for: while lockTournaments() holds one of
+        them the transaction ends and its connection goes back to the pool
+        before trying again LOCK_RETRY seconds later, doubling up to
+        LOCK_RETRY_MAX.  Writers waiting for a tournament being paired so hold
+        no connection, and can't keep the caller pairing it from checking out
+        the connections it reads and writes the round with, however many of
+        them there are.
+        """
+        tournaments = sorted(set(tournaments))
+        pause = LOCK_RETRY
+        while True:
+            with self.cursor() as c:
+                c.execute("""SELECT bool_and(pg_try_advisory_xact_lock_shared(%s, tournament))
+                             FROM unnest(%s::integer[]) AS tournament;""",
+                          (TOURNAMENT_LOCK, tournaments))
+                if c.fetchone()[0]:
+                    yield c
+                    return
+            #those of the locks taken went with the transaction
+            time.sleep(pause)
+            pause = min(pause * 2, LOCK_RETRY_MAX)
+
+    def deleteMatches(self):
+        """Deletes every match and bye, along with the rounds they were paired
+        in and the ratings of the players"""
+        with self.cursor() as c:
+            c.execute('DELETE FROM rounds;')
+            c.execute('DELETE FROM byes;')
+            c.execute('DELETE FROM matches;')
+            c.execute('DELETE FROM ratings;')
+
+    def deletePlayers(self):
+        with self.cursor() as c:
+            c.execute('DELETE FROM players;')
+
+    def countPlayers(self):
+        with self.cursor() as c:
+            c.execute('SELECT COUNT(*) FROM players;')
+            return c.fetchone()[0]
+
+    def addPlayer(self, name):
+        """Registers a player and returns their id"""
+        with self.cursor() as c:
+            c.execute('INSERT INTO players (name) VALUES (%s) RETURNING id;', (name,))
+            return c.fetchone()[0]
+
+    def addPlayers(self, names):
+        """Registers players with a single COPY and returns their ids in order
+
+        The ids are taken from the players' serial sequence beforehand so they
+        can be returned in order.
+        """
+        with self.cursor() as c:
+            ids = _nextIds(c, 'players_id_seq', len(names))
+            _copyRows(c, 'players', ('id', 'name'), zip(ids, names))
+        return ids
+
+    def addTournament(self):
+        """Registers a tournament and returns its id"""
+        with self.cursor() as c:
+            c.execute('INSERT INTO tournaments DEFAULT VALUES RETURNING id;')
+            return c.fetchone()[0]
+
+    def deleteTournament(self, tournament):
+        """Deletes a tournament along with its participants, matches and
+        rounds"""
+        with self.cursor() as c:
+            c.execute('DELETE FROM tournaments WHERE id = %s;', (tournament,))
+
+    def addParticipant(self, player, tournament):
+        """Registers a player in a tournament unless they already take part"""
+        query = """INSERT INTO tournament_participants (player_id, tournament_id)
+                   SELECT %(player)s, %(tournament)s
+                   WHERE NOT EXISTS (SELECT 1 FROM tournament_participants
+                                     WHERE player_id = %(player)s AND tournament_id = %(tournament)s);"""
+        with self.cursor() as c:
+            c.execute(query, {'player': player, 'tournament': tournament})
+
+    def addParticipants(self, players, tournament):
+        """Registers players in a tournament with a single COPY and returns the
+        ids of the participants in order"""
+        with self.cursor() as c:
+            ids = _nextIds(c, 'tournament_participants_id_seq', len(players))
+            rows = [(id, player, tournament) for id, player in zip(ids, players)]
+            _copyRows(c, 'tournament_participants', ('id', 'player_id', 'tournament_id'), rows)
+        return ids
+
+    def setWinner(self, winner, tournament):
+        with self.cursor() as c:
+            c.execute('UPDATE tournaments SET winner = %s WHERE id = %s;', (winner, tournament))
+
+    def standings(self, tournament):
+        """Returns a list of (id, name, wins, matches) tuples of the players
+        taking part in a tournament, sorted by points and wins"""
+        query = 'SELECT id, name, wins, matches FROM standings WHERE tournament_id = %s;'
+        with self.cursor() as c:
+            c.execute(query, (tournament,))
+            return c.fetchall()
+
+    def iterStandings(self, tournament, itersize):
+        """Yields the (id, name, wins, matches) standings of a tournament, as
+        standings() returns them, through a server-side cursor fetching
+        itersize rows at a time; a connection stays checked out until the
+        last row is read or the generator is closed"""
+        query = 'SELECT id, name, wins, matches FROM standings WHERE tournament_id = %s;'
+        with self.cursor('standings', itersize) as c:
+            c.execute(query, (tournament,))
+            for row in c:
+                yield row
+
+    def addMatches(self, matches, byes=()):
+        """Records a list of (id1, id2, winner, tournament) tuples, with None as
+        the winner of a tie, with a single insert, and a list of (player,
+        tournament, result) byes, with a result from BYE_RESULTS, in the same
+        transaction, and returns the lists of the matches and byes recorded
+
+        A match between the players of a pairing of the last round of its
+        tournament is recorded as the result of the pairing, keyed by its
+        round and table, and so is the bye of the player of a pairing without
+        a second player; a pairing that already has a result keeps it, and
+        the match or bye reported for it again is left out of the lists
+        returned.  The results are written holding the advisory locks of
+        their tournaments shared, so they wait for a round being paired,
+        without holding a connection meanwhile (see _sharedCursor()), and the
+        matches recorded are rated in the same transaction.
+        """
+        import psycopg2.extras
+        query = """WITH submitted (id1, id2, winner, tournament_id) AS (VALUES %s),
+                   inserted AS (
+                       INSERT INTO matches (id1, id2, winner, tournament_id, round_number, table_number)
+                       SELECT submitted.id1, submitted.id2, submitted.winner, submitted.tournament_id,
+                              CASE WHEN pairings.table_number IS NOT NULL THEN last.number END,
+                              pairings.table_number
+                       FROM submitted
+                       LEFT JOIN LATERAL (SELECT id, number FROM rounds
+                                          WHERE rounds.tournament_id = submitted.tournament_id
+                                          ORDER BY number DESC LIMIT 1) AS last ON TRUE
+                       LEFT JOIN pairings ON pairings.round_id = last.id
+                       AND LEAST(pairings.id1, pairings.id2) = LEAST(submitted.id1, submitted.id2)
+                       AND GREATEST(pairings.id1, pairings.id2) = GREATEST(submitted.id1, submitted.id2)
+                       ON CONFLICT (tournament_id, round_number, table_number) DO NOTHING
+                       RETURNING id, id1, id2, winner, tournament_id, round_number, table_number),
+                   closed AS (
+                       UPDATE pairings SET match_id = inserted.id
+                       FROM inserted, rounds
+                       WHERE rounds.tournament_id = inserted.tournament_id
+                       AND rounds.number = inserted.round_number AND pairings.round_id = rounds.id
+                       AND pairings.table_number = inserted.table_number)
+                   SELECT id1, id2, winner, tournament_id FROM inserted ORDER BY id;"""
+        byeQuery = """WITH submitted (player_id, tournament_id, result) AS (VALUES %s),
+                      inserted AS (
+                          INSERT INTO byes (player_id, tournament_id, result, round_number, table_number)
+                          SELECT submitted.player_id, submitted.tournament_id, submitted.result,
+                                 CASE WHEN pairings.table_number IS NOT NULL THEN last.number END,
+                                 pairings.table_number
+                          FROM submitted
+                          LEFT JOIN LATERAL (SELECT id, number FROM rounds
+                                             WHERE rounds.tournament_id = submitted.tournament_id
+                                             ORDER BY number DESC LIMIT 1) AS last ON TRUE
+                          LEFT JOIN pairings ON pairings.round_id = last.id
+                          AND pairings.id1 = submitted.player_id AND pairings.id2 IS NULL
+                          ON CONFLICT (tournament_id, round_number, table_number) DO NOTHING
+                          RETURNING id, player_id, tournament_id, result, round_number, table_number),
+                      closed AS (
+                          UPDATE pairings SET bye_id = inserted.id
+                          FROM inserted, rounds
+                          WHERE rounds.tournament_id = inserted.tournament_id
+                          AND rounds.number = inserted.round_number AND pairings.round_id = rounds.id
+                          AND pairings.table_number = inserted.table_number)
+                      SELECT player_id, tournament_id, result FROM inserted ORDER BY id;"""
+        recordedMatches, recordedByes = [], []
+        if not matches and not byes:
+            return recordedMatches, recordedByes
+        with self._sharedCursor([match[3] for match in matches] + [bye[1] for bye in byes]) as c:
+            if matches:
+                recordedMatches = psycopg2.extras.execute_values(
+                    c, query, matches, template='(%s::INT, %s::INT, %s::INT, %s::INT)',
+                    page_size=len(matches), fetch=True)
+                _rateMatches(c, [match[:3] for match in recordedMatches])
+            if byes:
+                recordedByes = psycopg2.extras.execute_values(
+                    c, byeQuery, byes, template='(%s::INT, %s::INT, %s::TEXT)',
+                    page_size=len(byes), fetch=True)
+        return recordedMatches, recordedByes
+
+    def results(self, tournament):
+        """Returns the (id, name) of the players taking part in a tournament and
+        the (id1, id2, winner) of its matches, with None as the winner of a tie,
+        read in one transaction
+
+        Each bye is listed as a match of its player against BYE, won as
+        byeWinner() returns.
+        """
+        with self.cursor() as c:
+            c.execute("""SELECT players.id, players.name FROM tournament_participants
+                         JOIN players ON players.id = tournament_participants.player_id
+                         WHERE tournament_participants.tournament_id = %s;""", (tournament,))
+            players = c.fetchall()
+            c.execute("""SELECT id1, id2, winner FROM matches WHERE tournament_id = %(tournament)s
+                         UNION ALL
+                         SELECT player_id, %(bye)s, CASE result WHEN 'win' THEN player_id
+                                                    WHEN 'loss' THEN %(bye)s END
+                         FROM byes WHERE tournament_id = %(tournament)s;""",
+                      {'tournament': tournament, 'bye': BYE})
+            matches = c.fetchall()
+        return players, matches
+
+    def pairingState(self, tournament):
+        """Returns what is needed to pair the next round of a tournament, read
+        in one transaction: a list of (id, name, wins) tuples in the order of
+        the standings, and the opponents the players have played, BYE for each
+        bye, and their colours, as countOpponents() returns them"""
+        with self.cursor() as c:
+            c.execute('SELECT id, name, wins FROM standings WHERE tournament_id = %s;', (tournament,))
+            standings = c.fetchall()
+            c.execute("""SELECT id1, id2 FROM matches WHERE tournament_id = %(tournament)s
+                         UNION ALL
+                         SELECT player_id, %(bye)s FROM byes WHERE tournament_id = %(tournament)s;""",
+                      {'tournament': tournament, 'bye': BYE})
+            rows = c.fetchall()
+        playedOpponents, colours = countOpponents(rows, [row[0] for row in standings])
+        return standings, playedOpponents, colours
+
+    def addRound(self, tournament, pairings):
+        """Records the next round of a tournament and its pairings in one
+        transaction, and returns the number of the round
+
+        Args:
+          tournament: the id number of the tournament
+          pairings: a list of (id1, id2) tuples, seated at tables numbered
+            from 1 in order, with BYE as the second player of the bye
+
+        Raises IntegrityError if a pairing of the last round has no result yet.
+        """
+        return self.addRounds([(tournament, pairings)])[tournament]
+
+    def addRounds(self, rounds):
+        """Records the next round of each of a list of tournaments and their
+        pairings in one transaction, and returns a dictionary of the
+        tournaments and the numbers of their rounds
+
+        Args:
+          rounds: a list of (tournament, pairings) tuples, with the pairings as
+            addRound() takes them
+
+        Raises IntegrityError, recording none of the rounds, if a tournament
+        isn't registered or a pairing of its last round has no result yet.
+        """
+        import psycopg2.extras
+        tournaments = sorted(set(tournament for tournament, pairings in rounds))
+        if len(tournaments) < len(rounds):
+            raise IntegrityError("A tournament can only start one round at a time.")
+        if not rounds:
+            return {}
+        with self.cursor() as c:
+            #rounds are started one at a time in each tournament; the lock
+            #doesn't hold up the matches referencing the tournament, and the
+            #tournaments are locked in order so that batches can't deadlock
+            c.execute('SELECT id FROM tournaments WHERE id = ANY(%s) ORDER BY id FOR NO KEY UPDATE;',
+                      (tournaments,))
+            registered = set(row[0] for row in c.fetchall())
+            for tournament in tournaments:
+                if tournament not in registered:
+                    raise IntegrityError("Tournament %s is not registered." % tournament)
+            last = _lastRounds(c, tournaments)
+            for tournament in tournaments:
+                if tournament in last and last[tournament][1]:
+                    raise IntegrityError("Round %s of tournament %s has %s pairings without a result."
+                                         % (last[tournament][0], tournament, last[tournament][1]))
+            numbers = dict((tournament, last.get(tournament, (0, 0))[0] + 1) for tournament in tournaments)
+            roundIds = dict(psycopg2.extras.execute_values(
+                c, 'INSERT INTO rounds (tournament_id, number) VALUES %s RETURNING tournament_id, id;',
+                sorted(numbers.items()), page_size=len(numbers), fetch=True))
+            rows = [(roundIds[tournament], table, id1, None if id2 == BYE else id2)
+                    for tournament, pairings in rounds
+                    for table, (id1, id2) in enumerate(pairings, 1)]
+            if rows:
+                psycopg2.extras.execute_values(
+                    c, 'INSERT INTO pairings (round_id, table_number, id1, id2) VALUES %s;',
+                    rows, page_size=len(rows))
+        return numbers
+
+    def openPairings(self, tournaments):
+        """Returns a dictionary of the tournaments of a list whose last round
+        has pairings without a result, and the number of those pairings"""
+        with self.cursor() as c:
+            last = _lastRounds(c, list(tournaments))
+        return dict((tournament, count) for tournament, (number, count) in last.items() if count)
+
+    def pairingRows(self, tournaments):
+        """Returns what is needed to pair the next round of each of a list of
+        tournaments, read in one transaction: a dictionary of the tournaments
+        and a tuple of the (id, name, wins) of their players, in the order of
+        the standings, and the (id1, id2) of their matches, with BYE as the
+        second player of each bye, as countOpponents() takes them; the
+        tournaments that aren't registered are left out"""
+        tournaments = list(tournaments)
+        with self.cursor() as c:
+            c.execute('SELECT id FROM tournaments WHERE id = ANY(%s);', (tournaments,))
+            rows = dict((row[0], ([], [])) for row in c.fetchall())
+            c.execute('SELECT tournament_id, id, name, wins FROM standings WHERE tournament_id = ANY(%s);',
+                      (tournaments,))
+            for row in c.fetchall():
+                rows[row[0]][0].append(row[1:])
+            c.execute("""SELECT tournament_id, id1, id2 FROM matches WHERE tournament_id = ANY(%(tournaments)s)
+                         UNION ALL
+                         SELECT tournament_id, player_id, %(bye)s FROM byes
+                         WHERE tournament_id = ANY(%(tournaments)s);""",
+                      {'tournaments': tournaments, 'bye': BYE})
+            for row in c.fetchall():
+                rows[row[0]][1].append(row[1:])
+        return rows
+
+    @contextlib.contextmanager
+    def lockTournaments(self, tournaments, wait=False):
+        """Takes the advisory lock of each of a list of tournaments, and yields
+        the list of those it took.
+
+        Without wait the tournaments whose lock another session holds are left
+        out; with it the caller waits for them, taking them in order so that
+        callers can't deadlock.  The locks are held on a connection of a pool
+        of their own, and are released when the block exits; meanwhile the
+        store reads and writes through that connection in the calling thread
+        (see cursor()), so the caller never waits for the main pool while
+        holding them.  Results are written holding the locks of their
+        tournaments shared, so they wait for the block to exit and it waits
+        for the results being written.
+        """
+        pool, slots = self._getPool(locks=True)
+        slots.acquire()
+        try:
+            db = pool.getconn()
+            try:
+                if not db.autocommit:
+                    db.autocommit = True
+                with db.cursor() as c:
+                    if wait:
+                        locked = sorted(set(tournaments))
+                        c.execute("""SELECT pg_advisory_lock(%s, tournament)
+                                     FROM unnest(%s::integer[]) AS tournament;""",
+                                  (TOURNAMENT_LOCK, locked))
+                    else:
+                        c.execute("""SELECT tournament FROM unnest(%s::integer[]) AS tournament
+                                     WHERE pg_try_advisory_lock(%s, tournament);""",
+                                  (list(tournaments), TOURNAMENT_LOCK))
+                        locked = [row[0] for row in c.fetchall()]
+                    #the caller's transactions run on this connection
+                    #meanwhile; the locks are held by the session, not by them
+                    db.autocommit = False
+                    held = self._local.__dict__.setdefault('held', [])
+                    held.append(db)
+                    try:
+                        yield locked
+                    finally:
+                        held.remove(db)
+                        if not db.closed:
+                            db.rollback()
+                            db.autocommit = True
+                            c.execute('SELECT pg_advisory_unlock_all();')
+            finally:
+                pool.putconn(db, close=bool(db.closed))
+        finally:
+            slots.release()
+
+    def lastRound(self, tournament):
+        """Returns the number of the last round of a tournament, or 0 if none
+        has been started"""
+        with self.cursor() as c:
+            c.execute('SELECT MAX(number) FROM rounds WHERE tournament_id = %s;', (tournament,))
+            return c.fetchone()[0] or 0
+
+    def roundPairings(self, tournament, number=None):
+        """Returns a list of (table, id1, name1, id2, name2, reported) tuples
+        of the pairings of a round of a tournament, the last one if number is
+        None, in the order of the tables, with BYE and 'bye' as the second
+        player of the bye"""
+        query = """SELECT pairings.table_number, pairings.id1, p1.name,
+                          COALESCE(pairings.id2, %(bye)s), COALESCE(p2.name, 'bye'),
+                          pairings.match_id IS NOT NULL OR pairings.bye_id IS NOT NULL
+                   FROM pairings
+                   JOIN players AS p1 ON p1.id = pairings.id1
+                   LEFT JOIN players AS p2 ON p2.id = pairings.id2
+                   WHERE pairings.round_id = (SELECT id FROM rounds WHERE tournament_id = %(tournament)s
+                                              AND (%(number)s IS NULL OR number = %(number)s)
+                                              ORDER BY number DESC LIMIT 1)
+                   ORDER BY pairings.table_number;"""
+        with self.cursor() as c:
+            c.execute(query, {'tournament': tournament, 'number': number, 'bye': BYE})
+            return c.fetchall()
+
+    def closeTable(self, tournament, table, winner, bye='win', number=None):
+        """Records the result of the pairing at a table of a round of a
+        tournament in one transaction, keyed by the round and the table, and
+        returns the (id1, id2, winner) of the match and whether it was
+        recorded now rather than before
+
+        Reporting the result a pairing already has again records nothing.
+        The pairing of the bye is recorded as a bye of the given result from
+        BYE_RESULTS instead, whatever the winner, and returned as a match
+        against BYE won as byeWinner() returns.  A match recorded is rated in
+        the same transaction, as addMatches() rates it.  Raises IntegrityError
+        if there is no such pairing, it already has a different result, or the
+        winner isn't one of its players or None for a tie.
+
+        Args:
+          number: the number of the round, or None for the last one started
+        """
+        with self._sharedCursor([tournament]) as c:
+            c.execute("""SELECT rounds.id, rounds.number, pairings.id1, pairings.id2
+                         FROM pairings JOIN rounds ON rounds.id = pairings.round_id
+                         WHERE rounds.tournament_id = %(tournament)s
+                         AND rounds.number = COALESCE(%(number)s, (SELECT MAX(number) FROM rounds
+                                                                   WHERE tournament_id = %(tournament)s))
+                         AND pairings.table_number = %(table)s;""",
+                      {'tournament': tournament, 'table': table, 'number': number})
+            row = c.fetchone()
+            if row is None:
+                if number is None:
+                    raise IntegrityError("The last round of tournament %s has no table %s."
+                                         % (tournament, table))
+                raise IntegrityError("Round %s of tournament %s has no table %s."
+                                     % (number, tournament, table))
+            roundId, number, id1, id2 = row
+            key = {'tournament': tournament, 'number': number, 'table': table}
+            if id2 is None:
+                match = (id1, BYE, byeWinner(id1, bye))
+                c.execute("""INSERT INTO byes (player_id, tournament_id, result, round_number, table_number)
+                             VALUES (%(player)s, %(tournament)s, %(result)s, %(number)s, %(table)s)
+                             ON CONFLICT (tournament_id, round_number, table_number) DO NOTHING
+                             RETURNING id;""", dict(key, player=id1, result=bye))
+                inserted = c.fetchone()
+                if inserted is not None:
+                    c.execute('UPDATE pairings SET bye_id = %s WHERE round_id = %s AND table_number = %s;',
+                              (inserted[0], roundId, table))
+                    return match, True
+                c.execute("""SELECT result FROM byes WHERE tournament_id = %(tournament)s
+                             AND round_number = %(number)s AND table_number = %(table)s;""", key)
+                recorded = (id1, BYE, byeWinner(id1, c.fetchone()[0]))
+            else:
+                if winner not in (id1, id2, None):
+                    raise IntegrityError("The winner of a match should be one of its players.")
+                match = (id1, id2, winner)
+                c.execute("""INSERT INTO matches (id1, id2, winner, tournament_id, round_number, table_number)
+                             VALUES (%(id1)s, %(id2)s, %(winner)s, %(tournament)s, %(number)s, %(table)s)
+                             ON CONFLICT (tournament_id, round_number, table_number) DO NOTHING
+                             RETURNING id;""", dict(key, id1=id1, id2=id2, winner=winner))
+                inserted = c.fetchone()
+                if inserted is not None:
+                    c.execute('UPDATE pairings SET match_id = %s WHERE round_id = %s AND table_number = %s;',
+                              (inserted[0], roundId, table))
+                    _rateMatches(c, [match])
+                    return match, True
+                c.execute("""SELECT id1, id2, winner FROM matches WHERE tournament_id = %(tournament)s
+                             AND round_number = %(number)s AND table_number = %(table)s;""", key)
+                recorded = c.fetchone()
+        #a match reported by reportMatch() may list its players the other way round
+        if sorted(recorded[:2]) != sorted(match[:2]) or recorded[2] != match[2]:
+            raise IntegrityError("Table %s of round %s already has a different result." % (table, number))
+        return tuple(recorded), False
+
+    def ratings(self, tournament):
+        """Returns a list of the (id, name, elo, glicko, deviation, volatility,
+        games) of the players taking part in a tournament, with the ratings in
+        ratingExtraCredit.START for those who haven't played a rated match,
+        highest Glicko-2 rating first"""
+        return self.tournamentRatings([tournament])[tournament]
+
+    def tournamentRatings(self, tournaments):
+        """Returns a dictionary of each of a list of tournaments and the
+        ratings of its players, as ratings() returns them, read with one
+        query"""
+        query = """SELECT tournament_participants.tournament_id, players.id, players.name,
+                          COALESCE(ratings.elo, %(elo)s), COALESCE(ratings.glicko, %(glicko)s),
+                          COALESCE(ratings.deviation, %(deviation)s),
+                          COALESCE(ratings.volatility, %(volatility)s), COALESCE(ratings.games, %(games)s)
+                   FROM tournament_participants
+                   JOIN players ON players.id = tournament_participants.player_id
+                   LEFT JOIN ratings ON ratings.player_id = players.id
+                   WHERE tournament_participants.tournament_id = ANY(%(tournaments)s)
+                   ORDER BY 1, 5 DESC, players.id;"""
+        tournaments = list(tournaments)
+        rows = dict((tournament, []) for tournament in tournaments)
+        if not tournaments:
+            return rows
+        with self.cursor() as c:
+            c.execute(query, dict(zip(rating.COLUMNS, rating.START), tournaments=tournaments))
+            for row in c.fetchall():
+                rows[row[0]].append(row[1:])
+        return rows
+
+    def recomputeRatings(self):
+        """Rates every match again from the start, in the order they were
+        recorded, with ratingExtraCredit.computeRatings(), replaces the
+        ratings of the players with the new ones in one transaction, and
+        returns the number of matches rated
+
+        The matches are copied out of the database as text and read straight
+        into NumPy.  The ratings are locked against writes first, so a match
+        recorded meanwhile is either among those rated or rated on top of the
+        new ratings once they are written.
+        """
+        import numpy
+        with self.cursor() as c:
+            c.execute('LOCK TABLE ratings IN EXCLUSIVE MODE;')
+            data = io.BytesIO()
+            c.copy_expert('COPY (SELECT id1, id2, COALESCE(winner, -1) FROM matches ORDER BY id) TO STDOUT;',
+                          data)
+            matches = numpy.array(data.getvalue().split(), dtype=numpy.int64).reshape(-1, 3)
+            #repr() writes every digit of a float on Python 2 as well
+            rows = [(row[0],) + tuple(repr(value) for value in row[1:5]) + (row[5],)
+                    for row in rating.ratingRows(rating.computeRatings(matches))]
+            c.execute('DELETE FROM ratings;')
+            _copyRows(c, 'ratings', ('player_id',) + rating.COLUMNS, rows)
+        return len(matches)
+
+
+class MemoryStore(object):
+    """Keeps the tournaments in Python objects, for simulations and tests.
+
+    The store follows the tournamentExtraCredit.sql schema: ids are handed out
+    in order from 1 like its serial columns, the scores of each participant
+    are kept up to date as the scores table is, deleting a tournament deletes
+    its participants and matches, and the changes the database would reject
+    raise IntegrityError without changing anything.  Ties in the standings are
+    listed in the order the players joined the tournament.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._players = {}
+        self._tournaments = {}
+        #the players taking part in each tournament in the order they joined,
+        #and the id of each (player, tournament) participation
+        self._entrants = {}
+        self._participants = {}
+        #the (id1, id2, winner) of the matches of each tournament, each bye as a
+        #match against BYE won as byeWinner() returns, and the [matches, wins,
+        #ties, points] of each (player, tournament) participation
+        self._matches = {}
+        self._scores = {}
+        #the pairings of each round of each tournament, [id1, id2, result]
+        #lists by table, where result is the (id1, id2, winner) of the match or
+        #bye recorded at the table or None, and the pairings of the last round
+        #of each tournament by the frozenset of their players
+        self._rounds = {}
+        self._tables = {}
+        #the ratings of each player who has played a rated match, and the
+        #(id1, id2, winner, tournament) of every match in the order they were
+        #recorded, for recomputeRatings()
+        self._ratings = {}
+        self._history = []
+        #the tournaments locked by lockTournaments(), and the condition the
+        #callers waiting for them wait on
+        self._locked = set()
+        self._unlocked = threading.Condition(self._lock)
+        self._lastPlayer = 0
+        self._lastTournament = 0
+        self._lastParticipant = 0
+
+    def close(self):
+        """Does nothing; the store holds no connections."""
+
+    def _score(self, player, tournament):
+        """Returns the [matches, wins, ties, points] of a player in the matches
+        of a tournament"""
+        score = [0, 0, 0, 0]
+        for id1, id2, winner in self._matches[tournament]:
+            if player in (id1, id2):
+                self._count(score, player, winner, 1)
+        return score
+
+    def _count(self, score, player, winner, sign):
+        """Adds a match to a score, or takes it away if sign is -1"""
+        score[0] += sign
+        if winner is None:
+            score[2] += sign
+            score[3] += sign
+        elif winner == player:
+            score[1] += sign
+            score[3] += 3 * sign
+
+    def deleteMatches(self):
+        """Deletes every match and bye, along with the rounds they were paired
+        in and the ratings of the players"""
+        with self._lock:
+            for tournament in self._matches:
+                self._matches[tournament] = []
+                self._rounds[tournament] = []
+                self._tables[tournament] = {}
+            for score in self._scores.values():
+                score[:] = [0, 0, 0, 0]
+            self._ratings.clear()
+            del self._history[:]
+
+    def deletePlayers(self):
+        with self._lock:
+            if any(self._matches.values()):
+                raise IntegrityError("The players have matches recorded.")
+            if any(winner is not None for winner in self._tournaments.values()):
+                raise IntegrityError("The players have won tournaments.")
+            if any(self._rounds.values()):
+                raise IntegrityError("The players have pairings recorded.")
+            self._players.clear()
+            self._participants.clear()
+            self._scores.clear()
+            self._ratings.clear()
+            for tournament in self._entrants:
+                self._entrants[tournament] = []
+
+    def countPlayers(self):
+        with self._lock:
+            return len(self._players)
+
+    def addPlayer(self, name):
+        """Registers a player and returns their id"""
+        return self.addPlayers([name])[0]
+
+    def addPlayers(self, names):
+        """Registers players and returns their ids in order"""
+        with self._lock:
+            ids = list(range(self._lastPlayer + 1, self._lastPlayer + 1 + len(names)))
+            self._lastPlayer += len(names)
+            self._players.update(zip(ids, names))
+            return ids
+
+    def addTournament(self):
+        """Registers a tournament and returns its id"""
+        with self._lock:
+            self._lastTournament += 1
+            tournament = self._lastTournament
+            self._tournaments[tournament] = None
+            self._entrants[tournament] = []
+            self._matches[tournament] = []
+            self._rounds[tournament] = []
+            self._tables[tournament] = {}
+            return tournament
+
+    def deleteTournament(self, tournament):
+        """Deletes a tournament along with its participants, matches and
+        rounds"""
+        with self._lock:
+            if tournament not in self._tournaments:
+                return
+            for player in self._entrants[tournament]:
+                del self._participants[(player, tournament)]
+                del self._scores[(player, tournament)]
+            del self._tournaments[tournament]
+            del self._entrants[tournament]
+            del self._matches[tournament]
+            del self._rounds[tournament]
+            del self._tables[tournament]
+            self._history = [match for match in self._history if match[3] != tournament]
+
+    def _checkRegistered(self, players, tournament):
+        if tournament not in self._tournaments:
+            raise IntegrityError("Tournament %s is not registered." % tournament)
+        for player in players:
+            if player not in self._players:
+                raise IntegrityError("Player %s is not registered." % player)
+
+    def _join(self, player, tournament):
+        self._lastParticipant += 1
+        self._participants[(player, tournament)] = self._lastParticipant
+        self._entrants[tournament].append(player)
+        self._scores[(player, tournament)] = self._score(player, tournament)
+        return self._lastParticipant
+
+    def addParticipant(self, player, tournament):
+        """Registers a player in a tournament unless they already take part"""
+        with self._lock:
+            self._checkRegistered([player], tournament)
+            if (player, tournament) not in self._participants:
+                self._join(player, tournament)
+
+    def addParticipants(self, players, tournament):
+        """Registers players in a tournament and returns the ids of the
+        participants in order"""
+        with self._lock:
+            self._checkRegistered(players, tournament)
+            for player in players:
+                if (player, tournament) in self._participants:
+                    raise IntegrityError("Player %s already takes part in tournament %s."
+                                         % (player, tournament))
+            return [self._join(player, tournament) for player in players]
+
+    def setWinner(self, winner, tournament):
+        with self._lock:
+            if tournament not in self._tournaments:
+                return
+            if winner not in self._players:
+                raise IntegrityError("Player %s is not registered." % winner)
+            self._tournaments[tournament] = winner
+
+    def standings(self, tournament):
+        """Returns a list of (id, name, wins, matches) tuples of the players
+        taking part in a tournament, sorted by points and wins"""
+        with self._lock:
+            scores = [(x, self._scores[(x, tournament)]) for x in self._entrants.get(tournament, [])]
+            scores.sort(key=lambda item: (-item[1][3], -item[1][1]))
+            return [(x, self._players[x], score[1], score[0]) for x, score in scores]
+
+    def iterStandings(self, tournament, itersize):
+        """Yields the (id, name, wins, matches) standings of a tournament, as
+        standings() returns them; the store holds them in memory already, so
+        itersize makes no difference"""
+        for row in self.standings(tournament):
+            yield row
+
+    def addMatches(self, matches, byes=()):
+        """Records a list of (id1, id2, winner, tournament) tuples, with None as
+        the winner of a tie, and a list of (player, tournament, result) byes,
+        with a result from BYE_RESULTS, all of them or none, and returns the
+        lists of the matches and byes recorded, leaving out those reported
+        again for a pairing that has a result, as PostgresStore.addMatches()
+        does"""
+        with self._lock:
+            self._waitUnlocked([match[3] for match in matches] + [bye[1] for bye in byes])
+            for id1, id2, winner, tournament in matches:
+                self._checkRegistered([id1, id2], tournament)
+                if id1 == id2:
+                    raise IntegrityError("A player can't play against themself.")
+                if winner not in (id1, id2, None):
+                    raise IntegrityError("The winner of a match should be one of its players.")
+            for player, tournament, result in byes:
+                self._checkRegistered([player], tournament)
+                if result not in BYE_RESULTS:
+                    raise IntegrityError("A bye is scored as one of %s." % (BYE_RESULTS,))
+            recordedMatches = [match for match in matches if self._record(*match)]
+            recordedByes = [bye for bye in byes
+                            if self._record(bye[0], BYE, byeWinner(bye[0], bye[2]), bye[1])]
+            return recordedMatches, recordedByes
+
+    def _record(self, id1, id2, winner, tournament):
+        """Records a match, or a bye as a match against BYE, unless it is
+        reported again for a pairing that has a result, rates it unless it is
+        a bye, and returns whether it was recorded; the lock has to be held"""
+        pairing = self._tables[tournament].get(frozenset((id1, id2)))
+        if pairing is not None:
+            if pairing[2] is not None:
+                return False
+            pairing[2] = (pairing[0], pairing[1], winner)
+        self._matches[tournament].append((id1, id2, winner))
+        for player in (id1, id2):
+            score = self._scores.get((player, tournament))
+            if score is not None:
+                self._count(score, player, winner, 1)
+        if id2 != BYE:
+            rating.rateMatches(self._ratings, [(id1, id2, winner)])
+            self._history.append((id1, id2, winner, tournament))
+        return True
+
+    def results(self, tournament):
+        """Returns the (id, name) of the players taking part in a tournament and
+        the (id1, id2, winner) of its matches, with None as the winner of a tie
+        and each bye listed as a match against BYE"""
+        with self._lock:
+            players = [(x, self._players[x]) for x in self._entrants.get(tournament, [])]
+            return players, list(self._matches.get(tournament, []))
+
+    def pairingState(self, tournament):
+        """Returns a list of (id, name, wins) tuples in the order of the
+        standings of a tournament, and the opponents the players have played,
+        BYE for each bye, and their colours, as countOpponents() returns them"""
+        with self._lock:
+            standings = [row[:3] for row in self.standings(tournament)]
+            matches = [(id1, id2) for id1, id2, winner in self._matches.get(tournament, [])]
+        playedOpponents, colours = countOpponents(matches, [row[0] for row in standings])
+        return standings, playedOpponents, colours
+
+    def addRound(self, tournament, pairings):
+        """Records the next round of a tournament and its pairings, seated at
+        tables numbered from 1 in order with BYE as the second player of the
+        bye, and returns the number of the round.
+        Raises IntegrityError if a pairing of the last round has no result
+        yet."""
+        return self.addRounds([(tournament, pairings)])[tournament]
+
+    def addRounds(self, rounds):
+        """Records the next round of each of a list of (tournament, pairings)
+        tuples, all of them or none, and returns a dictionary of the
+        tournaments and the numbers of their rounds"""
+        with self._lock:
+            if len(set(tournament for tournament, pairings in rounds)) < len(rounds):
+                raise IntegrityError("A tournament can only start one round at a time.")
+            for tournament, pairings in rounds:
+                self._checkRegistered([x for pairing in pairings for x in pairing if x != BYE],
+                                      tournament)
+                unreported = self._unreported(tournament)
+                if unreported:
+                    raise IntegrityError("Round %s of tournament %s has %s pairings without a result."
+                                         % (len(self._rounds[tournament]), tournament, unreported))
+            numbers = {}
+            for tournament, pairings in rounds:
+                tables = [[id1, id2, None] for id1, id2 in pairings]
+                self._rounds[tournament].append(tables)
+                self._tables[tournament] = dict((frozenset(pairing[:2]), pairing) for pairing in tables)
+                numbers[tournament] = len(self._rounds[tournament])
+            return numbers
+
+    def _unreported(self, tournament):
+        """Returns the number of pairings of the last round of a tournament
+        without a result; the lock has to be held"""
+        return sum(1 for pairing in self._tables.get(tournament, {}).values() if pairing[2] is None)
+
+    def openPairings(self, tournaments):
+        """Returns a dictionary of the tournaments of a list whose last round
+        has pairings without a result, and the number of those pairings"""
+        with self._lock:
+            unreported = [(tournament, self._unreported(tournament)) for tournament in tournaments]
+            return dict((tournament, count) for tournament, count in unreported if count)
+
+    def pairingRows(self, tournaments):
+        """Returns a dictionary of the tournaments of a list and a tuple of the
+        (id, name, wins) of their players, in the order of the standings, and
+        the (id1, id2) of their matches, with BYE as the second player of each
+        bye, leaving out the tournaments that aren't registered"""
+        with self._lock:
+            return dict((tournament, ([row[:3] for row in self.standings(tournament)],
+                                      [match[:2] for match in self._matches[tournament]]))
+                        for tournament in tournaments if tournament in self._tournaments)
+
+    @contextlib.contextmanager
+    def lockTournaments(self, tournaments, wait=False):
+        """Takes the lock of each of a list of tournaments, and yields the list
+        of those it took; without wait the tournaments locked already are left
+        out, and with it the caller waits for them.  Results wait for the
+        locks of their tournaments to be released when the block exits."""
+        with self._lock:
+            if wait:
+                while self._locked.intersection(tournaments):
+                    self._unlocked.wait()
+            locked = [tournament for tournament in tournaments if tournament not in self._locked]
+            self._locked.update(locked)
+        try:
+            yield locked
+        finally:
+            with self._lock:
+                self._locked.difference_update(locked)
+                self._unlocked.notify_all()
+
+    def _waitUnlocked(self, tournaments):
+        """Waits until none of the tournaments is locked by lockTournaments();
+        the lock has to be held"""
+        while self._locked.intersection(tournaments):
+            self._unlocked.wait()
+
+    def lastRound(self, tournament):
+        """Returns the number of the last round of a tournament, or 0 if none
+        has been started"""
+        with self._lock:
+            return len(self._rounds.get(tournament, []))
+
+    def roundPairings(self, tournament, number=None):
+        """Returns a list of (table, id1, name1, id2, name2, reported) tuples
+        of the pairings of a round of a tournament, the last one if number is
+        None, in the order of the tables"""
+        with self._lock:
+            rounds = self._rounds.get(tournament, [])
+            if number is None:
+                number = len(rounds)
+            if not 1 <= number <= len(rounds):
+                return []
+            return [(table, id1, self._players[id1], id2, self._players.get(id2, 'bye'), result is not None)
+                    for table, (id1, id2, result) in enumerate(rounds[number - 1], 1)]
+
+    def closeTable(self, tournament, table, winner, bye='win', number=None):
+        """Records the result of the pairing at a table of a round of a
+        tournament, the last one if number is None, and returns the (id1,
+        id2, winner) of the match and whether it was recorded now rather than
+        before.  Reporting the result a pairing already has again records
+        nothing, and the pairing of the bye is recorded as a bye of the given
+        result instead, as PostgresStore.closeTable() does.  Raises
+        IntegrityError if there is no such pairing, it already has a different
+        result, or the winner isn't one of its players or None for a tie."""
+        with self._lock:
+            self._waitUnlocked([tournament])
+            rounds = self._rounds.get(tournament, [])
+            last = number is None
+            if last:
+                number = len(rounds)
+            if not 1 <= number <= len(rounds) or not 1 <= table <= len(rounds[number - 1]):
+                if last:
+                    raise IntegrityError("The last round of tournament %s has no table %s."
+                                         % (tournament, table))
+                raise IntegrityError("Round %s of tournament %s has no table %s."
+                                     % (number, tournament, table))
+            id1, id2, recorded = rounds[number - 1][table - 1]
+            if id2 == BYE:
+                match = (id1, BYE, byeWinner(id1, bye))
+            elif winner not in (id1, id2, None):
+                raise IntegrityError("The winner of a match should be one of its players.")
+            else:
+                match = (id1, id2, winner)
+            if recorded is not None:
+                if sorted(recorded[:2]) != sorted(match[:2]) or recorded[2] != match[2]:
+                    raise IntegrityError("Table %s of round %s already has a different result."
+                                         % (table, number))
+                return recorded, False
+            if id2 == BYE:
+                self.addMatches([], [(id1, tournament, bye)])
+            else:
+                self.addMatches([match + (tournament,)])
+            return match, True
+
+    def ratings(self, tournament):
+        """Returns a list of the (id, name, elo, glicko, deviation, volatility,
+        games) of the players taking part in a tournament, highest Glicko-2
+        rating first, as PostgresStore.ratings() does"""
+        with self._lock:
+            rows = [(x, self._players[x]) + tuple(self._ratings.get(x, rating.START))
+                    for x in self._entrants.get(tournament, [])]
+        rows.sort(key=lambda row: (-row[3], row[0]))
+        return rows
+
+    def tournamentRatings(self, tournaments):
+        """Returns a dictionary of each of a list of tournaments and the
+        ratings of its players, as ratings() returns them"""
+        with self._lock:
+            return dict((tournament, self.ratings(tournament)) for tournament in tournaments)
+
+    def recomputeRatings(self):
+        """Rates every match again from the start, in the order they were
+        recorded, with ratingExtraCredit.computeRatings(), and returns the
+        number of matches rated"""
+        with self._lock:
+            matches = [match[:3] for match in self._history]
+            self._ratings = dict((row[0], row[1:]) for row in
+                                 rating.ratingRows(rating.computeRatings(matches)))
+            return len(matches)
@@ -3,41 +3,364 @@
 # tournament.py -- implementation of a Swiss-system tournament
 #
 
-import psycopg2
-import bleach
+import atexit
+import csv
+import itertools
+import numbers
+import os
+import threading
+
+import cacheExtraCredit as cache
+import instrument
+import ranking
+import ratingExtraCredit as rating
+import storageExtraCredit as storage
+import swiss
+
+# psycopg2, bleach and numpy are imported by the functions that use them, so that
+# importing this module (for the pairing functions, say) stays cheap and works
+# without a database driver installed.  The public functions are wrapped by
+# instrument.instrumented, which records their calls while instrument is
+# enabled.
+
+
+DSN = "dbname=tournament"
+POOL_SIZE = 5
+
+#the number of tournaments whose pairing state is kept between rounds
+PAIRING_CACHE_SIZE = 64
+
+#the number of tournaments whose standings are kept, and for how many seconds
+STANDINGS_CACHE_SIZE = 64
+STANDINGS_CACHE_TTL = 10
+
+#how a bye is scored: 'win', 'tie' or 'loss'
+BYE_RESULT = 'win'
+
+#the rows iterStandings() fetches from the database at a time
+STREAM_ITERSIZE = 2000
+
+#the rating the players are seeded by in the first round of a tournament:
+#'glicko', 'elo' or None to pair them in the order they registered
+SEEDING = None
+
+#the store the tournaments are kept in; set TOURNAMENT_STORE=memory in the
+#environment to start with a MemoryStore instead of the database
+_store = None
+_storeLock = threading.Lock()
+
+#the pairing state of the tournaments paired most recently, kept up to date
+#by the functions in this module as results are reported
+_pairingCache = cache.PairingStateCache(PAIRING_CACHE_SIZE)
+
+#the standings of the tournaments viewed most recently, dropped by the
+#functions in this module whenever they change
+_standingsCache = cache.StandingsCache(STANDINGS_CACHE_SIZE, STANDINGS_CACHE_TTL)
+
+#how the byes reported from now on are scored
+_byeResult = BYE_RESULT
+
+#the rating the first rounds are seeded by
+_seeding = SEEDING
 
 
 def connect():
     """Connect to the PostgreSQL database and creates a cursor.
     Returns a database connection and a cursor.
+
+    The connection is not pooled; the functions in this module check their
+    connections out of the pool through getCursor() instead.
     """
-    db = psycopg2.connect("dbname=tournament")
+    import psycopg2
+    db = psycopg2.connect(DSN)
     c = db.cursor()
     return db, c
 
 
+def getStore():
+    """Returns the store the functions in this module keep the tournaments in,
+    opening a storage.PostgresStore on DSN on first use, or a
+    storage.MemoryStore if the TOURNAMENT_STORE environment variable is
+    'memory'."""
+    global _store
+    with _storeLock:
+        if _store is None:
+            if os.environ.get('TOURNAMENT_STORE') == 'memory':
+                _store = storage.MemoryStore()
+            else:
+                _store = storage.PostgresStore(DSN, POOL_SIZE)
+        return _store
+
+
+def setStore(store):
+    """Sets the store the functions in this module keep the tournaments in.
+
+    The connections held by the current store are closed, and the pairing
+    state and standings cached from it are dropped.
+
+    Args:
+      store: a storage.PostgresStore or storage.MemoryStore
+    """
+    global _store
+    with _storeLock:
+        if _store is not None:
+            _store.close()
+        _store = store
+    _changed()
+
+
+def configurePairingCache(size=PAIRING_CACHE_SIZE):
+    """Sets how many tournaments have their pairing state kept between rounds.
+
+    swissPairings() keeps the standings and played opponents of the
+    tournaments it pairs, and reportMatch() and reportMatches() add the new
+    results to them, so that the next round is paired without reading the
+    whole history again.  The cache assumes this process is the only one
+    reporting results; if other processes or tournamentExtraCreditAsync.py
+    write to the same database, set the size to 0 to read the pairing state
+    from the database every round.
+
+    Args:
+      size: the number of tournaments kept, or 0 to keep none
+    """
+    global _pairingCache
+    _pairingCache = cache.PairingStateCache(size)
+
+
+def getPairingCache():
+    """Returns the cacheExtraCredit.PairingStateCache that swissPairings()
+    keeps the pairing state of the tournaments in"""
+    return _pairingCache
+
+
+def configureStandingsCache(size=STANDINGS_CACHE_SIZE, ttl=STANDINGS_CACHE_TTL):
+    """Sets how many tournaments have their standings kept, and for how long.
+
+    playerStandings() answers from the cache until a function of this module
+    changes the tournament, so the store is read once per change however
+    many times the standings are viewed.  Changes made by other processes
+    show up once the standings are ttl seconds old.
+
+    Args:
+      size: the number of tournaments kept, or 0 to keep none
+      ttl: how many seconds standings are kept for, or None to keep them
+        until they change
+    """
+    global _standingsCache
+    _standingsCache = cache.StandingsCache(size, ttl)
+
+
+def getStandingsCache():
+    """Returns the cacheExtraCredit.StandingsCache that playerStandings()
+    keeps the standings of the tournaments in, with its hit and miss
+    counters"""
+    return _standingsCache
+
+
+def configureByes(result=BYE_RESULT):
+    """Sets how the byes reported from now on are scored.
+
+    Args:
+      result: 'win' to score a bye as a win, 'tie' as a tie or 'loss' as a
+        loss; it counts as a match either way
+    """
+    global _byeResult
+    if result not in storage.BYE_RESULTS:
+        raise ValueError("A bye is scored as one of %s, not %r." % (storage.BYE_RESULTS, result))
+    _byeResult = result
+
+
+def getByeResult():
+    """Returns how the byes reported from now on are scored"""
+    return _byeResult
+
+
+def configureSeeding(by=SEEDING):
+    """Sets the rating the players are seeded by in the first round of a
+    tournament.
+
+    Args:
+      by: 'glicko' to rank the players by their Glicko-2 ratings before the
+        first round is paired, 'elo' by their Elo ratings, or None to pair
+        them in the order of the standings, which is the order they
+        registered in, as they are by default
+    """
+    global _seeding
+    if by not in ('glicko', 'elo', None):
+        raise ValueError("Players are seeded by 'glicko', 'elo' or None, not %r." % (by,))
+    _seeding = by
+
+
+def getSeeding():
+    """Returns the rating the first rounds are seeded by, or None"""
+    return _seeding
+
+
+def _changed(tournament=None):
+    """Drops the cached standings and pairing state of a tournament, or of
+    every tournament"""
+    if tournament is None:
+        _pairingCache.clear()
+        _standingsCache.clear()
+    else:
+        _pairingCache.invalidate(tournament)
+        _standingsCache.invalidate(tournament)
+
+
+def configurePool(size=POOL_SIZE, dsn=DSN):
+    """Keeps the tournaments in the database, with a connection pool of the
+    given size and connection string.
+
+    Any connections held by the current store are closed; the new pool is
+    opened on the next checkout.  Call this before the pool is in use.
+
+    Args:
+      size: the number of connections kept open to the database
+      dsn: the libpq connection string
+    """
+    setStore(storage.PostgresStore(dsn, size))
+
+
+def closePool():
+    """Closes every connection held by the connection pool."""
+    with _storeLock:
+        if _store is not None:
+            _store.close()
+
+
+def getCursor():
+    """Checks a connection out of the pool and yields a cursor on it.
+
+    See storage.PostgresStore.cursor(); the store has to be a PostgresStore.
+    """
+    return getStore().cursor()
+
+
+atexit.register(closePool)
+
+
+MAX_ID = 2147483647
+
+
+def validateId(value, name='id'):
+    """Returns an id number as an int, rejecting anything that isn't one.
+
+    Ids are checked here instead of being passed through bleach.clean, which
+    parses its input as HTML and returns a string the database has to cast
+    back to a number.
+
+    Args:
+      value: an int, or a string of digits
+      name: what the id number is of, for the error message
+    """
+    #plain ints, by far the most common, skip the slower check against the
+    #abstract base class
+    if type(value) is int:
+        number = value
+    elif isinstance(value, numbers.Integral) and not isinstance(value, bool):
+        number = int(value)
+    elif isinstance(value, (str, type(u''))) and value.strip().isdigit():
+        number = int(value)
+    else:
+        raise TypeError("The %s should be an id number, not %r." % (name, value))
+    if not 0 <= number <= MAX_ID:
+        raise ValueError("The %s %s is out of range." % (name, number))
+    return number
+
+
+def validateResult(id1, id2, result):
+    """Returns the id number of the winner of a match, or None for a tie,
+    rejecting results that aren't one of the players or 'tie'.
+
+    Args:
+      id1: the id number of the 1st player, as returned by validateId()
+      id2: the id number of the 2nd player, as returned by validateId()
+      result: the id number of the winning player, or 'tie'
+    """
+    if id1 == id2:
+        raise ValueError("Player %s can't play against themself." % id1)
+    if isinstance(result, (str, type(u''))) and result.lower() == 'tie':
+        return None
+    winner = validateId(result, 'winner')
+    if winner not in (id1, id2):
+        raise ValueError("The winner of a match should be one of its players or 'tie'.")
+    return winner
+
+
+def validateMatches(results):
+    """Returns the (id1, id2, winner, tournament) of each result of a round,
+    with None as the winner of a tie, rejecting results that aren't valid or
+    that have a player play more than once in a tournament.
+
+    Args:
+      results: a list of (id1, id2, result, tournament) tuples, as taken by
+        reportMatch()
+    """
+    data = []
+    seen = set()
+    for match in results:
+        if len(match) != 4:
+            raise ValueError("Each result should be an (id1, id2, result, tournament) tuple.")
+        id1, id2 = validateId(match[0], 'player'), validateId(match[1], 'player')
+        tournament = validateId(match[3], 'tournament')
+        winner = validateResult(id1, id2, match[2])
+        for player in (id1, id2):
+            if (player, tournament) in seen:
+                raise ValueError("Player %s plays more than one match in the round." % player)
+            seen.add((player, tournament))
+        data.append((id1, id2, winner, tournament))
+    return data
+
+
+def splitByes(data):
+    """Returns the matches and the byes among validated results.
+
+    A result against storageExtraCredit.BYE is a bye, scored as configureByes()
+    sets whatever the result reported.
+
+    Args:
+      data: a list of (id1, id2, winner, tournament) tuples, as returned by
+        validateMatches()
+
+    Returns:
+      A list of the (id1, id2, winner, tournament) of the matches and a list
+      of the (player, tournament, result) of the byes
+    """
+    matches = []
+    byes = []
+    for id1, id2, winner, tournament in data:
+        if storage.BYE in (id1, id2):
+            byes.append((id2 if id1 == storage.BYE else id1, tournament, _byeResult))
+        else:
+            matches.append((id1, id2, winner, tournament))
+    return matches, byes
+
+
+def _readColumn(values):
+    """Returns values, or the first column of its rows if it is a CSV file"""
+    if hasattr(values, 'read'):
+        return [row[0] for row in csv.reader(values) if row]
+    return values
+
+
+@instrument.instrumented
 def deleteMatches():
     """Remove all the match records from the database."""
-    connect()
-    c.execute('DELETE FROM matches;')
-    db.commit()
-    db.close
+    getStore().deleteMatches()
+    _changed()
 
+@instrument.instrumented
 def deletePlayers():
     """Remove all the player records from the database."""
-    connect()
-    c.execute('DELETE FROM players;')
-    db.commit()
-    db.close
+    getStore().deletePlayers()
+    _changed()
 
+@instrument.instrumented
 def countPlayers():
     """Returns the number of players currently registered."""
-    connect()
-    c.execute('SELECT COUNT(*) FROM players;')
-    count = c.fetchall()
-    return count[0][0]
-    db.close
+    return getStore().countPlayers()
 
+@instrument.instrumented
 def registerPlayer(name):
     """Adds a player to the tournament database.
   
@@ -46,51 +369,101 @@ def registerPlayer(name):
   
     Args:
       name: the player's full name (need not be unique).
+
+    Returns:
+      The id assigned to the player
+    """
+    import bleach
+    return getStore().addPlayer(bleach.clean(name))
+
+
+@instrument.instrumented
+def registerPlayers(names):
+    """Adds many players to the tournament database at once.
+
+    The players are registered all or none, streamed to the database with a
+    single COPY in one transaction when it is kept in PostgreSQL (see
+    storageExtraCredit.PostgresStore.addPlayers).
+
+    Args:
+      names: an iterable of the players' full names, or a CSV file with the
+        names in its first column
+
+    Returns:
+      A list of the ids assigned to the players, in the order of the names
     """
-    connect()
-    query = 'INSERT INTO players (name) VALUES (%s);'
-    data = (bleach.clean(name),)
-    c.execute(query, data)
-    db.commit()
-    db.close
+    import bleach
+    names = [bleach.clean(name) for name in _readColumn(names)]
+    if not names:
+        return []
+    return getStore().addPlayers(names)
 
+@instrument.instrumented
 def registerTournament():
     """Adds a tournament to the tournament database.
 
     The database assigns a unique serial id number for the tournament.
+
+    Returns:
+      The id assigned to the tournament
     """
-    connect()
-    c.execute('INSERT INTO tournaments DEFAULT VALUES;')
-    db.commit()
-    db.close
+    return getStore().addTournament()
 
+@instrument.instrumented
 def deleteTournament(tournament):
     """Delets a tournament along with the matches played.
 
     Args:
         tournament: the id number of the tournament
     """
-    connect()
-    query = 'DELETE FROM tournaments WHERE id = %s;'
-    data = (bleach.clean(tournament),)
-    c.execute(query, data)
-    db.commit()
-    db.close
+    tournament = validateId(tournament, 'tournament')
+    getStore().deleteTournament(tournament)
+    _changed(tournament)
 
+@instrument.instrumented
 def registerTournamentPlayer(player, tournament):
     """Adds a player to a tournament.
 
+    Registering a player that is already taking part in the tournament does
+    nothing.
+
     Args:
         player: the id number of the player
         tournament: the id number of the tournament
     """
-    connect()
-    query = 'INSERT INTO tournament_participants (player_id, tournament_id) VALUES (%s, %s);'
-    data = (bleach.clean(player), bleach.clean(tournament),)
-    c.execute(query, data)
-    db.commit()
-    db.close
+    tournament = validateId(tournament, 'tournament')
+    getStore().addParticipant(validateId(player, 'player'), tournament)
+    _changed(tournament)
+
+
+@instrument.instrumented
+def registerTournamentPlayers(players, tournament):
+    """Adds many players to a tournament at once.
+
+    The participants are registered all or none, streamed to the database
+    with a single COPY in one transaction when it is kept in PostgreSQL.
+    Unlike registerTournamentPlayer(), registering a player
+    that is already taking part in the tournament fails the whole call.
+
+    Args:
+        players: an iterable of the id numbers of the players, or a CSV file
+          with the ids in its first column
+        tournament: the id number of the tournament
 
+    Returns:
+        A list of the ids assigned to the participants, in the order of the players
+    """
+    tournament = validateId(tournament, 'tournament')
+    players = [validateId(player, 'player') for player in _readColumn(players)]
+    if len(set(players)) != len(players):
+        raise ValueError("A player can only be registered once in a tournament.")
+    if not players:
+        return []
+    ids = getStore().addParticipants(players, tournament)
+    _changed(tournament)
+    return ids
+
+@instrument.instrumented
 def reportTournamentWinner(winner, tournament):
 
     """Records the winner of a single tournament.
@@ -99,21 +472,22 @@ def reportTournamentWinner(winner, tournament):
       winner: the id number of the winning player
       tournament: the id number of the tournament
     """
-    connect()
-    query = 'UPDATE tournaments SET winner = %s WHERE id = %s;'
-    data = (bleach.clean(winner), bleach.clean(tournament),)
-    c.execute(query, data)
-    db.commit()
-    db.close
+    getStore().setWinner(validateId(winner, 'winner'), validateId(tournament, 'tournament'))
 
-def playerStandings(tournament):
+@instrument.instrumented
+def playerStandings(tournament, tiebreaks=False):
     """Returns a list of the players and their win records, sorted by wins.
 
     The first entry in the list should be the player in first place, or a player
     tied for first place if there is currently a tie.
 
+    The standings are read from the store once after each change and then
+    answered from the standings cache (see configureStandingsCache).
+
     Args:
       tournament: the id number of the tournament being held
+      tiebreaks: True to rank players with the same points and wins by the
+        tiebreaks of tiebreakStandings()
       
     Returns:
       A list of tuples, each of which contains (id, name, wins, matches):
@@ -122,36 +496,193 @@ def playerStandings(tournament):
         wins: the number of matches the player has won
         matches: the number of matches the player has played
     """
-    connect()
-    query = 'SELECT id, name, wins, matches FROM standings WHERE tournament_id = %s;'
-    data = (bleach.clean(tournament),)
-    c.execute(query, data)
-    rows = c.fetchall()
-    return rows
-    db.close
+    if tiebreaks:
+        return [row[:4] for row in tiebreakStandings(tournament)]
+    tournament = validateId(tournament, 'tournament')
+    store = getStore()
+    return _standingsCache.get(tournament, lambda: store.standings(tournament))
+
+
+@instrument.instrumented
+def iterStandings(tournament, itersize=STREAM_ITERSIZE):
+    """Yields the standings of playerStandings() one row at a time.
+
+    The rows are read through a server-side cursor, itersize at a time, so
+    the first of them is out before the last is read and the whole list is
+    never held at once.  They aren't taken from the standings cache, and a
+    database connection stays checked out until the last row is read or the
+    iterator is closed.  While instrument is recording, the call is recorded
+    once the iterator is done, with the fetches made as it was read.
+
+    Args:
+      tournament: the id number of the tournament being held
+      itersize: the rows fetched from the database at a time
+    """
+    if itersize < 1:
+        raise ValueError("At least one row has to be fetched at a time.")
+    return getStore().iterStandings(validateId(tournament, 'tournament'), itersize)
+
+
+#what the players are ranked on after their points, for the standings to
+#agree with the standings view
+TIEBREAKS = ('wins',) + ranking.TIEBREAKS
+
+
+@instrument.instrumented
+def tiebreakStandings(tournament):
+    """Returns a list of the players taking part in a tournament with their
+    records and tiebreaks, ranked by points, then wins, then by the tiebreaks
+    in ranking.TIEBREAKS.
+
+    The matches of the tournament are read once and ranked with NumPy (see
+    ranking.computeStandings); players level on everything are ranked by id.
+    A win is worth 3 points and a tie 1, and byes count towards the points of
+    their players but not towards anybody's tiebreaks.
+
+    Args:
+      tournament: the id number of the tournament being held
+
+    Returns:
+      A list of tuples, each of which contains (id, name, wins, matches, ties,
+      points, headToHead, buchholz, sonnebornBerger, omw):
+        headToHead: the points scored against players with as many points
+        buchholz: the sum of the points of the opponents played
+        sonnebornBerger: the sum of the points of the opponents beaten, and
+          half the points of the opponents tied with
+        omw: the mean match-win percentage of the opponents played
+    """
+    players, matches = getStore().results(validateId(tournament, 'tournament'))
+    return _rank(players, matches)
+
+
+def _rank(players, matches):
+    """Returns the rows of tiebreakStandings() for a list of (id, name) players
+    and (id1, id2, winner) matches"""
+    names = dict(players)
+    standings = ranking.computeStandings([row[0] for row in players], matches, win=3, tie=1,
+                                         bye=storage.BYE, tiebreaks=TIEBREAKS)
+    columns = ('id', 'wins', 'matches', 'ties', 'points') + ranking.TIEBREAKS
+    return [(row[0], names[row[0]]) + row[1:] for row in ranking.standingsRows(standings, columns)]
+
+
+@instrument.instrumented
+def playerRatings(tournament):
+    """Returns a list of the players taking part in a tournament and their
+    ratings, highest Glicko-2 rating first.
+
+    The ratings are carried across tournaments and updated as each match is
+    recorded (see ratingExtraCredit.py); a player who hasn't played a rated
+    match has the ratings in ratingExtraCredit.START.
+
+    Args:
+      tournament: the id number of the tournament being held
+
+    Returns:
+      A list of tuples, each of which contains (id, name, elo, glicko,
+      deviation, volatility, games):
+        elo: the player's Elo rating
+        glicko: the player's Glicko-2 rating, on the Glicko scale
+        deviation: the rating deviation of the Glicko-2 rating
+        volatility: the volatility of the Glicko-2 rating
+        games: the number of rated matches the player has played
+    """
+    return getStore().ratings(validateId(tournament, 'tournament'))
 
+
+@instrument.instrumented
+def recomputeRatings():
+    """Works out the ratings of every player again from every match recorded,
+    in the order they were recorded, and replaces the ratings kept with them.
+
+    The matches are rated with NumPy a wave of matches at a time (see
+    ratingExtraCredit.computeRatings), for a backfill after the rating
+    constants change or matches are deleted; matches reported meanwhile wait
+    and are rated on top.
+
+    Returns:
+      The number of matches rated
+    """
+    return getStore().recomputeRatings()
+
+
+def seedStandings(standings, ratings, by='glicko'):
+    """Returns standings ranked by rating, highest first, for the first round
+    of a tournament; players with the same rating keep their order.
+
+    Args:
+      standings: a list of tuples starting with the ids of the players
+      ratings: a list of (id, name, elo, glicko, deviation, volatility, games)
+        tuples, as playerRatings() returns them; players missing from it
+        have the ratings in ratingExtraCredit.START
+      by: 'glicko' or 'elo'
+    """
+    column = rating.COLUMNS.index(by)
+    values = dict((row[0], row[2 + column]) for row in ratings)
+    start = rating.START[column]
+    return sorted(standings, key=lambda row: -values.get(row[0], start))
+
+
+@instrument.instrumented
 def reportMatch(id1, id2, result, tournament):
     """Records the outcome of a single match between two players.
 
+    A match against the bye, paired by swissPairings() as storageExtraCredit.BYE,
+    is recorded as a bye, scored as configureByes() sets.  A match between the
+    players of a pairing of the last round is keyed by its round and table,
+    as reportTable() keys it, so reporting it again records nothing.  The
+    ratings of the players are updated as the match is recorded, and byes
+    aren't rated.
+
     Args:
       player1:  the id number of the 1st player
       player2:  the id number of the 2nd player
       result: the id number of the winning player (or 'tie' if game ended in a tie)
       tournament: the id number of the tournament being held
     """
-    connect()
-    if str(result).lower() == 'tie':
-        query = "INSERT INTO matches (id1, id2, tournament_id) VALUES (%s, %s, %s);"
-        data = (bleach.clean(id1), bleach.clean(id2), bleach.clean(tournament),)
-        c.execute(query, data)
-    else:
-        query = "INSERT INTO matches (id1, id2, winner, tournament_id) VALUES (%s, %s, %s, %s);"
-        data = (bleach.clean(id1), bleach.clean(id2), bleach.clean(result), bleach.clean(tournament),)
-        c.execute(query, data)
-    db.commit()
-    db.close
- 
-def swissPairings(tournament):
+    id1, id2 = validateId(id1, 'player'), validateId(id2, 'player')
+    winner = validateResult(id1, id2, result)
+    tournament = validateId(tournament, 'tournament')
+    matches, byes = splitByes([(id1, id2, winner, tournament)])
+    with _pairingCache.writing([tournament]) as played:
+        played.extend(_played(*getStore().addMatches(matches, byes)))
+    if played:
+        _standingsCache.invalidate(tournament)
+
+
+@instrument.instrumented
+def reportMatches(results):
+    """Records the outcomes of a whole round of matches at once.
+
+    The matches are written with a single multi-row insert in one transaction
+    when the tournaments are kept in PostgreSQL: if any of them can't be
+    recorded, none of them is.  Matches against the bye are recorded as byes,
+    and the matches of pairings that already have a result are left out, as
+    reportMatch() does.
+
+    Args:
+      results: a list of (id1, id2, result, tournament) tuples, as taken by
+        reportMatch()
+    """
+    data = validateMatches(results)
+    if not data:
+        return
+    matches, byes = splitByes(data)
+    with _pairingCache.writing([match[3] for match in data]) as played:
+        played.extend(_played(*getStore().addMatches(matches, byes)))
+    for tournament in set(match[3] for match in played):
+        _standingsCache.invalidate(tournament)
+
+
+def _played(matches, byes):
+    """Returns the (id1, id2, winner, tournament) of the matches and the
+    (player, tournament, result) byes recorded, each bye as a match of its
+    player against BYE, as the caches take them"""
+    return list(matches) + [(player, storage.BYE, storage.byeWinner(player, result), tournament)
+                            for player, tournament, result in byes]
+
+
+@instrument.instrumented
+def swissPairings(tournament, method='greedy', tiebreaks=False):
     """Returns a list of pairs of players for the next round of a match.
   
     Assuming that there are an even number of players registered, each player
@@ -159,8 +690,30 @@ def swissPairings(tournament):
     player with an equal or nearly-equal win record, that is, a player adjacent
     to him or her in the standings.
 
+    With an uneven number of players, the lowest ranked of the players with
+    the fewest byes is paired last against the bye, storageExtraCredit.BYE
+    (see swiss.chooseBye), and is given it when the pairing is reported.
+    Pairing a round writes nothing to the store.
+
+    Unless tiebreaks is True, the standings and played opponents are taken
+    from the pairing cache (see configurePairingCache), and read from the
+    store only the first time the tournament is paired.  Before anybody has
+    played, the players are paired in the order they registered, or ranked
+    by their ratings once configureSeeding() says so.  The round is paired
+    holding the lock of the tournament (see
+    storageExtraCredit.PostgresStore.lockTournaments), so it waits for the
+    results being written to it, and results reported meanwhile wait for it;
+    its state is read on the connection holding the lock, so it doesn't wait
+    for the pool, however many scorekeepers are using it.
+
     Args:
       tournament: the id number of the tournament being held
+      method: 'greedy' to pair the highest and lowest ranked players in turn
+        with the first opponent available (see swiss.pairPlayers), or
+        'matching' to pair the whole round by maximum-weight matching without
+        rematches, balancing who plays first (see swiss.pairPlayersOptimal)
+      tiebreaks: True to pair players in the order of tiebreakStandings()
+        instead of on points and wins alone
 
     Returns:
       A list of tuples, each of which contains (id1, name1, id2, name2)
@@ -170,174 +723,208 @@ def swissPairings(tournament):
         name2: the second player's name
     """
 
-    tournament = bleach.clean(tournament)
-
-    def getIds(tournament):
-        """Returns a list of the ids taking part in a tournament in the order they appear in the
-        standings table
-
-        Args:
-            tournament: the id number of the tournament taking place
-        """
-        connect()
-        query = 'SELECT id FROM standings WHERE tournament_id = %s;'
-        data = (tournament,)
-        c.execute(query, data)
-        rows = c.fetchall()
-        ids = []
-        for row in rows:
-            ids.append(row[0])
-        return ids
-        db.close
-
-    def getWins(player, tournament):
-        """Returns the number of wins a player has in a tournament
-
-        Args:
-            player: the id number of the player
-            tournament: the id number of the tournament taking place
-        """
-        connect()
-        query = 'SELECT wins FROM standings WHERE id = %s AND tournament_id = %s;'
-        data = (player, tournament,)
-        c.execute(query, data)
-        row = c.fetchone()
-        return row[0]
-        db.close
-
-    def getPossiblePairs(wins, winDiff, tournament):
-        """Returns a list of the ids taking part in a tournament that have a certain number of wins difference
-
-        Args:
-            wins: the number of wins a player has
-            winDiff: the difference of wins in relation to the player
-            tournament: the id number of the tournament taking place
-        """
-        connect()
-        query = 'SELECT id FROM standings WHERE wins = %s AND tournament_id = %s;'
-        data = (wins + winDiff, tournament,)
-        c.execute(query, data)
-        rows = c.fetchall()
-        return rows
-        db.close
-    
-    def getPlayedOpponents(tournament):
-        """Returns a dictionary of the ids taking part in a tournament and the opponents they have played
-
-        Args:
-            tournament: the id number of the tournament taking place
-        """
-        connect()
-        playedOpponents = {}
-        ids = getIds(tournament)
-        for x in ids:
-            query = 'SELECT opponent FROM opponents WHERE player = %s AND tournament_id = %s;'
-            data = (x, tournament,)
-            c.execute(query, data)
-            rows = c.fetchall()
-            playedOpponents[x] = [row[0] for row in rows]
-        return playedOpponents
-        db.close
-
-    def getPlayerNames(tournament):
-        """Returns a dictionary of the ids and names taking part in a tournament
-
-        Args:
-            tournament: the id number of the tournament taking place
-        """
-        connect()
-        players = {}
-        query = 'SELECT id, name FROM standings WHERE tournament_id = %s;'
-        data = (tournament,)
-        c.execute(query, data)
-        rows = c.fetchall()
-        for row in rows:
-            players[row[0]] = row[1]
-        return players
-        db.close
-        
-    ids = getIds(tournament)
-
-    #adds a 'bye' to the tournament is there is an uneven number of players
-    if len(ids) % 2 != 0:
-        connect()
-        c.execute('SELECT id FROM players WHERE id = 0;')
-        rows = c.fetchall()
-        #registers 'bye' as a player with id of 0 if it doesn't already exist in the players table
-        #and then registers it in the tournament, else it just registers it in the tournament
-        if len(rows) == 0:
-            c.execute('INSERT INTO players VALUES (0, \'bye\');')
-            query = 'INSERT INTO tournament_participants (player_id, tournament_id) VALUES (0, %s);'
-            data = (tournament,)
-            c.execute(query, data)
-            db.commit()
-            ids = getIds(tournament)
-        else:
-            query = 'INSERT INTO tournament_participants (player_id, tournament_id) VALUES (0, %s);'
-            data = (tournament,)
-            c.execute(query, data)
-            db.commit()
-            ids = getIds(tournament)
-        db.close
-
-    
-    
-    possiblePairings = {}
-    possibleWinDiff = [0, 1, -1]
-    playedOpponents = getPlayedOpponents(tournament)
-
-    #pair each id to players the have not played against
-    for x in ids:
-        wins = getWins(x, tournament)
-        possiblePairings[x] = []
-        #select opponents with equal or adjacent wins
-        for winDiff in possibleWinDiff:
-            for row in getPossiblePairs(wins, winDiff, tournament):
-                #append the ids of the opponents that the player has not played yet
-                if row[0] != x and row[0] not in playedOpponents[x]:
-                    possiblePairings[x].append(row[0])
-            
-    def getPairs(player, n):
-        """Appends a tuple of a new pair to the pairs list
-
-        Args:
-            player: the id number of a player
-            n: the place of the id in the possiblePairings dictionary where player is the key
-        """
-        while [a for a in pairs if possiblePairings[player][n] in a]:
-            #if id 'n' is already paired up in possiblePairings then it loops to the next one
-            n +=1
-        else:
-            pairs.append((player, players[player], possiblePairings[player][n], players[possiblePairings[player][n]]))
-
-    pairs = []
-    count = 0
-    count2 = 2
-    players = getPlayerNames(tournament)
-    n1 = 0
-    n2 = len(ids)-1
-
-    #pair every id against another player
-    while count < len(ids):
-        n = 0
-        #make the loop pair players alternating between the highest ranked non paired player and the lowest
-        if count2 % 2 == 0:
-            #cycle through each id starting from the first one
-            x = ids[n1]
-            #if the id is not already paired the getPairs method is called
-            if not [pl for pl in pairs if x in pl]:
-                getPairs(x,n)
-                count2 += 1
-            n1 += 1
-        else:
-            #cycle through each id starting from the last one
-            x = ids[n2]
-            #if the id is not already paired the getPairs method is called
-            if not [pl for pl in pairs if x in pl]:
-                getPairs(x,n)
-                count2 += 1
-            n2 -= 1
-        count += 1
-    return pairs
-    db.close
+    tournament = validateId(tournament, 'tournament')
+    with getStore().lockTournaments([tournament], wait=True):
+        return _pairNext(tournament, method, tiebreaks)
+
+
+def _pairNext(tournament, method, tiebreaks):
+    """Pairs the next round of a tournament as swissPairings() does, without
+    taking its lock"""
+    standings, playedOpponents, colours = _pairingInput(tournament, method, tiebreaks)
+    return pairRound(standings, playedOpponents, colours, method)
+
+
+def pairRound(standings, playedOpponents, colours, method='greedy'):
+    """Pairs the next round of a tournament from its pairing state, as
+    swissPairings() does, without reading anything from the store.
+
+    Args:
+      standings: a list of (id, name, wins) tuples in the order to pair them
+      playedOpponents: the opponents each player has played, with BYE for
+        each bye, as storageExtraCredit.countOpponents() returns them
+      colours: how many more games each player has played first than
+        second, as countOpponents() returns them
+      method: the pairing method, as taken by swissPairings()
 
+    Returns:
+      A list of (id1, name1, id2, name2) tuples, as swissPairings() returns
+    """
+    if method not in ('greedy', 'matching'):
+        raise ValueError("Unknown pairing method %r." % (method,))
+    standings, byes = _splitBye(standings, playedOpponents)
+    if method == 'matching':
+        return swiss.pairPlayersOptimal(standings, playedOpponents, colours) + byes
+    return swiss.pairPlayers(standings, playedOpponents) + byes
+
+
+@instrument.instrumented
+def iterPairings(tournament, method='greedy', tiebreaks=False):
+    """Returns an iterator over the pairings of swissPairings().
+
+    The pairing state is read when it is called, holding the lock of the
+    tournament as swissPairings() does.  The greedy method then
+    chooses each pair as it is iterated over, so the first pairs are out
+    before the round is paired, and a round it can't complete raises
+    IndexError after the pairs chosen before.  The matching method can
+    release any pair until the whole round is solved, so it solves the round
+    before returning.  The bye comes last either way.
+
+    Args:
+      tournament: the id number of the tournament being held
+      method: the pairing method, as taken by swissPairings()
+      tiebreaks: True to pair players in the order of tiebreakStandings()
+    """
+    tournament = validateId(tournament, 'tournament')
+    with getStore().lockTournaments([tournament], wait=True):
+        standings, playedOpponents, colours = _pairingInput(tournament, method, tiebreaks)
+    standings, byes = _splitBye(standings, playedOpponents)
+    if method == 'matching':
+        pairs = swiss.pairPlayersOptimal(standings, playedOpponents, colours)
+    else:
+        pairs = swiss.iterPairPlayers(standings, playedOpponents)
+    return itertools.chain(pairs, byes)
+
+
+def _pairingInput(tournament, method, tiebreaks):
+    """Returns the standings, played opponents and colours to pair the next
+    round of a tournament from, as pairRound() takes them"""
+    if method not in ('greedy', 'matching'):
+        raise ValueError("Unknown pairing method %r." % (method,))
+    tournament = validateId(tournament, 'tournament')
+
+    store = getStore()
+    pairingCache = _pairingCache
+    if tiebreaks:
+        standings, playedOpponents, colours = tiebreakPairingState(*store.results(tournament))
+    elif not pairingCache.size:
+        standings, playedOpponents, colours = store.pairingState(tournament)
+    else:
+        standings, playedOpponents, colours = pairingCache.get(
+            tournament, lambda: store.results(tournament))
+    if _seeding is not None and not any(playedOpponents.counts):
+        standings = seedStandings(standings, store.ratings(tournament), _seeding)
+    return standings, playedOpponents, colours
+
+
+def tiebreakPairingState(players, matches):
+    """Returns the standings, played opponents and colours to pair the next
+    round of a tournament from, as pairRound() takes them, with the players
+    ranked as tiebreakStandings() ranks them.
+
+    Args:
+      players: a list of the (id, name) of the players taking part
+      matches: a list of the (id1, id2, winner) of the matches played, with
+        byes as the store's results() lists them
+    """
+    standings = [row[:3] for row in _rank(players, matches)]
+    playedOpponents, colours = storage.countOpponents([match[:2] for match in matches])
+    return standings, playedOpponents, colours
+
+
+def _splitBye(standings, playedOpponents):
+    """Returns the standings without the player given the bye, if there is an
+    uneven number of players, and a list of the pairing of the bye"""
+    byes = []
+    if len(standings) % 2 != 0:
+        player = swiss.chooseBye(standings, playedOpponents, storage.BYE)
+        for n, row in enumerate(standings):
+            if row[0] == player:
+                byes.append((player, row[1], storage.BYE, 'bye'))
+                standings = standings[:n] + standings[n + 1:]
+                break
+    return standings, byes
+
+
+@instrument.instrumented
+def startRound(tournament, method='greedy', tiebreaks=False):
+    """Pairs the next round of a tournament and records its pairings.
+
+    The round is paired by swissPairings() and its pairings are written in one
+    transaction, seated at tables numbered from 1 in the order they were
+    paired.  A round can only be started once every pairing of the round
+    before it has a result, reported by reportTable(), reportMatch() or
+    reportMatches().  The tournament is locked from pairing the round to
+    recording it, as swissPairings() locks it, and the round is read and
+    recorded on the connection holding the lock.
+
+    Args:
+      tournament: the id number of the tournament being held
+      method: the pairing method, as taken by swissPairings()
+      tiebreaks: True to pair players in the order of tiebreakStandings()
+
+    Returns:
+      A tuple of the number of the round, counted from 1, and a list of
+      (table, id1, name1, id2, name2) tuples
+    """
+    tournament = validateId(tournament, 'tournament')
+    store = getStore()
+    with store.lockTournaments([tournament], wait=True):
+        pairings = _pairNext(tournament, method, tiebreaks)
+        number = store.addRound(tournament, [(row[0], row[2]) for row in pairings])
+    return number, [(table,) + tuple(row) for table, row in enumerate(pairings, 1)]
+
+
+@instrument.instrumented
+def lastRound(tournament):
+    """Returns the number of the last round started in a tournament, or 0 if
+    none has been"""
+    return getStore().lastRound(validateId(tournament, 'tournament'))
+
+
+@instrument.instrumented
+def roundPairings(tournament, round=None):
+    """Returns the pairings of a round of a tournament.
+
+    Args:
+      tournament: the id number of the tournament being held
+      round: the number of the round, or None for the last one started
+
+    Returns:
+      A list of (table, id1, name1, id2, name2, reported) tuples in the order
+      of the tables, where reported is True once the pairing has a result;
+      empty if there is no such round
+    """
+    tournament = validateId(tournament, 'tournament')
+    if round is not None:
+        round = validateId(round, 'round')
+    return getStore().roundPairings(tournament, round)
+
+
+@instrument.instrumented
+def reportTable(tournament, table, result, round=None):
+    """Records the outcome of the match at a table of a round of a
+    tournament.
+
+    The result is keyed by the tournament, the round and the table, so a
+    scorekeeper can submit it again, after a timeout say, without it being
+    recorded twice: submitting the result a table already has records
+    nothing, and submitting a different one raises
+    storageExtraCredit.IntegrityError.
+
+    Args:
+      tournament: the id number of the tournament being held
+      table: the number of the table, as returned by startRound()
+      result: the id number of the winning player (or 'tie' if game ended in a
+        tie); the bye is scored as configureByes() sets whatever the result
+      round: the number of the round, or None for the last one started
+
+    Returns:
+      The (id1, id2, winner) of the match recorded, with None as the winner of
+      a tie
+    """
+    tournament = validateId(tournament, 'tournament')
+    table = validateId(table, 'table')
+    if round is not None:
+        round = validateId(round, 'round')
+    if isinstance(result, (str, type(u''))) and result.lower() == 'tie':
+        winner = None
+    else:
+        winner = validateId(result, 'winner')
+    with _pairingCache.writing([tournament]) as played:
+        match, recorded = getStore().closeTable(tournament, table, winner, _byeResult, round)
+        if recorded:
+            played.append(match + (tournament,))
+    if recorded:
+        _standingsCache.invalidate(tournament)
+    return match
@@ -16,46 +16,166 @@ CREATE TABLE players (id SERIAL PRIMARY KEY,
 CREATE TABLE tournaments (id SERIAL PRIMARY KEY,
 						  winner INT REFERENCES players(id));
 
+-- a match played at a table of a round is keyed by the number of the round
+-- and the table, so that reporting it again records nothing; matches played
+-- outside the rounds have neither
 CREATE TABLE matches (id SERIAL PRIMARY KEY,
 					  id1 INT NOT NULL REFERENCES players (id),
 					  id2 INT NOT NULL REFERENCES players (id),
 					  winner INT REFERENCES players (id), -- if winner = NULL then game is a tie
-					  tournament_id INT NOT NULL REFERENCES tournaments (id) ON DELETE CASCADE);
+					  tournament_id INT NOT NULL REFERENCES tournaments (id) ON DELETE CASCADE,
+					  round_number INT,
+					  table_number INT,
+					  UNIQUE (tournament_id, round_number, table_number));
 
 CREATE TABLE tournament_participants (id SERIAL PRIMARY KEY,
 									  player_id INT NOT NULL REFERENCES players (id) ON DELETE CASCADE,
 									  tournament_id INT NOT NULL REFERENCES tournaments (id) ON DELETE CASCADE);
 
+-- the byes given in each tournament, scored as a win, a tie or a loss and
+-- keyed as the matches are; a bye isn't a match, and nobody plays the player
+-- given it
+CREATE TABLE byes (id SERIAL PRIMARY KEY,
+				   player_id INT NOT NULL REFERENCES players (id),
+				   tournament_id INT NOT NULL REFERENCES tournaments (id) ON DELETE CASCADE,
+				   result TEXT NOT NULL CHECK (result IN ('win', 'tie', 'loss')),
+				   round_number INT,
+				   table_number INT,
+				   UNIQUE (tournament_id, round_number, table_number));
+
+-- the rounds of each tournament, numbered from 1, and the pairings of each
+-- round by table, numbered from 1; match_id is set once the result of the
+-- pairing is reported, and bye_id once the bye of a pairing without a second
+-- player is
+CREATE TABLE rounds (id SERIAL PRIMARY KEY,
+					 tournament_id INT NOT NULL REFERENCES tournaments (id) ON DELETE CASCADE,
+					 number INT NOT NULL,
+					 UNIQUE (tournament_id, number));
+
+CREATE TABLE pairings (round_id INT NOT NULL REFERENCES rounds (id) ON DELETE CASCADE,
+					   table_number INT NOT NULL,
+					   id1 INT NOT NULL REFERENCES players (id),
+					   id2 INT REFERENCES players (id),
+					   match_id INT REFERENCES matches (id) ON DELETE SET NULL,
+					   bye_id INT REFERENCES byes (id) ON DELETE SET NULL,
+					   PRIMARY KEY (round_id, table_number));
+
+-- the Elo and Glicko-2 ratings of each player across the tournaments, updated
+-- as each match is recorded (see ratingExtraCredit.py); a player without a
+-- row hasn't played a rated match yet and has the starting ratings
+CREATE TABLE ratings (player_id INT PRIMARY KEY REFERENCES players (id) ON DELETE CASCADE,
+					  elo DOUBLE PRECISION NOT NULL,
+					  glicko DOUBLE PRECISION NOT NULL,
+					  deviation DOUBLE PRECISION NOT NULL,
+					  volatility DOUBLE PRECISION NOT NULL,
+					  games INT NOT NULL);
+
+\ir tournamentExtraCredit_indexes.sql
+
+
+-- matches, wins, ties and points of each player in each tournament, kept up to
+-- date by the triggers below so the standings don't have to count the matches
+-- every time they are read
+CREATE TABLE scores (player_id INT NOT NULL REFERENCES players (id) ON DELETE CASCADE,
+					 tournament_id INT NOT NULL REFERENCES tournaments (id) ON DELETE CASCADE,
+					 matches INT NOT NULL DEFAULT 0,
+					 wins INT NOT NULL DEFAULT 0,
+					 ties INT NOT NULL DEFAULT 0,
+					 points INT NOT NULL DEFAULT 0,
+					 PRIMARY KEY (tournament_id, player_id));
+
+CREATE INDEX scores_rank ON scores (tournament_id, points DESC, wins DESC);
+
+-- start the scores of a new participant from the matches already played and
+-- the byes already given in the tournament, a bye lost counting as a match won
+-- by nobody else
+CREATE FUNCTION add_participant_scores() RETURNS trigger AS $$
+BEGIN
+	IF TG_OP = 'DELETE' THEN
+		DELETE FROM scores
+		WHERE player_id = OLD.player_id AND tournament_id = OLD.tournament_id
+		AND NOT EXISTS (SELECT 1 FROM tournament_participants
+						WHERE player_id = OLD.player_id AND tournament_id = OLD.tournament_id);
+		RETURN NULL;
+	END IF;
+	IF NOT EXISTS (SELECT 1 FROM scores
+				   WHERE player_id = NEW.player_id AND tournament_id = NEW.tournament_id) THEN
+		INSERT INTO scores (player_id, tournament_id, matches, wins, ties, points)
+		SELECT NEW.player_id, NEW.tournament_id, COUNT(*),
+			   COUNT(NULLIF(winner = NEW.player_id, FALSE)),
+			   COUNT(*) - COUNT(winner),
+			   3 * COUNT(NULLIF(winner = NEW.player_id, FALSE)) + COUNT(*) - COUNT(winner)
+		FROM (SELECT winner FROM matches
+			  WHERE tournament_id = NEW.tournament_id AND NEW.player_id IN (id1, id2)
+			  UNION ALL
+			  SELECT CASE result WHEN 'win' THEN player_id WHEN 'loss' THEN 0 END FROM byes
+			  WHERE tournament_id = NEW.tournament_id AND player_id = NEW.player_id) AS played;
+	END IF;
+	RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER participants_scores AFTER INSERT OR DELETE ON tournament_participants
+FOR EACH ROW EXECUTE PROCEDURE add_participant_scores();
+
+-- add the new match to the scores of both players and take the old one away;
+-- a win is worth 3 points and a tie 1
+CREATE FUNCTION count_match() RETURNS trigger AS $$
+BEGIN
+	IF TG_OP IN ('UPDATE', 'DELETE') THEN
+		UPDATE scores
+		SET matches = matches - 1,
+			wins = wins - COALESCE(player_id = OLD.winner, FALSE)::INT,
+			ties = ties - (OLD.winner IS NULL)::INT,
+			points = points - CASE WHEN OLD.winner IS NULL THEN 1 WHEN player_id = OLD.winner THEN 3 ELSE 0 END
+		WHERE tournament_id = OLD.tournament_id AND player_id IN (OLD.id1, OLD.id2);
+	END IF;
+	IF TG_OP IN ('INSERT', 'UPDATE') THEN
+		UPDATE scores
+		SET matches = matches + 1,
+			wins = wins + COALESCE(player_id = NEW.winner, FALSE)::INT,
+			ties = ties + (NEW.winner IS NULL)::INT,
+			points = points + CASE WHEN NEW.winner IS NULL THEN 1 WHEN player_id = NEW.winner THEN 3 ELSE 0 END
+		WHERE tournament_id = NEW.tournament_id AND player_id IN (NEW.id1, NEW.id2);
+	END IF;
+	RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER matches_scores AFTER INSERT OR UPDATE OR DELETE ON matches
+FOR EACH ROW EXECUTE PROCEDURE count_match();
+
+-- add a bye to the scores of its player as a match of its result
+CREATE FUNCTION count_bye() RETURNS trigger AS $$
+BEGIN
+	IF TG_OP = 'DELETE' THEN
+		UPDATE scores
+		SET matches = matches - 1,
+			wins = wins - (OLD.result = 'win')::INT,
+			ties = ties - (OLD.result = 'tie')::INT,
+			points = points - CASE OLD.result WHEN 'win' THEN 3 WHEN 'tie' THEN 1 ELSE 0 END
+		WHERE tournament_id = OLD.tournament_id AND player_id = OLD.player_id;
+		RETURN NULL;
+	END IF;
+	UPDATE scores
+	SET matches = matches + 1,
+		wins = wins + (NEW.result = 'win')::INT,
+		ties = ties + (NEW.result = 'tie')::INT,
+		points = points + CASE NEW.result WHEN 'win' THEN 3 WHEN 'tie' THEN 1 ELSE 0 END
+	WHERE tournament_id = NEW.tournament_id AND player_id = NEW.player_id;
+	RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER byes_scores AFTER INSERT OR DELETE ON byes
+FOR EACH ROW EXECUTE PROCEDURE count_bye();
 
-CREATE VIEW games_played AS
-SELECT tournament_participants.player_id AS id, COUNT(foo.id) AS matches, foo.tournament_id AS tournament_id
-FROM tournament_participants
-LEFT JOIN (SELECT id1 AS id, tournament_id FROM matches UNION ALL SELECT id2, tournament_id FROM matches)
-AS foo
-ON tournament_participants.player_id = foo.id
-GROUP BY tournament_participants.player_id, foo.tournament_id;
-
-CREATE VIEW wins AS
-SELECT tournament_participants.player_id AS id, COUNT(matches.winner) AS wins, tournament_participants.tournament_id AS tournament_id
-FROM tournament_participants
-LEFT JOIN matches
-ON tournament_participants.player_id = matches.winner
-GROUP BY tournament_participants.player_id, tournament_participants.tournament_id;
-
-CREATE VIEW ties AS
-SELECT wins.id AS id, wins.wins AS wins, count(foo.id) AS ties, wins.tournament_id AS tournament_id
-FROM wins
-LEFT JOIN (SELECT id1 AS id FROM matches WHERE winner is NULL UNION ALL SELECT id2 FROM matches WHERE winner is NULL) AS foo
-ON foo.id = wins.id
-GROUP BY foo.id, wins.id, wins.wins, wins.tournament_id;
 
 CREATE VIEW standings AS
-SELECT games_played.id AS id, players.name AS name, games_played.matches AS matches, ties.wins AS wins, ties.ties AS ties, ties.wins * 3 + ties.ties AS points, ties.tournament_id AS tournament_id
-FROM games_played
-INNER JOIN ties
-ON games_played.id = ties.id
+SELECT scores.player_id AS id, players.name AS name, scores.matches AS matches, scores.wins AS wins, scores.ties AS ties, scores.points AS points, scores.tournament_id AS tournament_id
+FROM scores
 INNER JOIN players
-ON games_played.id = players.id
+ON scores.player_id = players.id
 ORDER BY points DESC, wins DESC;
 
 CREATE VIEW opponents AS
@@ -0,0 +1,390 @@
+#!/usr/bin/env python3
+#
+# tournamentExtraCreditAsync.py -- asyncio API for the multi-tournament Swiss
+# system
+#
+# The coroutines in this module do what the functions of the same name in
+# tournamentExtraCredit.py do, on the asyncpg driver and a pool of its own, so
+# that one event loop can hold the rounds of many tournaments in flight at
+# once instead of blocking a thread on every query.  They need Python 3 and
+# asyncpg, and work on the database created by tournamentExtraCredit.sql.
+#
+
+import asyncio
+import contextlib
+import re
+import threading
+import urllib.parse
+
+import ratingExtraCredit as rating
+import storageExtraCredit as storage
+from tournamentExtraCredit import (getSeeding, pairRound, seedStandings, splitByes, tiebreakPairingState,
+                                   validateId, validateMatches)
+
+# asyncpg is imported by the coroutines that use it, so that importing this
+# module stays cheap.
+
+
+DSN = "postgresql:///tournament"
+POOL_SIZE = 10
+
+#the task opening the pool, and the event loop it runs on
+_poolTask = None
+_poolLoop = None
+_poolSize = POOL_SIZE
+_poolDsn = DSN
+_poolLock = threading.Lock()
+
+#a keyword and value of a libpq connection string, the value quoted if it
+#holds spaces, with backslashes escaping quotes and backslashes in it
+_DSN_PARAMETER = r"\s*(\w+)\s*=\s*('(?:[^'\\]|\\.)*'|[^\s']+)\s*"
+
+
+def uriFromDsn(dsn):
+    """Returns a connection string as the URI asyncpg takes.
+
+    A URI is returned as it is, and a libpq connection string of keywords and
+    values, such as tournamentExtraCredit.DSN, is turned into the URI of the
+    same connection: the database goes in the path and the other keywords,
+    which asyncpg takes as libpq does, in the query.
+
+    Args:
+      dsn: a connection URI or a libpq connection string
+    """
+    if dsn.startswith(('postgresql://', 'postgres://')):
+        return dsn
+    if not re.fullmatch('(?:%s)*' % _DSN_PARAMETER, dsn):
+        raise ValueError("%r is neither a connection URI nor a libpq connection string." % (dsn,))
+    parameters = {}
+    for keyword, value in re.findall(_DSN_PARAMETER, dsn):
+        if value.startswith("'"):
+            value = re.sub(r'\\(.)', r'\1', value[1:-1])
+        parameters[keyword] = value
+    database = urllib.parse.quote(parameters.pop('dbname', ''), safe='')
+    query = urllib.parse.urlencode(sorted(parameters.items()))
+    return 'postgresql:///%s%s' % (database, '?' + query if query else '')
+
+
+def configurePool(size=POOL_SIZE, dsn=DSN):
+    """Sets the size and connection string of the connection pool.
+
+    The new pool is opened on the next checkout; call closePool() first if
+    the current one is in use.
+
+    Args:
+      size: the number of connections kept open to the database
+      dsn: the connection URI, such as postgresql://user@host/tournament, or
+        a libpq connection string, such as tournamentExtraCredit.DSN
+    """
+    global _poolSize, _poolDsn, _poolTask, _poolLoop
+    if size < 1:
+        raise ValueError("The connection pool needs at least one connection.")
+    with _poolLock:
+        _poolSize = size
+        _poolDsn = uriFromDsn(dsn)
+        _poolTask = None
+        _poolLoop = None
+
+
+async def closePool():
+    """Closes every connection held by the connection pool."""
+    global _poolTask, _poolLoop
+    with _poolLock:
+        task = _poolTask
+        _poolTask = None
+        _poolLoop = None
+    if task is not None and not task.cancelled():
+        pool = await task
+        await pool.close()
+
+
+async def _getPool():
+    """Returns the connection pool, opening it on first use.
+
+    A pool only works on the event loop it was opened on, so a pool left
+    over from another loop is dropped and a new one opened, as is a pool
+    that failed to open.
+    """
+    global _poolTask, _poolLoop
+    import asyncpg
+    loop = asyncio.get_running_loop()
+    with _poolLock:
+        failed = (_poolTask is not None and _poolTask.done()
+                  and (_poolTask.cancelled() or _poolTask.exception() is not None))
+        if _poolTask is None or _poolLoop is not loop or failed:
+            _poolTask = asyncio.ensure_future(
+                asyncpg.create_pool(_poolDsn, min_size=_poolSize, max_size=_poolSize))
+            _poolLoop = loop
+        task = _poolTask
+    return await task
+
+
+@contextlib.asynccontextmanager
+async def getConnection(transaction=True):
+    """Checks a connection out of the pool and yields it inside a transaction.
+
+    The transaction is committed when the block exits normally and rolled
+    back if it raises, and the connection goes back to the pool either way.
+    When every connection is checked out the caller waits for one to be
+    returned.  A row the database rejects for breaking a constraint raises
+    storageExtraCredit.IntegrityError, as the synchronous functions do.
+
+    Args:
+      transaction: False to run each statement in a transaction of its own,
+        saving the round trips of BEGIN and COMMIT for a single statement
+    """
+    import asyncpg
+    pool = await _getPool()
+    try:
+        async with pool.acquire() as db:
+            if not transaction:
+                yield db
+                return
+            async with db.transaction():
+                yield db
+    except asyncpg.IntegrityConstraintViolationError as e:
+        raise storage.IntegrityError(str(e))
+
+
+async def registerTournamentPlayer(player, tournament):
+    """Adds a player to a tournament.
+
+    Registering a player that is already taking part in the tournament does
+    nothing.
+
+    Args:
+        player: the id number of the player
+        tournament: the id number of the tournament
+    """
+    query = """INSERT INTO tournament_participants (player_id, tournament_id)
+               SELECT $1, $2
+               WHERE NOT EXISTS (SELECT 1 FROM tournament_participants
+                                 WHERE player_id = $1 AND tournament_id = $2);"""
+    data = (validateId(player, 'player'), validateId(tournament, 'tournament'))
+    async with getConnection(transaction=False) as db:
+        await db.execute(query, *data)
+
+
+async def reportTournamentWinner(winner, tournament):
+    """Records the winner of a single tournament.
+
+    Args:
+      winner: the id number of the winning player
+      tournament: the id number of the tournament
+    """
+    query = 'UPDATE tournaments SET winner = $1 WHERE id = $2;'
+    data = (validateId(winner, 'winner'), validateId(tournament, 'tournament'))
+    async with getConnection(transaction=False) as db:
+        await db.execute(query, *data)
+
+
+async def playerStandings(tournament):
+    """Returns a list of the players and their win records, sorted by points
+    and wins, as tournamentExtraCredit.playerStandings() does.
+
+    Args:
+      tournament: the id number of the tournament being held
+
+    Returns:
+      A list of tuples, each of which contains (id, name, wins, matches)
+    """
+    query = 'SELECT id, name, wins, matches FROM standings WHERE tournament_id = $1;'
+    async with getConnection(transaction=False) as db:
+        rows = await db.fetch(query, validateId(tournament, 'tournament'))
+    return [tuple(row) for row in rows]
+
+
+async def reportMatch(id1, id2, result, tournament):
+    """Records the outcome of a single match between two players.
+
+    Args:
+      id1:  the id number of the 1st player
+      id2:  the id number of the 2nd player
+      result: the id number of the winning player (or 'tie' if game ended in a tie)
+      tournament: the id number of the tournament being held
+    """
+    await reportMatches([(id1, id2, result, tournament)])
+
+
+async def reportMatches(results):
+    """Records the outcomes of a whole round of matches at once.
+
+    The matches are written with a single insert of the unnested arrays of
+    their columns, in one transaction: if any of them can't be recorded, none
+    of them is.  A match between the players of a pairing of the last round
+    of its tournament is recorded as its result, keyed by its round and
+    table, and left out if the pairing already has one; matches against the
+    bye are recorded as byes, the tournaments are locked shared while they
+    are written and the matches recorded are rated, as
+    tournamentExtraCredit.reportMatches() does.
+
+    Args:
+      results: a list of (id1, id2, result, tournament) tuples, as taken by
+        reportMatch()
+    """
+    data = validateMatches(results)
+    if not data:
+        return
+    matches, byes = splitByes(data)
+    query = """WITH submitted AS (
+                   SELECT * FROM unnest($1::INT[], $2::INT[], $3::INT[], $4::INT[])
+                   AS submitted (id1, id2, winner, tournament_id)),
+               inserted AS (
+                   INSERT INTO matches (id1, id2, winner, tournament_id, round_number, table_number)
+                   SELECT submitted.id1, submitted.id2, submitted.winner, submitted.tournament_id,
+                          CASE WHEN pairings.table_number IS NOT NULL THEN last.number END,
+                          pairings.table_number
+                   FROM submitted
+                   LEFT JOIN LATERAL (SELECT id, number FROM rounds
+                                      WHERE rounds.tournament_id = submitted.tournament_id
+                                      ORDER BY number DESC LIMIT 1) AS last ON TRUE
+                   LEFT JOIN pairings ON pairings.round_id = last.id
+                   AND LEAST(pairings.id1, pairings.id2) = LEAST(submitted.id1, submitted.id2)
+                   AND GREATEST(pairings.id1, pairings.id2) = GREATEST(submitted.id1, submitted.id2)
+                   ON CONFLICT (tournament_id, round_number, table_number) DO NOTHING
+                   RETURNING id, id1, id2, winner, tournament_id, round_number, table_number),
+               closed AS (
+                   UPDATE pairings SET match_id = inserted.id
+                   FROM inserted, rounds
+                   WHERE rounds.tournament_id = inserted.tournament_id
+                   AND rounds.number = inserted.round_number AND pairings.round_id = rounds.id
+                   AND pairings.table_number = inserted.table_number)
+               SELECT id1, id2, winner FROM inserted ORDER BY id;"""
+    byeQuery = """WITH submitted AS (
+                      SELECT * FROM unnest($1::INT[], $2::INT[], $3::TEXT[])
+                      AS submitted (player_id, tournament_id, result)),
+                  inserted AS (
+                      INSERT INTO byes (player_id, tournament_id, result, round_number, table_number)
+                      SELECT submitted.player_id, submitted.tournament_id, submitted.result,
+                             CASE WHEN pairings.table_number IS NOT NULL THEN last.number END,
+                             pairings.table_number
+                      FROM submitted
+                      LEFT JOIN LATERAL (SELECT id, number FROM rounds
+                                         WHERE rounds.tournament_id = submitted.tournament_id
+                                         ORDER BY number DESC LIMIT 1) AS last ON TRUE
+                      LEFT JOIN pairings ON pairings.round_id = last.id
+                      AND pairings.id1 = submitted.player_id AND pairings.id2 IS NULL
+                      ON CONFLICT (tournament_id, round_number, table_number) DO NOTHING
+                      RETURNING id, tournament_id, round_number, table_number)
+                  UPDATE pairings SET bye_id = inserted.id
+                  FROM inserted, rounds
+                  WHERE rounds.tournament_id = inserted.tournament_id
+                  AND rounds.number = inserted.round_number AND pairings.round_id = rounds.id
+                  AND pairings.table_number = inserted.table_number;"""
+    tournaments = sorted(set(match[3] for match in data))
+    async with getConnection() as db:
+        await db.execute('SELECT pg_advisory_xact_lock_shared($1, tournament) '
+                         'FROM unnest($2::INT[]) AS tournament;', storage.TOURNAMENT_LOCK, tournaments)
+        if matches:
+            recorded = await db.fetch(query, *[list(column) for column in zip(*matches)])
+            await _rateMatches(db, [tuple(row) for row in recorded])
+        if byes:
+            await db.execute(byeQuery, *[list(column) for column in zip(*byes)])
+
+
+async def _rateMatches(db, matches):
+    """Rates a list of (id1, id2, winner) matches recorded in the transaction
+    of a connection, in order, locking the ratings of their players in order
+    of player as storageExtraCredit.PostgresStore.addMatches() does"""
+    players = sorted(set(player for match in matches for player in match[:2]))
+    if not players:
+        return
+    await db.execute("""INSERT INTO ratings (player_id, elo, glicko, deviation, volatility, games)
+                        SELECT player, $1::FLOAT8, $2::FLOAT8, $3::FLOAT8, $4::FLOAT8, $5::INT
+                        FROM unnest($6::INT[]) AS player
+                        ON CONFLICT (player_id) DO NOTHING;""", *(rating.START + (players,)))
+    rows = await db.fetch("""SELECT player_id, elo, glicko, deviation, volatility, games FROM ratings
+                             WHERE player_id = ANY($1::INT[]) ORDER BY player_id FOR UPDATE;""", players)
+    ratings = rating.rateMatches(dict((row[0], tuple(row[1:])) for row in rows), matches)
+    columns = zip(*[(player,) + tuple(ratings[player]) for player in players])
+    await db.execute("""UPDATE ratings SET elo = new.elo, glicko = new.glicko, deviation = new.deviation,
+                                           volatility = new.volatility, games = new.games
+                        FROM unnest($1::INT[], $2::FLOAT8[], $3::FLOAT8[], $4::FLOAT8[], $5::FLOAT8[],
+                                    $6::INT[]) AS new (player_id, elo, glicko, deviation, volatility, games)
+                        WHERE ratings.player_id = new.player_id;""", *[list(column) for column in columns])
+
+
+async def _pairingState(tournament, tiebreaks=False):
+    """Returns the (id, name, wins) standings, the played opponents and the
+    colours of a tournament, read in one transaction, as
+    storageExtraCredit.PostgresStore.pairingState() does, once the results
+    being written to it are in, or ranked by tiebreaks as
+    tournamentExtraCredit.tiebreakPairingState() ranks them; before anybody
+    has played, the standings are seeded by rating as
+    tournamentExtraCredit.swissPairings() seeds them"""
+    async with getConnection() as db:
+        await db.execute('SELECT pg_advisory_xact_lock($1, $2);', storage.TOURNAMENT_LOCK, tournament)
+        if tiebreaks:
+            players = await db.fetch(
+                """SELECT players.id, players.name FROM tournament_participants
+                   JOIN players ON players.id = tournament_participants.player_id
+                   WHERE tournament_participants.tournament_id = $1;""", tournament)
+            matches = await db.fetch(
+                """SELECT id1, id2, winner FROM matches WHERE tournament_id = $1
+                   UNION ALL
+                   SELECT player_id, $2, CASE result WHEN 'win' THEN player_id WHEN 'loss' THEN $2 END
+                   FROM byes WHERE tournament_id = $1;""", tournament, storage.BYE)
+            standings, playedOpponents, colours = tiebreakPairingState(
+                [tuple(row) for row in players], [tuple(row) for row in matches])
+        else:
+            standings = await db.fetch(
+                'SELECT id, name, wins FROM standings WHERE tournament_id = $1;', tournament)
+            matches = await db.fetch(
+                """SELECT id1, id2 FROM matches WHERE tournament_id = $1
+                   UNION ALL
+                   SELECT player_id, $2 FROM byes WHERE tournament_id = $1;""", tournament, storage.BYE)
+            standings = [tuple(row) for row in standings]
+            playedOpponents, colours = storage.countOpponents(matches, [row[0] for row in standings])
+        seeding = getSeeding()
+        if seeding is not None and not matches:
+            ratings = await db.fetch(
+                """SELECT players.id, players.name, ratings.elo, ratings.glicko, ratings.deviation,
+                          ratings.volatility, ratings.games
+                   FROM tournament_participants
+                   JOIN players ON players.id = tournament_participants.player_id
+                   JOIN ratings ON ratings.player_id = players.id
+                   WHERE tournament_participants.tournament_id = $1;""", tournament)
+            standings = seedStandings(standings, ratings, seeding)
+    return standings, playedOpponents, colours
+
+
+async def swissPairings(tournament, method='greedy', tiebreaks=False):
+    """Returns a list of pairs of players for the next round of a match, as
+    tournamentExtraCredit.swissPairings() does, byes and tiebreaks included,
+    with tournamentExtraCredit.pairRound().
+
+    The maximum-weight matching is solved in the loop's default executor, so
+    that the other tournaments carry on while a large field is paired.
+
+    Args:
+      tournament: the id number of the tournament being held
+      method: 'greedy' or 'matching'
+      tiebreaks: True to pair players in the order of
+        tournamentExtraCredit.tiebreakStandings()
+
+    Returns:
+      A list of tuples, each of which contains (id1, name1, id2, name2)
+    """
+    if method not in ('greedy', 'matching'):
+        raise ValueError("Unknown pairing method %r." % (method,))
+    tournament = validateId(tournament, 'tournament')
+    standings, playedOpponents, colours = await _pairingState(tournament, tiebreaks)
+    if method == 'matching':
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, pairRound, standings, playedOpponents, colours, method)
+    return pairRound(standings, playedOpponents, colours, method)
+
+
+async def closeRound(tournament, results, method='greedy', tiebreaks=False):
+    """Records the results of a round of a tournament and returns the pairings
+    of the next one.
+
+    Args:
+      tournament: the id number of the tournament being held
+      results: a list of (id1, id2, result) tuples, as taken by reportMatch()
+      method: the pairing method, as taken by swissPairings()
+      tiebreaks: True to pair players in the order of tiebreaks, as
+        swissPairings() takes it
+    """
+    await reportMatches([(id1, id2, result, tournament) for id1, id2, result in results])
+    return await swissPairings(tournament, method, tiebreaks)
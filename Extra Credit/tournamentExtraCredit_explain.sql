@@ -0,0 +1,74 @@
+-- Checks that the standings, matches and opponents queries use the indexes.
+--
+-- Type \i tournamentExtraCredit_explain.sql while connected to the tournament
+-- database.  It fills the database with 1,000 tournaments of 100 players each
+-- out of 20,000 players and 1,000,000 matches, prints the query plans, raises
+-- an error if a query scans the whole matches, scores or participants table,
+-- and then rolls everything back.
+
+\set ON_ERROR_STOP on
+
+BEGIN;
+
+-- the scores are not needed to check the plans, so skip counting the matches
+ALTER TABLE matches DISABLE TRIGGER matches_scores;
+
+INSERT INTO players (name)
+SELECT 'Player ' || n FROM generate_series(1, 20000) AS n;
+
+INSERT INTO tournaments (winner)
+SELECT NULL FROM generate_series(1, 1000);
+
+SELECT (SELECT MAX(id) - 19999 FROM players) AS player, (SELECT MAX(id) - 999 FROM tournaments) AS tournament
+\gset
+
+-- players n * 20 .. n * 20 + 99 take part in tournament n
+INSERT INTO tournament_participants (player_id, tournament_id)
+SELECT :player + (t * 20 + p) % 20000, :tournament + t
+FROM generate_series(0, 999) AS t, generate_series(0, 99) AS p;
+
+INSERT INTO matches (id1, id2, winner, tournament_id)
+SELECT :player + (t * 20 + p) % 20000, :player + (t * 20 + (p + r) % 100) % 20000,
+	   CASE WHEN r % 3 = 0 THEN NULL ELSE :player + (t * 20 + p) % 20000 END,
+	   :tournament + t
+FROM generate_series(0, 999) AS t, generate_series(0, 99) AS p, generate_series(1, 10) AS r;
+
+ANALYZE players;
+ANALYZE tournaments;
+ANALYZE tournament_participants;
+ANALYZE matches;
+ANALYZE scores;
+
+CREATE FUNCTION pg_temp.check_plan(query TEXT) RETURNS SETOF TEXT AS $$
+DECLARE
+	line TEXT;
+	plan TEXT := '';
+BEGIN
+	FOR line IN EXECUTE 'EXPLAIN ' || query LOOP
+		plan := plan || line || E'\n';
+		RETURN NEXT line;
+	END LOOP;
+	IF plan ~ 'Seq Scan on (matches|scores|tournament_participants)\M' OR plan NOT LIKE '%Index%' THEN
+		RAISE EXCEPTION 'Query scans a whole table: %', query;
+	END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT :player + 10000 AS player, :tournament + 500 AS tournament
+\gset
+
+\echo 'standings of a tournament'
+SELECT pg_temp.check_plan('SELECT id, name, wins, matches FROM standings WHERE tournament_id = ' || :tournament);
+
+\echo 'matches of a tournament'
+SELECT pg_temp.check_plan('SELECT id1, id2 FROM matches WHERE tournament_id = ' || :tournament);
+
+\echo 'opponents of a player in a tournament'
+SELECT pg_temp.check_plan('SELECT opponent FROM opponents WHERE player = ' || :player ||
+						  ' AND tournament_id = ' || :tournament);
+
+\echo 'registration of a player in a tournament'
+SELECT pg_temp.check_plan('SELECT 1 FROM tournament_participants WHERE player_id = ' || :player ||
+						  ' AND tournament_id = ' || :tournament);
+
+ROLLBACK;
@@ -0,0 +1,33 @@
+-- Indexes and constraints for the tournament database.
+--
+-- tournamentExtraCredit.sql includes this file; to add them to an existing
+-- database type \i tournamentExtraCredit_indexes.sql while connected to it.
+
+-- a player can't play against themself, and only one of the players can win
+ALTER TABLE matches ADD CONSTRAINT matches_players CHECK (id1 <> id2);
+ALTER TABLE matches ADD CONSTRAINT matches_winner CHECK (winner IN (id1, id2));
+
+-- find the matches of a tournament, and the matches of a player in a
+-- tournament through the opponents view
+CREATE INDEX matches_id1 ON matches (tournament_id, id1);
+CREATE INDEX matches_id2 ON matches (tournament_id, id2);
+
+-- a player can only be registered once in a tournament; remove the rows
+-- registered more than once before adding the constraint
+DELETE FROM tournament_participants
+USING tournament_participants AS first
+WHERE tournament_participants.player_id = first.player_id
+AND tournament_participants.tournament_id = first.tournament_id
+AND tournament_participants.id > first.id;
+
+ALTER TABLE tournament_participants
+ADD CONSTRAINT tournament_participants_player UNIQUE (player_id, tournament_id);
+
+-- find the byes of a tournament
+CREATE INDEX byes_tournament ON byes (tournament_id, player_id);
+
+-- find the participants of a tournament
+CREATE INDEX tournament_participants_tournament ON tournament_participants (tournament_id);
+
+ANALYZE matches;
+ANALYZE tournament_participants;
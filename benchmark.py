@@ -0,0 +1,385 @@
+#!/usr/bin/env python
+#
+# benchmark.py -- benchmarks for the Swiss-system tournament
+#
+# Type python benchmark.py pairing to compare the pairing methods,
+# python benchmark.py registration to compare registering players one by one
+# and all at once, python benchmark.py standings to time ranking a large
+# field with tiebreaks, python benchmark.py instrument to time the calls of
+# an instrumented function with recording off and on, or
+# python benchmark.py startup to time importing the tournament module.
+# python benchmark.py suite times registering, reporting, standings and
+# pairing on synthetic tournaments of 8 to 100,000 players and writes the
+# results as JSON, so they can be compared across commits.  The registration
+# and suite benchmarks empty the tournament database.
+#
+
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import timeit
+
+import swiss
+
+
+def playMatch(strength, id1, id2, rng):
+    """Returns the (winner, loser) of a simulated match
+
+    The chance of winning follows the Elo formula on the players' strengths.
+
+    Args:
+      strength: a dictionary of the ids and their strength
+      id1: the id number of the 1st player
+      id2: the id number of the 2nd player
+      rng: the random.Random used to draw the result
+    """
+    expected = 1.0 / (1 + 10 ** ((strength[id2] - strength[id1]) / 400.0))
+    if rng.random() < expected:
+        return id1, id2
+    return id2, id1
+
+
+def simulateEvent(pair, players, rounds, seed):
+    """Plays out a Swiss event and returns the statistics of its pairings
+
+    The event stops early if a round cannot be paired.
+
+    Args:
+      pair: the pairing function, called with the standings, the played
+        opponents and the colours of the players
+      players: the number of players
+      rounds: the number of rounds
+      seed: the seed of the random results
+    """
+    rng = random.Random(seed)
+    ids = list(range(1, players + 1))
+    strength = dict((x, rng.gauss(1500, 200)) for x in ids)
+    wins = dict((x, 0) for x in ids)
+    playedOpponents = dict((x, []) for x in ids)
+    colours = dict((x, 0) for x in ids)
+    stats = {'rounds': 0, 'seconds': 0.0, 'pairs': 0, 'rematches': 0,
+             'scoreGap': 0, 'maxScoreGap': 0, 'colourRepeats': 0}
+    for r in range(rounds):
+        order = sorted(ids, key=lambda x: -wins[x])
+        standings = [(x, str(x), wins[x]) for x in order]
+        start = time.time()
+        try:
+            pairs = pair(standings, playedOpponents, colours)
+        except (IndexError, ValueError):
+            break
+        stats['seconds'] += time.time() - start
+        stats['rounds'] += 1
+        for (id1, name1, id2, name2) in pairs:
+            gap = abs(wins[id1] - wins[id2])
+            stats['pairs'] += 1
+            stats['scoreGap'] += gap
+            stats['maxScoreGap'] = max(stats['maxScoreGap'], gap)
+            if id2 in playedOpponents[id1]:
+                stats['rematches'] += 1
+            if colours[id1] > 0:
+                stats['colourRepeats'] += 1
+            playedOpponents[id1].append(id2)
+            playedOpponents[id2].append(id1)
+            colours[id1] += 1
+            colours[id2] -= 1
+            winner, loser = playMatch(strength, id1, id2, rng)
+            wins[winner] += 1
+    return stats
+
+
+def benchPairing(players, rounds, seed):
+    """Prints the runtime and quality of the greedy and matching pairings"""
+    methods = [
+        ('greedy', lambda standings, played, colours:
+            swiss.pairPlayers(standings, played)),
+        ('matching', swiss.pairPlayersOptimal),
+    ]
+    print("%-9s %8s %7s %12s %9s %8s %9s %8s" % (
+        'method', 'players', 'rounds', 'sec/round', 'meanGap', 'maxGap',
+        'rematches', 'colours'))
+    for name, pair in methods:
+        stats = simulateEvent(pair, players, rounds, seed)
+        paired = max(stats['rounds'], 1)
+        print("%-9s %8d %3d/%-3d %12.4f %9.3f %8d %9d %8d" % (
+            name, players, stats['rounds'], rounds, stats['seconds'] / paired,
+            float(stats['scoreGap']) / max(stats['pairs'], 1),
+            stats['maxScoreGap'], stats['rematches'], stats['colourRepeats']))
+
+
+def benchRegistration(players):
+    """Prints the time taken to register players one by one and all at once
+
+    The players are registered in the tournament database, which is emptied
+    before each run.
+    """
+    import tournament
+    names = ['Player %d' % n for n in range(players)]
+    runs = [
+        ('registerPlayer', lambda: [tournament.registerPlayer(name) for name in names]),
+        ('registerPlayers', lambda: tournament.registerPlayers(names)),
+    ]
+    print("%-16s %8s %10s %12s" % ('function', 'players', 'seconds', 'players/sec'))
+    for name, run in runs:
+        tournament.deleteMatches()
+        tournament.deletePlayers()
+        start = time.time()
+        run()
+        seconds = time.time() - start
+        print("%-16s %8d %10.3f %12.0f" % (name, players, seconds, players / seconds))
+    tournament.deletePlayers()
+
+
+def benchStandings(players, rounds, seed, runs):
+    """Prints the time taken by ranking.computeStandings to rank a field of
+    players with every tiebreak, after rounds of random pairings
+
+    The best of several runs is reported.
+    """
+    import ranking
+    rng = random.Random(seed)
+    ids = list(range(1, players + 1))
+    matches = []
+    for r in range(rounds):
+        rng.shuffle(ids)
+        for id1, id2 in zip(ids[::2], ids[1::2]):
+            matches.append((id1, id2, rng.choice((id1, id2, None))))
+    ids.sort()
+    times = []
+    for n in range(runs):
+        start = time.time()
+        ranking.computeStandings(ids, matches)
+        times.append(time.time() - start)
+    print("%8s %7s %9s %10s" % ('players', 'rounds', 'matches', 'msec'))
+    print("%8d %7d %9d %10.1f" % (players, rounds, len(matches), min(times) * 1000))
+
+
+def benchInstrument(calls):
+    """Prints the time per call of countPlayers() on a MemoryStore: of the
+    store method alone, and of the instrumented function with recording off,
+    on, and on with tracing"""
+    import instrument
+    import storage
+    import tournament
+    store = storage.MemoryStore()
+    tournament.setStore(store)
+    runs = [
+        ('store', None),
+        ('off', None),
+        ('on', False),
+        ('trace', True),
+    ]
+    print("%-8s %10s %12s" % ('record', 'calls', 'usec/call'))
+    for name, trace in runs:
+        instrument.reset()
+        if trace is None:
+            instrument.disable()
+        else:
+            instrument.enable(trace=trace)
+        run = store.countPlayers if name == 'store' else tournament.countPlayers
+        seconds = min(timeit.repeat(run, number=calls, repeat=3))
+        print("%-8s %10d %12.3f" % (name, calls, seconds / calls * 1e6))
+    instrument.disable()
+    instrument.reset()
+
+
+#the numbers of players in the tournaments of the suite
+SUITE_SIZES = (8, 64, 512, 4096, 32768, 100000)
+
+
+def summarize(seconds):
+    """Returns the number, total, mean, median, 95th percentile and most of a
+    list of the seconds taken by calls"""
+    ordered = sorted(seconds)
+    return {
+        'calls': len(ordered),
+        'seconds': sum(ordered),
+        'mean': sum(ordered) / len(ordered),
+        'p50': ordered[len(ordered) // 2],
+        'p95': ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+        'max': ordered[-1],
+    }
+
+
+def environment():
+    """Returns where a benchmark ran: the Python version, the platform, the
+    time and the git commit checked out, if any"""
+    directory = os.path.dirname(os.path.abspath(__file__))
+    try:
+        with open(os.devnull, 'w') as devnull:
+            commit = subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=directory,
+                                             stderr=devnull).decode('ascii').strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {'python': platform.python_version(), 'platform': platform.platform(),
+            'time': time.time(), 'commit': commit}
+
+
+def runSuite(sizes, rounds, store, method, sample, seed):
+    """Plays a synthetic tournament of each size and returns the timings of
+    the public functions of tournament.py as a list of dictionaries
+
+    The first sample players are registered with registerPlayer() and the
+    rest at once with registerPlayers(); likewise the first sample matches of
+    each round are reported with reportMatch() and the rest with
+    reportMatches().  Each round is paired with swissPairings(), and the
+    standings read with playerStandings() once the round is reported.  A
+    tournament stops early if a round cannot be paired.
+
+    Args:
+      sizes: the numbers of players
+      rounds: the number of rounds, or None for enough rounds to find a
+        winner, the base 2 logarithm of the players rounded up
+      store: 'postgres' to keep the tournaments in the database, which is
+        emptied, or 'memory' to keep them in a storage.MemoryStore
+      method: the pairing method, as taken by swissPairings()
+      sample: the number of calls of registerPlayer() and of reportMatch() in
+        each round
+      seed: the seed of the players' strengths and the results
+    """
+    import storage
+    import tournament
+    results = []
+    for players in sizes:
+        if store == 'memory':
+            tournament.setStore(storage.MemoryStore())
+        else:
+            tournament.setStore(storage.PostgresStore(tournament.DSN, tournament.POOL_SIZE))
+        tournament.deleteMatches()
+        tournament.deletePlayers()
+        rng = random.Random(seed)
+        timings = {}
+
+        def timed(operation, function, *args):
+            start = time.time()
+            result = function(*args)
+            timings.setdefault(operation, []).append(time.time() - start)
+            return result
+
+        names = ['Player %d' % n for n in range(players)]
+        ids = [timed('registerPlayer', tournament.registerPlayer, name) for name in names[:sample]]
+        if players > sample:
+            ids += timed('registerPlayers', tournament.registerPlayers, names[sample:])
+        strength = dict((x, rng.gauss(1500, 200)) for x in ids)
+        played = 0
+        for r in range(rounds or int(math.ceil(math.log(players, 2)))):
+            try:
+                pairings = timed('swissPairings', tournament.swissPairings, method)
+            except (IndexError, ValueError):
+                break
+            matches = [playMatch(strength, id1, id2, rng) for (id1, name1, id2, name2) in pairings]
+            for winner, loser in matches[:sample]:
+                timed('reportMatch', tournament.reportMatch, winner, loser)
+            if matches[sample:]:
+                timed('reportMatches', tournament.reportMatches, matches[sample:])
+            timed('playerStandings', tournament.playerStandings)
+            played += 1
+        for operation in sorted(timings):
+            result = {'module': 'tournament', 'store': store, 'method': method,
+                      'players': players, 'rounds': played, 'operation': operation}
+            result.update(summarize(timings[operation]))
+            results.append(result)
+        tournament.deleteMatches()
+        tournament.deletePlayers()
+    return results
+
+
+def benchSuite(sizes, rounds, store, method, sample, seed, output):
+    """Runs the suite and writes its results, with where it ran, as a JSON
+    object to a file or to the standard output"""
+    report = environment()
+    report.update({'seed': seed, 'results': runSuite(sizes, rounds, store, method, sample, seed)})
+    text = json.dumps(report, indent=2, separators=(',', ': '), sort_keys=True)
+    if output is None:
+        print(text)
+    else:
+        with open(output, 'w') as f:
+            f.write(text + '\n')
+
+
+def benchStartup(runs):
+    """Prints the time taken by a new Python process to import the tournament
+    module, on its own and together with the database driver and bleach that
+    it imported when it was loaded before
+
+    The best of several runs is reported for each, less the time taken to
+    start Python.
+    """
+    directory = os.path.dirname(os.path.abspath(__file__))
+
+    def best(statement):
+        times = []
+        for n in range(runs):
+            start = time.time()
+            subprocess.check_call([sys.executable, '-c', statement], cwd=directory)
+            times.append(time.time() - start)
+        return min(times)
+
+    python = best('pass')
+    imports = [
+        ('tournament', 'import tournament'),
+        ('tournament, psycopg2 and bleach',
+         'import psycopg2, psycopg2.extras, psycopg2.pool, bleach, tournament'),
+        ('swiss', 'import swiss'),
+    ]
+    print("%-32s %10s" % ('import', 'msec'))
+    for name, statement in imports:
+        print("%-32s %10.1f" % (name, (best(statement) - python) * 1000))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    commands = parser.add_subparsers(dest='command')
+    pairing = commands.add_parser('pairing', help='compare the pairing methods')
+    pairing.add_argument('--players', type=int, default=1000)
+    pairing.add_argument('--rounds', type=int, default=9)
+    pairing.add_argument('--seed', type=int, default=0)
+    registration = commands.add_parser('registration',
+                                       help='compare registering players one by one and at once')
+    registration.add_argument('--players', type=int, default=10000)
+    standings = commands.add_parser('standings', help='time ranking players with tiebreaks')
+    standings.add_argument('--players', type=int, default=100000)
+    standings.add_argument('--rounds', type=int, default=15)
+    standings.add_argument('--seed', type=int, default=0)
+    standings.add_argument('--runs', type=int, default=5)
+    instrumentation = commands.add_parser('instrument',
+                                          help='time calls with instrumentation off and on')
+    instrumentation.add_argument('--calls', type=int, default=100000)
+    suite = commands.add_parser('suite', help='time the public functions and write JSON')
+    suite.add_argument('--sizes', type=lambda text: [int(n) for n in text.split(',')],
+                       default=list(SUITE_SIZES), help='comma-separated numbers of players')
+    suite.add_argument('--rounds', type=int, default=None,
+                       help='rounds per tournament, log2 of the players by default')
+    suite.add_argument('--store', choices=['postgres', 'memory'], default='postgres')
+    suite.add_argument('--method', choices=['greedy', 'matching'], default='matching')
+    suite.add_argument('--sample', type=int, default=100,
+                       help='calls of registerPlayer and of reportMatch each round')
+    suite.add_argument('--seed', type=int, default=0)
+    suite.add_argument('--output', default=None, help='file to write, the standard output by default')
+    startup = commands.add_parser('startup', help='time importing the tournament module')
+    startup.add_argument('--runs', type=int, default=10)
+    args = parser.parse_args()
+    if args.command == 'pairing':
+        benchPairing(args.players, args.rounds, args.seed)
+    elif args.command == 'registration':
+        benchRegistration(args.players)
+    elif args.command == 'standings':
+        benchStandings(args.players, args.rounds, args.seed, args.runs)
+    elif args.command == 'instrument':
+        benchInstrument(args.calls)
+    elif args.command == 'suite':
+        benchSuite(args.sizes, args.rounds, args.store, args.method, args.sample,
+                   args.seed, args.output)
+    elif args.command == 'startup':
+        benchStartup(args.runs)
+    else:
+        parser.print_help()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,269 @@
+#!/usr/bin/env python
+#
+# instrument.py -- timing and query counts of the tournament's functions
+#
+# The public functions of tournament.py are wrapped by instrumented(), and
+# the stores count the connections they check out and the queries and rows
+# that go through them.  Nothing is recorded until enable() is called, and
+# while it is off each call only pays for checking a flag.  Type, for example,
+#
+#   instrument.enable(trace=True)
+#   tournament.swissPairings()
+#   print(instrument.dumpMetrics())
+#
+# to see where a call spent its time.
+#
+
+import collections
+import functools
+import json
+import threading
+import time
+import types
+
+
+#the number of calls kept in the trace; older ones are dropped
+TRACE_SIZE = 10000
+
+#the totals kept for each function, in the order they are exported
+COUNTERS = ('calls', 'errors', 'seconds', 'maxSeconds', 'queries', 'rows', 'checkouts')
+
+
+class _State(object):
+    """Whether calls are recorded, and what has been recorded so far"""
+
+    def __init__(self):
+        self.enabled = False
+        self.tracing = False
+        self.lock = threading.Lock()
+        self.metrics = {}
+        self.trace = collections.deque(maxlen=TRACE_SIZE)
+        #the calls being made on each thread, innermost last
+        self.local = threading.local()
+
+
+_state = _State()
+
+
+def enable(trace=False, traceSize=TRACE_SIZE):
+    """Starts recording the calls of the instrumented functions.
+
+    Args:
+      trace: True to also keep a record of each call, for trace() and
+        writeTrace(), besides the totals of each function
+      traceSize: the number of calls kept in the trace
+    """
+    with _state.lock:
+        if _state.trace.maxlen != traceSize:
+            _state.trace = collections.deque(_state.trace, maxlen=traceSize)
+        _state.tracing = trace
+        _state.enabled = True
+
+
+def disable():
+    """Stops recording calls; what was recorded is kept until reset()."""
+    _state.enabled = False
+
+
+def isEnabled():
+    """Returns whether calls are being recorded"""
+    return _state.enabled
+
+
+def reset():
+    """Forgets the totals and the trace recorded so far."""
+    with _state.lock:
+        _state.metrics = {}
+        _state.trace.clear()
+
+
+def _calls():
+    """Returns the list of the calls being made on this thread"""
+    calls = getattr(_state.local, 'calls', None)
+    if calls is None:
+        calls = _state.local.calls = []
+    return calls
+
+
+def count(queries=0, rows=0, checkouts=0):
+    """Adds queries, rows fetched and connection checkouts to the calls being
+    made on this thread, each of which counts everything done inside it.
+
+    The stores call this; it does nothing while recording is off or outside
+    an instrumented function.
+    """
+    if not _state.enabled:
+        return
+    for call in getattr(_state.local, 'calls', ()):
+        call[0] += queries
+        call[1] += rows
+        call[2] += checkouts
+
+
+def instrumented(function):
+    """Returns function wrapped so that its calls are recorded while
+    recording is on.
+
+    Each call records its wall time, whether it raised, and the queries, rows
+    and connection checkouts counted during it, under the name
+    module.function.  A call returning a generator, which streams rows from
+    the store say, is recorded once the generator is exhausted, raises or is
+    closed instead, with what was counted while it produced its items added
+    to the call and the time spent producing them to its wall time.
+    """
+    name = '%s.%s' % (function.__module__, function.__name__)
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        if not _state.enabled:
+            return function(*args, **kwargs)
+        calls = _calls()
+        #[queries, rows, checkouts] of this call
+        counts = [0, 0, 0]
+        calls.append(counts)
+        error = None
+        result = None
+        start = time.time()
+        try:
+            result = function(*args, **kwargs)
+        except Exception as e:
+            error = e.__class__.__name__
+            raise
+        finally:
+            seconds = time.time() - start
+            calls.pop()
+            streamed = isinstance(result, types.GeneratorType)
+            if not streamed:
+                _record(name, start, seconds, counts, error, len(calls))
+        if streamed:
+            return _streamed(name, result, start, seconds, counts, len(calls))
+        return result
+
+    return wrapper
+
+
+def _streamed(name, generator, start, seconds, counts, depth):
+    """Yields the items of a generator returned by an instrumented call,
+    counting what is done while it produces them towards the call, and
+    records the call once the generator is done"""
+    error = None
+    calls = _calls()
+    try:
+        while True:
+            calls.append(counts)
+            mark = time.time()
+            try:
+                item = next(generator)
+            except StopIteration:
+                return
+            except Exception as e:
+                error = e.__class__.__name__
+                raise
+            finally:
+                seconds += time.time() - mark
+                calls.pop()
+            yield item
+    finally:
+        #closing the generator early lets it return its connection
+        calls.append(counts)
+        try:
+            generator.close()
+        finally:
+            calls.pop()
+            _record(name, start, seconds, counts, error, depth)
+
+
+def _record(name, start, seconds, counts, error, depth):
+    """Adds a finished call to the totals of its function and to the trace"""
+    with _state.lock:
+        metrics = _state.metrics.get(name)
+        if metrics is None:
+            metrics = _state.metrics[name] = dict((counter, 0) for counter in COUNTERS)
+        metrics['calls'] += 1
+        metrics['errors'] += error is not None
+        metrics['seconds'] += seconds
+        metrics['maxSeconds'] = max(metrics['maxSeconds'], seconds)
+        metrics['queries'] += counts[0]
+        metrics['rows'] += counts[1]
+        metrics['checkouts'] += counts[2]
+        if _state.tracing:
+            _state.trace.append({
+                'function': name, 'start': start, 'seconds': seconds,
+                'queries': counts[0], 'rows': counts[1], 'checkouts': counts[2],
+                'error': error, 'depth': depth, 'thread': threading.current_thread().name,
+            })
+
+
+def metrics():
+    """Returns a dictionary of the names of the functions called and a
+    dictionary of their totals, named as in COUNTERS
+
+    The totals of a call include those of the instrumented functions it
+    called.
+    """
+    with _state.lock:
+        return dict((name, dict(totals)) for name, totals in _state.metrics.items())
+
+
+def trace():
+    """Returns a list of the calls recorded while tracing, oldest first, each
+    a dictionary of its function, start time, seconds, queries, rows,
+    checkouts, the name of the exception it raised or None, its depth inside
+    other instrumented calls and the name of its thread"""
+    with _state.lock:
+        return list(_state.trace)
+
+
+def dumpMetrics():
+    """Returns the totals of metrics() as a JSON object"""
+    return json.dumps(metrics(), sort_keys=True)
+
+
+def writeTrace(file):
+    """Writes the calls of trace() to a file, one JSON object per line"""
+    for call in trace():
+        file.write(json.dumps(call, sort_keys=True) + '\n')
+
+
+class CountingCursor(object):
+    """Wraps a database cursor, counting its queries and the rows fetched
+    through it with count()"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        for row in self._cursor:
+            count(rows=1)
+            yield row
+
+    def execute(self, query, vars=None):
+        count(queries=1)
+        return self._cursor.execute(query, vars)
+
+    def executemany(self, query, vars_list):
+        count(queries=1)
+        return self._cursor.executemany(query, vars_list)
+
+    def copy_expert(self, sql, file, *args, **kwargs):
+        count(queries=1)
+        return self._cursor.copy_expert(sql, file, *args, **kwargs)
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        if row is not None:
+            count(rows=1)
+        return row
+
+    def fetchmany(self, *args, **kwargs):
+        rows = self._cursor.fetchmany(*args, **kwargs)
+        count(rows=len(rows))
+        return rows
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        count(rows=len(rows))
+        return rows
@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+#
+# Test cases for ranking.py
+
+from ranking import *
+
+
+def rows(standings):
+    return standingsRows(standings)
+
+
+def testPointsAndTiebreaks():
+    #1 beats 2 and 3, 3 and 4 tie, 2 beats 4
+    matches = [(1, 2, 1), (3, 4, None), (1, 3, 1), (2, 4, 2)]
+    standings = computeStandings([1, 2, 3, 4], matches, win=3, tie=1)
+    expected = [(1, 2, 2, 0, 6, 0, 4, 4),
+                (2, 2, 1, 0, 3, 0, 7, 1),
+                (3, 2, 0, 1, 1, 1, 7, 0.5),
+                (4, 2, 0, 1, 1, 1, 4, 0.5)]
+    if [row[:8] for row in rows(standings)] != expected:
+        raise ValueError("computeStandings should count points, head-to-head, "
+                         "Buchholz and Sonneborn-Berger.")
+    omw = dict((row[0], row[8]) for row in rows(standings))
+    if abs(omw[1] - (0.5 + 1.0 / 3) / 2) > 1e-9:
+        raise ValueError("Opponents' match-win percentages should be at least a third.")
+    print "1. Points and tiebreaks are computed from the matches."
+
+
+def testHeadToHead():
+    #3 and 5 are level on points and 5 has the better Buchholz, but 3 beat 5
+    matches = [(4, 6, 6), (5, 3, 3), (2, 1, 1), (1, 3, 1), (5, 6, 6),
+               (2, 4, 4), (4, 3, 4), (5, 1, 5), (6, 2, 6)]
+    standings = computeStandings([6, 5, 4, 3, 2, 1], matches)
+    ids = standings['id'].tolist()
+    if ids.index(3) > ids.index(5):
+        raise ValueError("The winner of the match between two level players should rank higher.")
+    if ids != sorted(ids, key=lambda x: -standings['points'][ids.index(x)]):
+        raise ValueError("Players should be ranked by points first.")
+    print "2. Players level on points are ranked by head-to-head."
+
+
+def testByeAndStrangers():
+    #0 stands in for the bye, and 9 isn't ranked
+    matches = [(1, 0, 1), (2, 3, 2), (1, 9, 9)]
+    standings = dict((row[0], row) for row in rows(
+        computeStandings([1, 2, 3], matches, bye=0)))
+    if standings[1][4] != 1 or standings[1][1] != 2:
+        raise ValueError("The win against the bye should count, and so should the match against 9.")
+    if standings[1][6] != 0:
+        raise ValueError("The bye and unranked players should not count towards the tiebreaks.")
+    print "3. The bye and unranked players count towards nobody's tiebreaks."
+
+
+if __name__ == '__main__':
+    testPointsAndTiebreaks()
+    testHeadToHead()
+    testByeAndStrangers()
+    print "Success!  All tests pass!"
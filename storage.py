@@ -0,0 +1,288 @@
+#!/usr/bin/env python
+#
+# storage.py -- where a Swiss-system tournament keeps its players and matches
+#
+# tournament.py reads and writes the tournament through one of the stores in
+# this module: PostgresStore keeps it in the database created by
+# tournament.sql, and MemoryStore keeps it in Python objects, so simulations
+# and tests can run without a database server.  Both take id numbers that have
+# already been checked and behave the same way, down to raising IntegrityError
+# where the database would reject a row.
+#
+
+import contextlib
+import io
+import threading
+
+import instrument
+
+# psycopg2 is imported by the PostgresStore methods that use it, so that the
+# memory store works without a database driver installed.
+
+
+class IntegrityError(ValueError):
+    """Raised when a change would break the tournament's constraints, such as
+    a match between players that aren't registered"""
+
+
+def _copyValue(value):
+    """Returns a value written in the text format of COPY"""
+    if value is None:
+        return u'\\N'
+    text = u'%s' % (value,)
+    return (text.replace(u'\\', u'\\\\').replace(u'\t', u'\\t')
+            .replace(u'\n', u'\\n').replace(u'\r', u'\\r'))
+
+
+def _copyRows(c, table, columns, rows):
+    """Writes rows to a table with a single COPY FROM STDIN.
+
+    Args:
+      c: the cursor to copy with
+      table: the name of the table
+      columns: the names of the columns, in the order of the values in each row
+      rows: a list of tuples of values
+    """
+    data = u''.join(u'\t'.join(_copyValue(v) for v in row) + u'\n' for row in rows)
+    query = 'COPY %s (%s) FROM STDIN;' % (table, ', '.join(columns))
+    c.copy_expert(query, io.BytesIO(data.encode('utf-8')))
+
+
+def _nextIds(c, sequence, count):
+    """Returns the next count values of a sequence, in order"""
+    c.execute('SELECT nextval(%s) FROM generate_series(1, %s);', (sequence, count))
+    return [row[0] for row in c.fetchall()]
+
+
+class PostgresStore(object):
+    """Keeps the tournament in PostgreSQL, checking connections out of a pool.
+
+    The pool is opened on the first checkout and can be closed and opened
+    again any number of times.
+    """
+
+    def __init__(self, dsn, size):
+        """
+        Args:
+          dsn: the libpq connection string
+          size: the number of connections kept open to the database
+        """
+        if size < 1:
+            raise ValueError("The connection pool needs at least one connection.")
+        self.dsn = dsn
+        self.size = size
+        self._pool = None
+        self._slots = None
+        self._lock = threading.Lock()
+
+    def close(self):
+        """Closes every connection held by the connection pool."""
+        with self._lock:
+            if self._pool is not None and not self._pool.closed:
+                self._pool.closeall()
+            self._pool = None
+            self._slots = None
+
+    def _getPool(self):
+        """Returns the connection pool and its checkout semaphore, opening the
+        pool on first use."""
+        import psycopg2.pool
+        with self._lock:
+            if self._pool is None:
+                self._pool = psycopg2.pool.ThreadedConnectionPool(self.size, self.size, self.dsn)
+                self._slots = threading.BoundedSemaphore(self.size)
+            return self._pool, self._slots
+
+    @contextlib.contextmanager
+    def cursor(self):
+        """Checks a connection out of the pool and yields a cursor on it.
+
+        The transaction is committed when the block exits normally and rolled
+        back if it raises.  Either way the connection goes back to the pool, and
+        a connection that was lost is discarded instead of being reused.  When
+        every connection is checked out the caller waits for one to be returned.
+        A row the database rejects for breaking a constraint raises
+        IntegrityError.  While instrument is recording, the checkout and the
+        queries and rows of the cursor are counted.
+        """
+        import psycopg2
+        pool, slots = self._getPool()
+        slots.acquire()
+        try:
+            db = pool.getconn()
+            try:
+                with db.cursor() as c:
+                    if instrument.isEnabled():
+                        instrument.count(checkouts=1)
+                        c = instrument.CountingCursor(c)
+                    yield c
+                db.commit()
+            except BaseException:
+                if not db.closed:
+                    db.rollback()
+                raise
+            finally:
+                pool.putconn(db, close=bool(db.closed))
+        except psycopg2.IntegrityError as e:
+            raise IntegrityError(str(e).strip())
+        finally:
+            slots.release()
+
+    def deleteMatches(self):
+        with self.cursor() as c:
+            c.execute('DELETE FROM matches;')
+
+    def deletePlayers(self):
+        with self.cursor() as c:
+            c.execute('DELETE FROM players;')
+
+    def countPlayers(self):
+        with self.cursor() as c:
+            c.execute('SELECT COUNT(*) FROM players;')
+            return c.fetchone()[0]
+
+    def addPlayer(self, name):
+        """Registers a player and returns their id"""
+        with self.cursor() as c:
+            c.execute('INSERT INTO players (name) VALUES (%s) RETURNING id;', (name,))
+            return c.fetchone()[0]
+
+    def addPlayers(self, names):
+        """Registers players with a single COPY and returns their ids in order
+
+        The ids are taken from the players' serial sequence beforehand so they
+        can be returned in order.
+        """
+        with self.cursor() as c:
+            ids = _nextIds(c, 'players_id_seq', len(names))
+            _copyRows(c, 'players', ('id', 'name'), zip(ids, names))
+        return ids
+
+    def standings(self):
+        """Returns a list of (id, name, wins, matches) tuples, sorted by wins"""
+        with self.cursor() as c:
+            c.execute('SELECT * FROM standings;')
+            return c.fetchall()
+
+    def addMatches(self, matches):
+        """Records a list of (winner, loser) tuples with a single insert"""
+        import psycopg2.extras
+        query = 'INSERT INTO matches (winner, loser) VALUES %s;'
+        with self.cursor() as c:
+            psycopg2.extras.execute_values(c, query, matches, page_size=len(matches))
+
+    def results(self):
+        """Returns the (id, name) of every player and the (id1, id2, winner) of
+        every match, read in one transaction"""
+        with self.cursor() as c:
+            c.execute('SELECT id, name FROM players;')
+            players = c.fetchall()
+            c.execute('SELECT winner, loser, winner FROM matches;')
+            matches = c.fetchall()
+        return players, matches
+
+    def pairingState(self):
+        """Returns what is needed to pair the next round, read in one
+        transaction: a list of (id, name, wins) tuples in the order of the
+        standings, and a dictionary of the ids and the opponents they have
+        played"""
+        with self.cursor() as c:
+            c.execute('SELECT id, name, wins FROM standings;')
+            standings = c.fetchall()
+            c.execute('SELECT player, opponent FROM opponents;')
+            rows = c.fetchall()
+        playedOpponents = {}
+        for player, opponent in rows:
+            playedOpponents.setdefault(player, []).append(opponent)
+        return standings, playedOpponents
+
+
+class MemoryStore(object):
+    """Keeps the tournament in Python objects, for simulations and tests.
+
+    The store follows the tournament.sql schema: ids are handed out in order
+    from 1 like its serial columns, the wins and matches of each player are
+    kept up to date as the scores table is, and the changes the database
+    would reject raise IntegrityError without changing anything.  Ties in the
+    standings are listed in the order the players registered.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._players = {}
+        self._scores = {}
+        self._matches = []
+        self._lastPlayer = 0
+
+    def close(self):
+        """Does nothing; the store holds no connections."""
+
+    def deleteMatches(self):
+        with self._lock:
+            self._matches = []
+            for score in self._scores.values():
+                score[:] = [0, 0]
+
+    def deletePlayers(self):
+        with self._lock:
+            if self._matches:
+                raise IntegrityError("The players have matches recorded.")
+            self._players.clear()
+            self._scores.clear()
+
+    def countPlayers(self):
+        with self._lock:
+            return len(self._players)
+
+    def addPlayer(self, name):
+        """Registers a player and returns their id"""
+        return self.addPlayers([name])[0]
+
+    def addPlayers(self, names):
+        """Registers players and returns their ids in order"""
+        with self._lock:
+            ids = list(range(self._lastPlayer + 1, self._lastPlayer + 1 + len(names)))
+            self._lastPlayer += len(names)
+            for player, name in zip(ids, names):
+                self._players[player] = name
+                self._scores[player] = [0, 0]
+            return ids
+
+    def standings(self):
+        """Returns a list of (id, name, wins, matches) tuples, sorted by wins"""
+        with self._lock:
+            order = sorted(self._players, key=lambda x: (-self._scores[x][0], x))
+            return [(x, self._players[x]) + tuple(self._scores[x]) for x in order]
+
+    def addMatches(self, matches):
+        """Records a list of (winner, loser) tuples, all of them or none"""
+        with self._lock:
+            for winner, loser in matches:
+                if winner not in self._players or loser not in self._players:
+                    raise IntegrityError("The players of a match should be registered.")
+                if winner == loser:
+                    raise IntegrityError("A player can't play against themself.")
+            for winner, loser in matches:
+                self._matches.append((winner, loser))
+                self._scores[winner][0] += 1
+                self._scores[winner][1] += 1
+                self._scores[loser][1] += 1
+
+    def results(self):
+        """Returns the (id, name) of every player and the (id1, id2, winner) of
+        every match"""
+        with self._lock:
+            players = sorted(self._players.items())
+            return players, [(winner, loser, winner) for winner, loser in self._matches]
+
+    def pairingState(self):
+        """Returns a list of (id, name, wins) tuples in the order of the
+        standings, and a dictionary of the ids and the opponents they have
+        played"""
+        with self._lock:
+            standings = [row[:3] for row in self.standings()]
+            playedOpponents = {}
+            for winner, loser in self._matches:
+                playedOpponents.setdefault(loser, []).append(winner)
+                playedOpponents.setdefault(winner, []).append(loser)
+            return standings, playedOpponents
@@ -0,0 +1,447 @@
+#!/usr/bin/env python
+#
+# swiss.py -- in-memory pairing engine for a Swiss-system tournament
+#
+# The functions in this module work on data that has already been loaded from
+# the database, so a whole round is paired without any further queries.  The
+# opponents played can be given as a dictionary of lists or, for large fields,
+# as an OpponentHistory, which keeps them in typed arrays.
+#
+
+import array
+
+
+class _Colours(object):
+    """The colours of an OpponentHistory, looked up as a dictionary would"""
+
+    __slots__ = ('history',)
+
+    def __init__(self, history):
+        self.history = history
+
+    def get(self, player, default=None):
+        n = self.history.index.get(player)
+        return default if n is None else self.history.balance[n]
+
+    def __getitem__(self, player):
+        return self.history.balance[self.history.index[player]]
+
+
+class OpponentHistory(object):
+    """The opponents the players of a tournament have played, and their
+    colours, kept in typed arrays instead of a dictionary of lists.
+
+    Each player is given a number in the order they are added and a row of a
+    flat array holding the ids of their opponents, every row of the same
+    width, which grows by half when a row fills up.  The history looks up the
+    opponents of a player as a dictionary of lists would, so it can be given
+    to the pairing functions as playedOpponents, and its colours attribute as
+    colours.  Ids have to fit in a C int, as the database's do.
+    """
+
+    __slots__ = ('index', 'ids', 'counts', 'balance', 'colours', '_rows')
+
+    def __init__(self, ids=(), width=8):
+        """
+        Args:
+          ids: the ids of the players to add up front
+          width: the number of opponents each row holds before it is widened
+        """
+        #the number of each id, the id, number of opponents and colours of
+        #each number, and the width of the rows and the array holding them,
+        #replaced together so that readers always see a matching pair
+        self.index = {}
+        self.ids = array.array('i')
+        self.counts = array.array('i')
+        self.balance = array.array('i')
+        self.colours = _Colours(self)
+        self._rows = (width, array.array('i'))
+        for x in ids:
+            self.add(x)
+
+    def add(self, player):
+        """Adds a player unless they are in already, and returns their number"""
+        n = self.index.get(player)
+        if n is None:
+            n = len(self.ids)
+            width, rows = self._rows
+            rows.extend(array.array('i', [0]) * width)
+            self.ids.append(player)
+            self.counts.append(0)
+            self.balance.append(0)
+            self.index[player] = n
+        return n
+
+    def _widen(self, needed):
+        """Widens the rows to hold at least needed opponents"""
+        width, rows = self._rows
+        wider = max(needed, width + width // 2, 1)
+        table = array.array('i', [0]) * (wider * len(self.ids))
+        for n in range(len(self.ids)):
+            table[wider * n:wider * n + width] = rows[width * n:width * (n + 1)]
+        self._rows = (wider, table)
+
+    def addOpponent(self, player, opponent):
+        """Adds an opponent to those of a player, adding the player if need be;
+        the opponent isn't added and the colours don't change"""
+        n = self.add(player)
+        count = self.counts[n]
+        if count == self._rows[0]:
+            self._widen(count + 1)
+        width, rows = self._rows
+        rows[width * n + count] = opponent
+        self.counts[n] = count + 1
+
+    def addMatch(self, id1, id2):
+        """Adds a match between two players, id1 playing first"""
+        self.addOpponent(id1, id2)
+        self.addOpponent(id2, id1)
+        self.balance[self.index[id1]] += 1
+        self.balance[self.index[id2]] -= 1
+
+    def addMatches(self, matches, bye=None):
+        """Adds a list of (id1, id2) matches, widening the rows at most once.
+
+        Args:
+          matches: a list of (id1, id2) tuples, id1 playing first
+          bye: the id standing in for the opponent of a bye, listed among the
+            opponents of id1 only and not counting towards the colours
+        """
+        index = self.index
+        numbered = []
+        for id1, id2 in matches:
+            n1 = index.get(id1)
+            if n1 is None:
+                n1 = self.add(id1)
+            n2 = -1
+            if id2 != bye:
+                n2 = index.get(id2)
+                if n2 is None:
+                    n2 = self.add(id2)
+            numbered.append((n1, n2, id2))
+        needed = self.counts.tolist()
+        for n1, n2, id2 in numbered:
+            needed[n1] += 1
+            if n2 >= 0:
+                needed[n2] += 1
+        if needed and max(needed) > self._rows[0]:
+            self._widen(max(needed))
+        width, rows = self._rows
+        counts, balance, ids = self.counts, self.balance, self.ids
+        for n1, n2, id2 in numbered:
+            count = counts[n1]
+            rows[width * n1 + count] = id2
+            counts[n1] = count + 1
+            if n2 >= 0:
+                count = counts[n2]
+                rows[width * n2 + count] = ids[n1]
+                counts[n2] = count + 1
+                balance[n1] += 1
+                balance[n2] -= 1
+
+    def get(self, player, default=None):
+        """Returns an array of the opponents of a player, or default if they
+        haven't been added"""
+        n = self.index.get(player)
+        if n is None:
+            return default
+        #the count is read first: it only grows, and fits the rows read after
+        #it even if they are widened in between
+        count = self.counts[n]
+        width, rows = self._rows
+        return rows[width * n:width * n + count]
+
+    def __getitem__(self, player):
+        opponents = self.get(player)
+        if opponents is None:
+            raise KeyError(player)
+        return opponents
+
+    def __contains__(self, player):
+        return player in self.index
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __iter__(self):
+        return iter(self.ids)
+
+    def keys(self):
+        return list(self.ids)
+
+    def items(self):
+        return [(x, self.get(x)) for x in self.ids]
+
+
+def groupByWins(standings):
+    """Returns a dictionary of win counts and the ids that have that many wins
+
+    Args:
+      standings: a list of (id, name, wins) tuples in the order they appear in
+        the standings
+    """
+    groups = {}
+    for row in standings:
+        groups.setdefault(row[2], []).append(row[0])
+    return groups
+
+
+def pairPlayers(standings, playedOpponents):
+    """Returns a list of pairs of players for the next round of a match.
+
+    Players are paired alternating between the highest and the lowest ranked
+    player that is not paired yet.  Each of them is paired with the first player
+    with an equal, one more or one less win that is not paired yet and that
+    they have not played before.
+
+    Args:
+      standings: a list of (id, name, wins) tuples in the order they appear in
+        the standings
+      playedOpponents: a dictionary of the ids and the list of opponents they
+        have played, or an OpponentHistory
+
+    Returns:
+      A list of tuples, each of which contains (id1, name1, id2, name2)
+        id1: the first player's unique id
+        name1: the first player's name
+        id2: the second player's unique id
+        name2: the second player's name
+    """
+    return list(iterPairPlayers(standings, playedOpponents))
+
+
+def iterPairPlayers(standings, playedOpponents):
+    """Yields the pairs of pairPlayers() one at a time, each as soon as it is
+    chosen.
+
+    A round that cannot be completed raises IndexError only once the pairs
+    before the player left without an opponent have been yielded.
+    """
+    ids = [row[0] for row in standings]
+    players = dict((row[0], row[1]) for row in standings)
+    wins = dict((row[0], row[2]) for row in standings)
+    groups = groupByWins(standings)
+    possibleWinDiff = [0, 1, -1]
+    #a player has played a handful of opponents, one a round, so they are
+    #searched where they are kept rather than copied into sets
+    noOpponents = ()
+
+    #ids that are already paired, and for each group the place of the first
+    #id in it that might not be paired yet
+    paired = set()
+    first = dict((w, 0) for w in groups)
+
+    def getOpponent(player):
+        """Returns the first id with equal or adjacent wins that is not paired yet
+        and that player has not played against
+
+        Args:
+            player: the id number of a player
+        """
+        opponents = playedOpponents.get(player, noOpponents)
+        for winDiff in possibleWinDiff:
+            w = wins[player] + winDiff
+            group = groups.get(w)
+            if group is None:
+                continue
+            n = first[w]
+            while n < len(group) and group[n] in paired:
+                n += 1
+            first[w] = n
+            #ids before 'n' are all paired, so the search starts from there
+            while n < len(group):
+                y = group[n]
+                if y != player and y not in paired and y not in opponents:
+                    return y
+                n += 1
+        raise IndexError("There is no opponent left for player %s" % player)
+
+    count2 = 2
+    n1 = 0
+    n2 = len(ids) - 1
+
+    #pair every id against another player
+    for count in range(len(ids)):
+        #make the loop pair players alternating between the highest non paired player and the lowest
+        if count2 % 2 == 0:
+            x = ids[n1]
+            n1 += 1
+        else:
+            x = ids[n2]
+            n2 -= 1
+        if x not in paired:
+            y = getOpponent(x)
+            paired.add(x)
+            paired.add(y)
+            yield (x, players[x], y, players[y])
+            count2 += 1
+
+
+def chooseBye(standings, playedOpponents, bye=0):
+    """Returns the id of the player to give the bye to when an uneven number
+    of players is paired: the lowest ranked of the players with the fewest
+    byes, so that nobody gets a second bye before everybody has had one.
+
+    Args:
+      standings: a list of (id, name, wins) tuples in the order they appear in
+        the standings
+      playedOpponents: a dictionary of the ids and the list of opponents they
+        have played, with the id bye for each bye, or an OpponentHistory
+      bye: the id that stands in for the opponent of a bye
+    """
+    chosen = None
+    fewest = None
+    for row in reversed(standings):
+        byes = playedOpponents.get(row[0], ()).count(bye)
+        if fewest is None or byes < fewest:
+            chosen, fewest = row[0], byes
+            if not byes:
+                break
+    return chosen
+
+
+#number of players solved at a time, and how many lower ranked players each
+#player is joined to in the candidate graph of a window
+WINDOW_SIZE = 16
+NEIGHBOURS = 8
+
+
+def pairPlayersOptimal(standings, playedOpponents, colours=None, windowSize=WINDOW_SIZE):
+    """Returns a list of pairs of players for the next round of a match,
+    chosen by maximum-weight matching instead of greedily.
+
+    Players that have played each other are never paired again.  Among the
+    other candidates the matching prefers, in this order, players with close
+    win records, players due opposite colours and players next to each other
+    in the standings.  An uneven field has to be given a bye first, as
+    chooseBye() does.
+
+    The standings are solved a window at a time, each window holding the
+    players left unpaired by the window above it, the next windowSize players
+    and the windowSize players below them, joined only to their nearest
+    neighbours in the standings.  If the bottom of the standings cannot be
+    paired that way, the pairs above it are released and solved again with
+    every candidate until everybody is paired.
+
+    Each window costs about the same, so a round takes time in proportion to
+    the field, but the constant is large: 6 to 11 seconds a round at 20,000
+    players (python benchmark.py pairing --players 20000), against a few
+    hundredths of a second for pairPlayers().  A field that can only be
+    paired as a whole ends up solved as a whole, in time growing as the cube
+    of the field and memory as its square.
+
+    Args:
+      standings: a list of (id, name, wins) tuples in the order they appear in
+        the standings
+      playedOpponents: a dictionary of the ids and the list of opponents they
+        have played, or an OpponentHistory
+      colours: a dictionary of the ids and how many more games they have played
+        as the first player than as the second one
+      windowSize: the number of players added to the candidate graph at a time
+
+    Returns:
+      A list of tuples, each of which contains (id1, name1, id2, name2), in the
+      order of the higher ranked player of each pair, with id1 the player due
+      to play first
+    """
+    import networkx
+
+    if len(standings) % 2 != 0:
+        raise ValueError("An even number of players is needed to pair a round.")
+    ids = [row[0] for row in standings]
+    players = dict((row[0], row[1]) for row in standings)
+    wins = dict((row[0], row[2]) for row in standings)
+    rank = dict((x, n) for n, x in enumerate(ids))
+    noOpponents = ()
+    colours = colours or {}
+
+    #the weights of the terms of an edge, scaled to the field so that each
+    #outweighs the sum of the ones below it over a whole round: the rank
+    #gaps of n / 2 pairs add up to less than n * n, and their colour terms
+    #to less than n * (maxColour + 1) colour weights; the base keeps every
+    #weight positive
+    n = len(ids)
+    maxColour = max([abs(colours.get(x, 0)) for x in ids] + [0])
+    maxGap = max(wins.values()) - min(wins.values()) if ids else 0
+    rankWeight = 1
+    colourWeight = n * n
+    scoreGapWeight = colourWeight * (maxColour + 1) * n
+    baseWeight = scoreGapWeight * maxGap * maxGap + colourWeight * maxColour + n
+
+    def weight(x, y):
+        """Returns the weight of the edge between two players"""
+        gap = wins[x] - wins[y]
+        w = baseWeight - scoreGapWeight * gap * gap - rankWeight * abs(rank[x] - rank[y])
+        cx = colours.get(x, 0)
+        cy = colours.get(y, 0)
+        #both players are due the same colour
+        if cx * cy > 0:
+            w -= colourWeight * min(abs(cx), abs(cy))
+        return w
+
+    def solve(nodes, neighbours):
+        """Returns a maximum-weight matching of nodes as a list of pairs
+
+        Args:
+            nodes: the ids to pair
+            neighbours: the number of lower ranked players each id is joined to,
+              or None to join it to all of them
+        """
+        nodes = sorted(nodes, key=rank.get)
+        graph = networkx.Graph()
+        graph.add_nodes_from(nodes)
+        for n, x in enumerate(nodes):
+            opponents = playedOpponents.get(x, noOpponents)
+            end = len(nodes) if neighbours is None else n + 1 + neighbours
+            for y in nodes[n + 1:end]:
+                if y not in opponents:
+                    graph.add_edge(x, y, weight=weight(x, y))
+        return list(networkx.max_weight_matching(graph, maxcardinality=True))
+
+    pairs = []
+    paired = set()
+    pending = []
+    n = 0
+    while n < len(ids):
+        chunk = []
+        while n < len(ids) and len(chunk) < windowSize:
+            if ids[n] not in paired:
+                chunk.append(ids[n])
+            n += 1
+        lookahead = []
+        m = n
+        while m < len(ids) and len(lookahead) < windowSize:
+            if ids[m] not in paired:
+                lookahead.append(ids[m])
+            m += 1
+        #keep the pairs of this window; the lookahead players paired among
+        #themselves are solved again with the next window
+        current = set(pending + chunk)
+        for x, y in solve(pending + chunk + lookahead, NEIGHBOURS):
+            if x in current or y in current:
+                pairs.append((x, y))
+                paired.add(x)
+                paired.add(y)
+        pending = [x for x in pending + chunk if x not in paired]
+
+    #release more and more of the lowest pairs until the rest can be paired
+    size = windowSize
+    while pending:
+        released = max(0, len(pairs) - size)
+        nodes = pending + [x for pair in pairs[released:] for x in pair]
+        matching = solve(nodes, None)
+        if 2 * len(matching) == len(nodes):
+            pairs[released:] = matching
+            pending = []
+        elif released == 0:
+            raise ValueError("The players cannot all be paired without a rematch.")
+        size *= 2
+
+    pairs.sort(key=lambda pair: min(rank[pair[0]], rank[pair[1]]))
+    result = []
+    for x, y in pairs:
+        #the player with fewer games played first, or else the higher ranked one, plays first
+        if (colours.get(y, 0), rank[y]) < (colours.get(x, 0), rank[x]):
+            x, y = y, x
+        result.append((x, players[x], y, players[y]))
+    return result
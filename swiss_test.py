@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+#
+# Test cases for swiss.py
+
+from swiss import *
+
+
+def testPairByWins():
+    standings = [(1, "Twilight Sparkle", 1), (3, "Applejack", 1),
+                 (2, "Fluttershy", 0), (4, "Pinkie Pie", 0)]
+    pairings = pairPlayers(standings, {1: [2], 2: [1], 3: [4], 4: [3]})
+    if len(pairings) != 2:
+        raise ValueError(
+            "For four players, pairPlayers should return two pairs.")
+    actual_pairs = set([frozenset([p[0], p[2]]) for p in pairings])
+    if actual_pairs != set([frozenset([1, 3]), frozenset([2, 4])]):
+        raise ValueError(
+            "Players with the same number of wins should be paired.")
+    print "1. Players with the same number of wins are paired."
+
+
+def testNoRematch():
+    standings = [(1, "A", 1), (2, "B", 1), (3, "C", 0), (4, "D", 0)]
+    pairings = pairPlayers(standings, {1: [2], 2: [1], 3: [4], 4: [3]})
+    for (id1, name1, id2, name2) in pairings:
+        if frozenset([id1, id2]) in (frozenset([1, 2]), frozenset([3, 4])):
+            raise ValueError("Players should not be paired twice.")
+    print "2. Players that have played each other are not paired again."
+
+
+def testOptimalPairing():
+    standings = [(1, "A", 2), (3, "C", 2), (5, "E", 2), (6, "F", 2),
+                 (2, "B", 1), (4, "D", 1)]
+    played = {1: [4, 2], 2: [1], 4: [1], 5: [6], 6: [5]}
+    try:
+        pairPlayers(standings, played)
+    except IndexError:
+        pass
+    else:
+        raise ValueError("The greedy pairing was expected to get stuck.")
+    pairings = pairPlayersOptimal(standings, played)
+    actual_pairs = set([frozenset([p[0], p[2]]) for p in pairings])
+    if actual_pairs != set([frozenset([1, 6]), frozenset([3, 5]),
+                            frozenset([2, 4])]):
+        raise ValueError(
+            "pairPlayersOptimal should pair everybody without a rematch.")
+    print "3. Matching pairs rounds the greedy pairing cannot complete."
+
+
+def testByeRotation():
+    standings = [(1, "A", 2), (2, "B", 1), (3, "C", 1), (4, "D", 0), (5, "E", 0)]
+    if chooseBye(standings, {}) != 5:
+        raise ValueError("The lowest ranked player should be given the bye.")
+    played = {1: [2, 3], 2: [1, 0], 3: [1, 4], 4: [3, 0], 5: [0, 4]}
+    if chooseBye(standings, played) != 3:
+        raise ValueError("Players that have had a bye should not get another one.")
+    played[3].append(0)
+    played[1].append(0)
+    if chooseBye(standings, played) != 5:
+        raise ValueError("Once everybody has had a bye the lowest ranked player should get the next one.")
+    print "4. The bye goes to the lowest ranked player with the fewest byes."
+
+
+def testOpponentHistory():
+    standings = [(1, "A", 2), (3, "C", 2), (5, "E", 2), (6, "F", 2),
+                 (2, "B", 1), (4, "D", 1)]
+    history = OpponentHistory([row[0] for row in standings], width=1)
+    history.addMatches([(1, 4), (2, 1), (5, 6)])
+    history.addMatch(3, 0)
+    if list(history.get(1)) != [4, 2] or list(history[2]) != [1] or history.get(7) is not None:
+        raise ValueError("The history should list the opponents of each player in order.")
+    if history.colours.get(1) != 0 or history.colours[6] != -1 or history.colours.get(7, 0) != 0:
+        raise ValueError("The history should count the colours of each player.")
+    played = {1: [4, 2], 2: [1], 3: [0], 4: [1], 5: [6], 6: [5], 0: [3]}
+    colours = {1: 0, 2: 1, 3: 1, 4: -1, 5: 1, 6: -1, 0: -1}
+    if pairPlayersOptimal(standings, history, history.colours) != pairPlayersOptimal(standings, played, colours):
+        raise ValueError("Pairing from the history should pair as the dictionaries do.")
+    print "5. An OpponentHistory pairs rounds as dictionaries of lists do."
+
+
+if __name__ == '__main__':
+    testPairByWins()
+    testNoRematch()
+    testOptimalPairing()
+    testByeRotation()
+    testOpponentHistory()
+    print "Success!  All tests pass!"
@@ -3,41 +3,160 @@
 # tournament.py -- implementation of a Swiss-system tournament
 #
 
-import psycopg2
-import bleach
+import atexit
+import csv
+import numbers
+import os
+import threading
+
+import instrument
+import ranking
+import storage
+import swiss
+
+# psycopg2, bleach and numpy are imported by the functions that use them, so that
+# importing this module (for the pairing functions, say) stays cheap and works
+# without a database driver installed.  The public functions are wrapped by
+# instrument.instrumented, which records their calls while instrument is
+# enabled.
+
+
+DSN = "dbname=tournament"
+POOL_SIZE = 5
+
+#the store the tournament is kept in; set TOURNAMENT_STORE=memory in the
+#environment to start with a MemoryStore instead of the database
+_store = None
+_storeLock = threading.Lock()
 
 
 def connect():
     """Connect to the PostgreSQL database and creates a cursor.
     Returns a database connection and a cursor.
+
+    The connection is not pooled; the functions in this module check their
+    connections out of the pool through getCursor() instead.
     """
-    db = psycopg2.connect("dbname=tournament")
+    import psycopg2
+    db = psycopg2.connect(DSN)
     c = db.cursor()
     return db, c
 
 
+def getStore():
+    """Returns the store the functions in this module keep the tournament in,
+    opening a storage.PostgresStore on DSN on first use, or a
+    storage.MemoryStore if the TOURNAMENT_STORE environment variable is
+    'memory'."""
+    global _store
+    with _storeLock:
+        if _store is None:
+            if os.environ.get('TOURNAMENT_STORE') == 'memory':
+                _store = storage.MemoryStore()
+            else:
+                _store = storage.PostgresStore(DSN, POOL_SIZE)
+        return _store
+
+
+def setStore(store):
+    """Sets the store the functions in this module keep the tournament in.
+
+    The connections held by the current store are closed.
+
+    Args:
+      store: a storage.PostgresStore or storage.MemoryStore
+    """
+    global _store
+    with _storeLock:
+        if _store is not None:
+            _store.close()
+        _store = store
+
+
+def configurePool(size=POOL_SIZE, dsn=DSN):
+    """Keeps the tournament in the database, with a connection pool of the
+    given size and connection string.
+
+    Any connections held by the current store are closed; the new pool is
+    opened on the next checkout.  Call this before the pool is in use.
+
+    Args:
+      size: the number of connections kept open to the database
+      dsn: the libpq connection string
+    """
+    setStore(storage.PostgresStore(dsn, size))
+
+
+def closePool():
+    """Closes every connection held by the connection pool."""
+    with _storeLock:
+        if _store is not None:
+            _store.close()
+
+
+def getCursor():
+    """Checks a connection out of the pool and yields a cursor on it.
+
+    See storage.PostgresStore.cursor(); the store has to be a PostgresStore.
+    """
+    return getStore().cursor()
+
+
+atexit.register(closePool)
+
+
+MAX_ID = 2147483647
+
+
+def validateId(value, name='id'):
+    """Returns an id number as an int, rejecting anything that isn't one.
+
+    Ids are checked here instead of being passed through bleach.clean, which
+    parses its input as HTML and returns a string the database has to cast
+    back to a number.
+
+    Args:
+      value: an int, or a string of digits
+      name: what the id number is of, for the error message
+    """
+    #plain ints, by far the most common, skip the slower check against the
+    #abstract base class
+    if type(value) is int:
+        number = value
+    elif isinstance(value, numbers.Integral) and not isinstance(value, bool):
+        number = int(value)
+    elif isinstance(value, (str, type(u''))) and value.strip().isdigit():
+        number = int(value)
+    else:
+        raise TypeError("The %s should be an id number, not %r." % (name, value))
+    if not 0 <= number <= MAX_ID:
+        raise ValueError("The %s %s is out of range." % (name, number))
+    return number
+
+
+def _readColumn(values):
+    """Returns values, or the first column of its rows if it is a CSV file"""
+    if hasattr(values, 'read'):
+        return [row[0] for row in csv.reader(values) if row]
+    return values
+
+
+@instrument.instrumented
 def deleteMatches():
     """Remove all the match records from the database."""
-    connect()
-    c.execute('DELETE FROM matches;')
-    db.commit()
-    db.close
+    getStore().deleteMatches()
 
+@instrument.instrumented
 def deletePlayers():
     """Remove all the player records from the database."""
-    connect()
-    c.execute('DELETE FROM players;')
-    db.commit()
-    db.close
+    getStore().deletePlayers()
 
+@instrument.instrumented
 def countPlayers():
     """Returns the number of players currently registered."""
-    connect()
-    c.execute('SELECT COUNT(*) FROM players;')
-    count = c.fetchall()
-    return count[0][0]
-    db.close
+    return getStore().countPlayers()
 
+@instrument.instrumented
 def registerPlayer(name):
     """Adds a player to the tournament database.
   
@@ -46,21 +165,47 @@ def registerPlayer(name):
   
     Args:
       name: the player's full name (need not be unique).
+
+    Returns:
+      The id assigned to the player
     """
-    connect()
-    query = 'INSERT INTO players (name) VALUES (%s);'
-    data = (bleach.clean(name),)
-    c.execute(query, data)
-    db.commit()
-    db.close
+    import bleach
+    return getStore().addPlayer(bleach.clean(name))
 
 
-def playerStandings():
+@instrument.instrumented
+def registerPlayers(names):
+    """Adds many players to the tournament database at once.
+
+    The players are registered all or none, streamed to the database with a
+    single COPY in one transaction when it is kept in PostgreSQL (see
+    storage.PostgresStore.addPlayers).
+
+    Args:
+      names: an iterable of the players' full names, or a CSV file with the
+        names in its first column
+
+    Returns:
+      A list of the ids assigned to the players, in the order of the names
+    """
+    import bleach
+    names = [bleach.clean(name) for name in _readColumn(names)]
+    if not names:
+        return []
+    return getStore().addPlayers(names)
+
+
+@instrument.instrumented
+def playerStandings(tiebreaks=False):
     """Returns a list of the players and their win records, sorted by wins.
 
     The first entry in the list should be the player in first place, or a player
     tied for first place if there is currently a tie.
 
+    Args:
+      tiebreaks: True to rank players with the same number of wins by the
+        tiebreaks of tiebreakStandings()
+
     Returns:
       A list of tuples, each of which contains (id, name, wins, matches):
         id: the player's unique id (assigned by the database)
@@ -68,13 +213,42 @@ def playerStandings():
         wins: the number of matches the player has won
         matches: the number of matches the player has played
     """
-    connect()
-    c.execute('SELECT * FROM standings;')
-    rows = c.fetchall()
-    return rows
-    db.close
+    if tiebreaks:
+        return [row[:4] for row in tiebreakStandings()]
+    return getStore().standings()
+
+
+@instrument.instrumented
+def tiebreakStandings():
+    """Returns a list of the players and their win records and tiebreaks,
+    ranked by wins and then by the tiebreaks in ranking.TIEBREAKS, in order.
+
+    The whole match table is read once and ranked with NumPy (see
+    ranking.computeStandings); players level on wins and every tiebreak are
+    ranked by id.
+
+    Returns:
+      A list of tuples, each of which contains (id, name, wins, matches,
+      headToHead, buchholz, sonnebornBerger, omw):
+        headToHead: the wins against players with as many wins
+        buchholz: the sum of the wins of the opponents played
+        sonnebornBerger: the sum of the wins of the opponents beaten
+        omw: the mean match-win percentage of the opponents played
+    """
+    players, matches = getStore().results()
+    return _rank(players, matches)
+
+
+def _rank(players, matches):
+    """Returns the rows of tiebreakStandings() for a list of (id, name) players
+    and (id1, id2, winner) matches"""
+    names = dict(players)
+    standings = ranking.computeStandings([row[0] for row in players], matches)
+    columns = ('id', 'wins', 'matches') + ranking.TIEBREAKS
+    return [(row[0], names[row[0]]) + row[1:] for row in ranking.standingsRows(standings, columns)]
     
 
+@instrument.instrumented
 def reportMatch(winner, loser):
     """Records the outcome of a single match between two players.
 
@@ -82,21 +256,55 @@ def reportMatch(winner, loser):
       winner:  the id number of the player who won
       loser:  the id number of the player who lost
     """
-    connect()
-    query = 'INSERT INTO matches (winner, loser) VALUES (%s, %s);'
-    data = (bleach.clean(winner), bleach.clean(loser),)
-    c.execute(query, data)
-    db.commit()
-    db.close
-     
- 
-def swissPairings():
+    getStore().addMatches([(validateId(winner, 'winner'), validateId(loser, 'loser'))])
+
+
+@instrument.instrumented
+def reportMatches(results):
+    """Records the outcomes of a whole round of matches at once.
+
+    The matches are written with a single multi-row insert in one transaction
+    when the tournament is kept in PostgreSQL: if any of them can't be
+    recorded, none of them is.
+
+    Args:
+      results: a list of (winner, loser) tuples, each holding the id numbers of
+        the player who won and the player who lost a match
+    """
+    data = []
+    seen = set()
+    for result in results:
+        if len(result) != 2:
+            raise ValueError("Each result should be a (winner, loser) tuple.")
+        winner, loser = validateId(result[0], 'winner'), validateId(result[1], 'loser')
+        if winner == loser:
+            raise ValueError("Player %s can't play against themself." % winner)
+        for player in (winner, loser):
+            if player in seen:
+                raise ValueError("Player %s plays more than one match in the round." % player)
+            seen.add(player)
+        data.append((winner, loser))
+    if not data:
+        return
+    getStore().addMatches(data)
+
+
+@instrument.instrumented
+def swissPairings(method='greedy', tiebreaks=False):
     """Returns a list of pairs of players for the next round of a match.
   
     Assuming that there are an even number of players registered, each player
     appears exactly once in the pairings.  Each player is paired with another
     player with an equal or nearly-equal win record, that is, a player adjacent
     to him or her in the standings.
+
+    Args:
+      method: 'greedy' to pair the highest and lowest ranked players in turn
+        with the first opponent available (see swiss.pairPlayers), or
+        'matching' to pair the whole round by maximum-weight matching without
+        rematches (see swiss.pairPlayersOptimal)
+      tiebreaks: True to pair players in the order of tiebreakStandings()
+        instead of on wins alone
   
     Returns:
       A list of tuples, each of which contains (id1, name1, id2, name2)
@@ -105,152 +313,17 @@ def swissPairings():
         id2: the second player's unique id
         name2: the second player's name
     """
-    
-
-    def getIds():
-        """Returns a list of the ids in the order they appear in the standings table"""
-        connect()
-        c.execute('SELECT id FROM standings;')
-        rows = c.fetchall()
-        ids = []
-        for row in rows:
-            ids.append(row[0])
-        return ids
-        db.close
-
-    def getWins(player):
-        """Returns the number of wins a player has"""
-        connect()
-        query = 'SELECT wins FROM standings WHERE id = %s;'
-        data = (player,)
-        c.execute(query, data)
-        row = c.fetchone()
-        return row[0]
-        db.close
-
-    def getPossiblePairs(wins, winDiff):
-        """Returns a list of the ids that have a certain number of win difference"""
-        connect()
-        query = 'SELECT id FROM standings WHERE wins = %s;'
-        data = (wins + winDiff,)
-        c.execute(query, data)
-        rows = c.fetchall()
-        return rows
-        db.close
-    
-    def getPlayedOpponents():
-        """Returns a dictionary of the ids and the opponents they have played"""
-        connect()
+    if method not in ('greedy', 'matching'):
+        raise ValueError("Unknown pairing method %r." % (method,))
+    if tiebreaks:
+        players, matches = getStore().results()
+        standings = [row[:3] for row in _rank(players, matches)]
         playedOpponents = {}
-        ids = getIds()
-        for x in ids:
-            query = 'SELECT opponent FROM opponents WHERE player = %s;'
-            data = (x,)
-            c.execute(query, data)
-            rows = c.fetchall()
-            playedOpponents[x] = [row[0] for row in rows]
-        return playedOpponents
-        db.close
-
-    def getPlayerNames():
-        """Returns a dictionary of the ids and names"""
-        connect()
-        players = {}
-        c.execute('SELECT * FROM players;')
-        rows = c.fetchall()
-        for row in rows:
-            players[row[0]] = row[1]
-        return players
-        db.close
-        
-    
-    possiblePairings = {}
-    ids = getIds()
-    possibleWinDiff = [0, 1, -1]
-    playedOpponents = getPlayedOpponents()
-    
-    #pair each id to players the have not played against
-    for x in ids:
-        wins = getWins(x)
-        possiblePairings[x] = []
-        #select opponents with equal or adjacent wins
-        for winDiff in possibleWinDiff:
-            for row in getPossiblePairs(wins, winDiff):
-                #append the ids of the opponents that the player has not played yet
-                if row[0] != x and row[0] not in playedOpponents[x]:
-                    possiblePairings[x].append(row[0])
-            
-    def getPairs(player, n):
-        """Appends a tuple of a new pair to the pairs list
-
-        Args:
-            player: the id number of a player
-            n: the place of the id in the possiblePairings dictionary where player is the key
-        """
-        while [a for a in pairs if possiblePairings[player][n] in a]:
-            #if id 'n' is already paired up it loops to the next one
-            n +=1
-        else:
-            pairs.append((player, players[player], possiblePairings[player][n], players[possiblePairings[player][n]]))
-
-    pairs = []
-    count = 0
-    count2 = 2
-    players = getPlayerNames()
-    n1 = 0
-    n2 = len(ids)-1
-
-    #pair every id against another player
-    while count < len(ids):
-        n = 0
-        #make the loop pair players alternating between the highest non paired player and the lowest
-        if count2 % 2 == 0:
-            #cycle through each id starting from the first one
-            x = ids[n1]
-            #if the id is not already paired the getPairs method is called
-            if not [pl for pl in pairs if x in pl]:
-                getPairs(x,n)
-                count2 += 1
-            n1 += 1
-        else:
-            #cycle through each id starting from the last one
-            x = ids[n2]
-            #if the id is not already paired the getPairs method is called
-            if not [pl for pl in pairs if x in pl]:
-                getPairs(x,n)
-                count2 += 1
-            n2 -= 1
-        count += 1
-    return pairs
-    db.close
-
-    
-            
-        
-        
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-        
+        for id1, id2, winner in matches:
+            playedOpponents.setdefault(id1, []).append(id2)
+            playedOpponents.setdefault(id2, []).append(id1)
+    else:
+        standings, playedOpponents = getStore().pairingState()
+    if method == 'matching':
+        return swiss.pairPlayersOptimal(standings, playedOpponents)
+    return swiss.pairPlayers(standings, playedOpponents)
@@ -17,23 +17,53 @@ CREATE TABLE matches (id SERIAL PRIMARY KEY,
 					  winner INT REFERENCES players (id),
 					  loser INT REFERENCES players (id));
 
+\ir tournament_indexes.sql
 
--- create table to see how many matches each participant has played
-CREATE VIEW games_played AS
-SELECT players.id AS id, players.name AS name, COUNT(foo.id) AS matches
-FROM players
-LEFT JOIN (SELECT winner AS id FROM matches UNION ALL SELECT loser FROM matches)
-AS foo
-ON players.id = foo.id
-GROUP BY players.id;
+
+-- wins and matches of each player, kept up to date by the triggers below so
+-- the standings don't have to count the matches every time they are read
+CREATE TABLE scores (player_id INT PRIMARY KEY REFERENCES players (id) ON DELETE CASCADE,
+					 wins INT NOT NULL DEFAULT 0,
+					 matches INT NOT NULL DEFAULT 0);
+
+CREATE INDEX scores_wins ON scores (wins DESC);
+
+CREATE FUNCTION add_player_scores() RETURNS trigger AS $$
+BEGIN
+	INSERT INTO scores (player_id) VALUES (NEW.id);
+	RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER players_scores AFTER INSERT ON players
+FOR EACH ROW EXECUTE PROCEDURE add_player_scores();
+
+-- add the new match to the scores of both players and take the old one away
+CREATE FUNCTION count_match() RETURNS trigger AS $$
+BEGIN
+	IF TG_OP IN ('UPDATE', 'DELETE') THEN
+		UPDATE scores
+		SET wins = wins - (player_id = OLD.winner)::INT, matches = matches - 1
+		WHERE player_id IN (OLD.winner, OLD.loser);
+	END IF;
+	IF TG_OP IN ('INSERT', 'UPDATE') THEN
+		UPDATE scores
+		SET wins = wins + (player_id = NEW.winner)::INT, matches = matches + 1
+		WHERE player_id IN (NEW.winner, NEW.loser);
+	END IF;
+	RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER matches_scores AFTER INSERT OR UPDATE OR DELETE ON matches
+FOR EACH ROW EXECUTE PROCEDURE count_match();
 
 
 CREATE VIEW standings AS
-SELECT games_played.id AS id, games_played.name AS name, COUNT(matches.winner) as wins, games_played.matches AS matches
-FROM games_played 
-LEFT JOIN matches
-ON games_played.id = matches.winner
-GROUP BY games_played.id, games_played.name, games_played.matches
+SELECT players.id AS id, players.name AS name, scores.wins AS wins, scores.matches AS matches
+FROM scores
+INNER JOIN players
+ON players.id = scores.player_id
 ORDER BY wins DESC;
 
 -- see who has played who
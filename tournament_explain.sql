@@ -0,0 +1,48 @@
+-- Checks that the standings and opponents queries use the indexes.
+--
+-- Type \i tournament_explain.sql while connected to the tournament database.
+-- It fills the database with 100,000 players and 1,000,000 matches, prints
+-- the query plans, raises an error if a query scans the whole matches or
+-- scores table, and then rolls everything back.
+
+\set ON_ERROR_STOP on
+
+BEGIN;
+
+-- the scores are not needed to check the plans, so skip counting the matches
+ALTER TABLE matches DISABLE TRIGGER matches_scores;
+
+INSERT INTO players (name)
+SELECT 'Player ' || n FROM generate_series(1, 100000) AS n;
+
+INSERT INTO matches (winner, loser)
+SELECT first.id + n % 100000, first.id + (n * 7 + 1) % 100000
+FROM generate_series(1, 1000000) AS n, (SELECT MAX(id) - 99999 AS id FROM players) AS first
+WHERE n % 100000 <> (n * 7 + 1) % 100000;
+
+ANALYZE players;
+ANALYZE matches;
+ANALYZE scores;
+
+CREATE FUNCTION pg_temp.check_plan(query TEXT) RETURNS SETOF TEXT AS $$
+DECLARE
+	line TEXT;
+	plan TEXT := '';
+BEGIN
+	FOR line IN EXECUTE 'EXPLAIN ' || query LOOP
+		plan := plan || line || E'\n';
+		RETURN NEXT line;
+	END LOOP;
+	IF plan ~ 'Seq Scan on (matches|scores)\M' OR plan NOT LIKE '%Index%' THEN
+		RAISE EXCEPTION 'Query scans a whole table: %', query;
+	END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+\echo 'standings of one player'
+SELECT pg_temp.check_plan('SELECT * FROM standings WHERE id = (SELECT MAX(id) FROM players)');
+
+\echo 'opponents of one player'
+SELECT pg_temp.check_plan('SELECT opponent FROM opponents WHERE player = (SELECT MAX(id) FROM players)');
+
+ROLLBACK;
@@ -0,0 +1,14 @@
+-- Indexes and constraints for the tournament database.
+--
+-- tournament.sql includes this file; to add them to an existing database type
+-- \i tournament_indexes.sql while connected to it.
+
+-- a player can't play against themself
+ALTER TABLE matches ADD CONSTRAINT matches_players CHECK (winner <> loser);
+
+-- find the matches of a player, through the opponents view and when players
+-- are deleted
+CREATE INDEX matches_winner ON matches (winner);
+CREATE INDEX matches_loser ON matches (loser);
+
+ANALYZE matches;
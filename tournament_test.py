@@ -2,8 +2,9 @@
 #
 # Test cases for tournament.py
 
-import psycopg2
 from tournament import *
+from storage import MemoryStore
+import instrument
 
 def testDeleteMatches():
     deleteMatches()
@@ -126,6 +127,136 @@ def testPairings():
     print "8. After one match, players with one win are paired."
 
 
+def testReportRound():
+    deleteMatches()
+    deletePlayers()
+    registerPlayer("Bruno Walton")
+    registerPlayer("Boots O'Neal")
+    registerPlayer("Cathy Burton")
+    registerPlayer("Diane Grant")
+    standings = playerStandings()
+    [id1, id2, id3, id4] = [row[0] for row in standings]
+    try:
+        reportMatches([(id1, id2), (id3, id1)])
+    except ValueError:
+        pass
+    else:
+        raise ValueError("A player should not be reported twice in a round.")
+    reportMatches([(id1, id2), (id3, id4)])
+    standings = playerStandings()
+    for (i, n, w, m) in standings:
+        if m != 1:
+            raise ValueError("Each player should have one match recorded.")
+        if i in (id1, id3) and w != 1:
+            raise ValueError("Each match winner should have one win recorded.")
+        elif i in (id2, id4) and w != 0:
+            raise ValueError("Each match loser should have zero wins recorded.")
+    print "9. A whole round of matches can be reported at once."
+
+
+def testRegisterMany():
+    deleteMatches()
+    deletePlayers()
+    names = ["Chandra Nalaar", "Markov\tChaney", "Joe \\ Malik", "Mao Tsu-hsi"]
+    ids = registerPlayers(names)
+    if len(ids) != 4 or countPlayers() != 4:
+        raise ValueError(
+            "After registering four players, countPlayers should be 4.")
+    registered = dict((row[0], row[1]) for row in playerStandings())
+    if [registered[i] for i in ids] != names:
+        raise ValueError(
+            "registerPlayers should return the ids in the order of the names.")
+    print "10. Many players can be registered at once."
+
+
+def testRejectBadIds():
+    deleteMatches()
+    deletePlayers()
+    registerPlayer("Bruno Walton")
+    registerPlayer("Boots O'Neal")
+    [id1, id2] = [row[0] for row in playerStandings()]
+    for winner, loser in [("1; DROP TABLE matches", id2), (id1, -1),
+                          (id1, 2 ** 40), (id1, None), (1.5, id2)]:
+        try:
+            reportMatch(winner, loser)
+        except (TypeError, ValueError):
+            pass
+        else:
+            raise ValueError("reportMatch should reject %r and %r." % (winner, loser))
+    reportMatch(str(id1), id2)
+    if [row[3] for row in playerStandings()] != [1, 1]:
+        raise ValueError("Ids given as strings of digits should be accepted.")
+    print "11. Ids that aren't id numbers are rejected."
+
+
+def testSetStore():
+    deleteMatches()
+    deletePlayers()
+    registerPlayer("Chandra Nalaar")
+    previous = getStore()
+    setStore(MemoryStore())
+    try:
+        if countPlayers() != 0:
+            raise ValueError("A new MemoryStore should have no players.")
+        id1 = registerPlayer("Markov Chaney")
+        id2 = registerPlayer("Joe Malik")
+        reportMatch(id1, id2)
+        if [row[0] for row in playerStandings()] != [id1, id2]:
+            raise ValueError("The MemoryStore should rank the winner first.")
+    finally:
+        setStore(previous)
+    if countPlayers() != 1:
+        raise ValueError("Setting a store should leave the old one untouched.")
+    print "12. The tournament is kept in the store set by setStore()."
+
+
+def testTiebreaks():
+    deleteMatches()
+    deletePlayers()
+    [id1, id2, id3, id4] = registerPlayers(
+        ["Bruno Walton", "Boots O'Neal", "Cathy Burton", "Diane Grant"])
+    reportMatches([(id2, id3), (id4, id1)])
+    reportMatches([(id2, id4), (id1, id3)])
+    standings = tiebreakStandings()
+    if [row[0] for row in standings] != [id2, id4, id1, id3]:
+        raise ValueError(
+            "Players level on wins should be ranked by their match against each other.")
+    if [row[:4] for row in standings] != playerStandings(tiebreaks=True):
+        raise ValueError("playerStandings should agree with tiebreakStandings.")
+    if standings[0][5] != 1:
+        raise ValueError("The Buchholz of the leader should be the wins of their opponents.")
+    pairings = swissPairings(tiebreaks=True)
+    if set(frozenset([row[0], row[2]]) for row in pairings) != set(
+            [frozenset([id2, id1]), frozenset([id4, id3])]):
+        raise ValueError("Pairings should follow the tiebreak standings.")
+    print "13. Players level on wins are ranked by tiebreaks."
+
+
+def testInstrument():
+    deleteMatches()
+    deletePlayers()
+    instrument.reset()
+    instrument.enable(trace=True)
+    try:
+        registerPlayer("Chandra Nalaar")
+        playerStandings(tiebreaks=True)
+    finally:
+        instrument.disable()
+    countPlayers()
+    metrics = instrument.metrics()
+    if set(metrics) != set(["tournament.registerPlayer", "tournament.playerStandings",
+                            "tournament.tiebreakStandings"]):
+        raise ValueError("Only the calls made while recording should be recorded.")
+    if metrics["tournament.playerStandings"]["rows"] != metrics["tournament.tiebreakStandings"]["rows"]:
+        raise ValueError("A call should count the rows of the calls it makes.")
+    if [(call["function"], call["depth"]) for call in instrument.trace()] != [
+            ("tournament.registerPlayer", 0), ("tournament.tiebreakStandings", 1),
+            ("tournament.playerStandings", 0)]:
+        raise ValueError("The trace should list each call as it finishes.")
+    instrument.reset()
+    print "14. Calls are recorded while instrumentation is enabled."
+
+
 if __name__ == '__main__':
     testDeleteMatches()
     testDelete()
@@ -135,6 +266,12 @@ if __name__ == '__main__':
     testStandingsBeforeMatches()
     testReportMatches()
     testPairings()
+    testReportRound()
+    testRegisterMany()
+    testRejectBadIds()
+    testSetStore()
+    testTiebreaks()
+    testInstrument()
     print "Success!  All tests pass!"
 
 